@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+图表渲染基准测试
+
+用随机生成的统计数据生成一份报告的全部图表，分别用不同的分辨率配置和进程数渲染，
+输出耗时和图片总大小。
+
+用法:
+    python benchmarks/bench_charts.py                          # 全部配置，进程数1和CPU核心数
+    python benchmarks/bench_charts.py --profiles preview high --workers 1 4
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wxdecrypt.chart_render import CHART_PROFILES, render_charts
+from wxdecrypt.segmentation import default_workers
+
+def sample_charts(days: int = 1000, seed: int = 0) -> list:
+    """生成与分析报告相同的7张图表"""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    words = [f"词语{i}" for i in range(100)]
+    return [
+        {'kind': 'line', 'file': 'daily.png', 'figsize': (12, 6), 'title': '每日消息数量',
+         'x': [start + timedelta(days=i) for i in range(days)], 'y': [rng.randint(0, 500) for _ in range(days)]},
+        {'kind': 'bar', 'file': 'hourly.png', 'figsize': (10, 6), 'title': '各时段消息数量',
+         'x': list(range(24)), 'y': [rng.randint(0, 5000) for _ in range(24)]},
+        {'kind': 'heatmap', 'file': 'weekday_hour.png', 'figsize': (12, 5), 'title': '星期时段分布',
+         'values': [[rng.randint(0, 100) for _ in range(24)] for _ in range(7)], 'rows': list('一二三四五六日')},
+        {'kind': 'pie', 'file': 'types.png', 'figsize': (8, 8), 'title': '消息类型分布',
+         'values': [rng.randint(1, 100) for _ in range(5)], 'labels': ['1', '3', '34', '43', '49']},
+        {'kind': 'pie', 'file': 'senders.png', 'figsize': (8, 8), 'title': '发送/接收消息比例',
+         'values': [rng.randint(1, 100) for _ in range(2)], 'labels': ['接收', '发送']},
+        {'kind': 'barh', 'file': 'words.png', 'figsize': (12, 8), 'title': '词频统计 (Top 30)',
+         'x': sorted((rng.randint(1, 1000) for _ in range(30)), reverse=True), 'y': words[:30]},
+        {'kind': 'wordcloud', 'file': 'wordcloud.png', 'figsize': (10, 8),
+         'frequencies': {word: rng.randint(1, 1000) for word in words}},
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='图表渲染基准测试')
+    parser.add_argument('--profiles', nargs='+', choices=list(CHART_PROFILES), default=list(CHART_PROFILES),
+                        help='要测试的分辨率配置 (默认: 全部)')
+    parser.add_argument('--workers', type=int, nargs='+', help='要测试的进程数 (默认: 1和CPU核心数)')
+    args = parser.parse_args()
+
+    charts = sample_charts()
+    workers_list = args.workers or sorted({1, default_workers()})
+    print(f"\n{'配置':<10}{'进程数':<8}{'耗时(秒)':>10}{'总大小(KB)':>12}")
+    print("-" * 42)
+    for profile in args.profiles:
+        for workers in workers_list:
+            output_dir = tempfile.mkdtemp(prefix='wxdecrypt_charts_')
+            try:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    paths = render_charts(charts, output_dir, profile, workers)
+                elapsed = time.perf_counter() - start
+                size = sum(os.path.getsize(path) for path in paths)
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            print(f"{profile:<10}{workers:<8}{elapsed:>10.2f}{size / 1024:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+数据库发现性能基准测试
+
+生成一个包含大量文件的模拟Windows目录树（默认100万个文件），在其中埋入若干微信/QQ账号目录，
+然后通过挂载镜像后端对每种发现策略计时。可在Linux上运行。
+
+用法:
+    python benchmarks/bench_discovery.py                     # 在临时目录生成100万个文件
+    python benchmarks/bench_discovery.py --files 200000      # 指定文件数量
+    python benchmarks/bench_discovery.py --root /data/tree   # 复用已生成的目录树
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wxdecrypt.discovery_backend import MountedImageBackend, HKEY_CURRENT_USER
+from wxdecrypt import wechat_path
+
+LAYOUT_FILE = '.bench_layout.json'
+FILES_PER_DIR = 40
+DIRS_PER_DIR = 8
+
+# 埋入的账号目录（相对于C盘或D盘的挂载目录）
+WECHAT_ACCOUNTS = [
+    ('C', ['Users', 'alice', 'Documents', 'WeChat Files', 'wxid_alice001'],
+     ['Msg/MicroMsg.db', 'Msg/Multi/MSG0.db', 'Msg/Multi/MSG1.db', 'Msg/Media.db']),
+    ('D', ['WeChatData', 'WeChat Files', 'wxid_bob002'],
+     ['Msg/MicroMsg.db', 'Msg/Multi/MSG0.db']),
+]
+# 全盘搜索才能找到的账号（藏在普通目录的深处）
+BURIED_ACCOUNTS = [
+    ('D', ['backup', '2019', 'phone', 'data', 'Tencent', 'MicroMsg', '5f0c2b9e'],
+     ['EnMicroMsg.db', 'SnsMicroMsg.db', 'WxFileIndex.db']),
+]
+QQ_ACCOUNTS = [
+    ('C', ['Users', 'alice', 'Documents', 'Tencent Files', '283664393'],
+     ['Msg3.0.db', 'Msg3.0index.db']),
+]
+
+NOISE_TOP_DIRS = {
+    'C': ['Users/alice/AppData/Local', 'Users/alice/Documents/Projects', 'Users/carol/AppData/Roaming',
+          'ProgramData', 'Windows/WinSxS'],
+    'D': ['Games', 'Photos', 'backup'],
+}
+
+def generate_tree(root: str, total_files: int) -> None:
+    """生成模拟目录树"""
+    layout_path = os.path.join(root, LAYOUT_FILE)
+    if os.path.exists(layout_path):
+        with open(layout_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('files') == total_files:
+                print(f"复用已生成的目录树: {root}")
+                return
+        shutil.rmtree(root)
+
+    print(f"正在生成包含 {total_files} 个文件的目录树: {root}")
+    start = time.time()
+    created = 0
+
+    # 噪声文件平均分配到各个噪声目录
+    tops = [(drive, top) for drive, items in NOISE_TOP_DIRS.items() for top in items]
+    per_top = total_files // len(tops)
+    for drive, top in tops:
+        created += _fill_noise(os.path.join(root, drive, *top.split('/')), per_top)
+
+    for drive, parts, files in WECHAT_ACCOUNTS + BURIED_ACCOUNTS + QQ_ACCOUNTS:
+        account_dir = os.path.join(root, drive, *parts)
+        for rel in files:
+            path = os.path.join(account_dir, *rel.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'\0' * 4096)
+            created += 1
+
+    with open(layout_path, 'w', encoding='utf-8') as f:
+        json.dump({'files': total_files}, f)
+    print(f"生成完成: {created} 个文件，耗时 {time.time() - start:.1f} 秒")
+
+def _fill_noise(top: str, count: int) -> int:
+    """在top下按固定扇出生成count个噪声文件"""
+    created = 0
+    queue = [top]
+    while queue and created < count:
+        current = queue.pop(0)
+        os.makedirs(current, exist_ok=True)
+        for i in range(min(FILES_PER_DIR, count - created)):
+            # 少量噪声文件同样是.db，用于检验匹配规则
+            ext = '.db' if i % 17 == 0 else '.dat'
+            open(os.path.join(current, f"f{i:03d}{ext}"), 'wb').close()
+            created += 1
+        queue.extend(os.path.join(current, f"d{j}") for j in range(DIRS_PER_DIR))
+    return created
+
+def make_backend(root: str) -> MountedImageBackend:
+    """创建指向模拟目录树的后端，注册表中的FileSavePath指向D盘"""
+    registry = {
+        f"{HKEY_CURRENT_USER}\\Software\\Tencent\\WeChat": {'FileSavePath': 'D:\\WeChatData'},
+    }
+    return MountedImageBackend(os.path.join(root, 'C'), registry, {'D:': os.path.join(root, 'D')})
+
+def baseline_os_walk(backend: MountedImageBackend) -> list:
+    """基线：对所有驱动器做一次完整的os.walk"""
+    found = []
+    for drive in backend.available_drives():
+        for dirpath, _, files in os.walk(drive):
+            found.extend(os.path.join(dirpath, f) for f in files if f == 'EnMicroMsg.db')
+    return found
+
+def run_benchmarks(root: str, repeat: int) -> None:
+    """依次运行每种发现策略并计时"""
+    backend = make_backend(root)
+    strategies = [
+        ('微信-已知路径', lambda: wechat_path.find_wechat_db_by_known_paths(backend)),
+        ('QQ-已知路径', lambda: wechat_path.find_qq_db_by_known_paths(backend)),
+        ('微信-全盘搜索(最佳优先)', lambda: wechat_path.find_wechat_db_by_global_search(None, False, backend)),
+        ('微信-全盘搜索(首个账号即停止)', lambda: wechat_path.find_wechat_db_by_global_search(None, True, backend)),
+        ('QQ-全盘搜索(最佳优先)', lambda: wechat_path.find_qq_db_by_global_search(None, False, backend)),
+        ('QQ-全盘搜索(首个账号即停止)', lambda: wechat_path.find_qq_db_by_global_search(None, True, backend)),
+        ('基线-完整os.walk', lambda: baseline_os_walk(backend)),
+    ]
+
+    print(f"\n{'策略':<32}{'最短耗时(秒)':>14}{'结果数':>10}")
+    print("-" * 56)
+    for name, func in strategies:
+        timings = []
+        result = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = func()
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<32}{min(timings):>14.3f}{len(result):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库发现性能基准测试')
+    parser.add_argument('--files', type=int, default=1_000_000, help='噪声文件数量 (默认: 1000000)')
+    parser.add_argument('--root', help='目录树位置，默认在临时目录中生成并在结束后删除')
+    parser.add_argument('--repeat', type=int, default=3, help='每种策略的重复次数 (默认: 3)')
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix='discovery_bench_')
+    try:
+        generate_tree(root, args.files)
+        run_benchmarks(root, args.repeat)
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
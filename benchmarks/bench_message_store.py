@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+消息分页基准测试
+
+生成指定数量消息的微信格式数据库，分别用MessageStore的键集分页和LIMIT/OFFSET分页
+按时间顺序读取若干位置的一页消息，比较耗时；翻页越深，OFFSET需要跳过的行越多。
+
+用法:
+    python benchmarks/bench_message_store.py                   # 100万条消息
+    python benchmarks/bench_message_store.py --messages 5000000 --page-size 500
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import create_db
+from wxdecrypt.message_store import MESSAGE_PAGE_SIZE, MessageStore
+
+def main():
+    parser = argparse.ArgumentParser(description='消息分页基准测试')
+    parser.add_argument('--messages', type=int, default=1000000, help='消息数量 (默认: 1000000)')
+    parser.add_argument('--page-size', type=int, default=MESSAGE_PAGE_SIZE,
+                        help=f'每页的消息数 (默认: {MESSAGE_PAGE_SIZE})')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='wxdecrypt_store_')
+    try:
+        db_path = os.path.join(work_dir, 'MSG0.db')
+        print(f"生成 {args.messages} 条消息...")
+        create_db(db_path, args.messages)
+
+        with MessageStore(db_path) as store:
+            start = time.perf_counter()
+            store.ensure_index('time')
+            print(f"建立时间索引: {time.perf_counter() - start:.1f} 秒")
+
+            # 先用键集分页遍历一遍，记下各个位置的起始键
+            start = time.perf_counter()
+            keys, after, pages = [None], None, 0
+            while True:
+                _, after = store.page(args.page_size, after)
+                pages += 1
+                if after is None:
+                    break
+                keys.append(after)
+            elapsed = time.perf_counter() - start
+            print(f"键集分页遍历全部 {pages} 页: {elapsed:.2f} 秒，{args.messages / elapsed:.0f} 条/秒")
+
+            table, time_col = store.schema['table'], store.schema['time']
+            print(f"\n{'页码':<10}{'键集(毫秒)':>12}{'OFFSET(毫秒)':>14}")
+            print("-" * 36)
+            for page in sorted({0, len(keys) // 4, len(keys) // 2, len(keys) - 1}):
+                start = time.perf_counter()
+                store.page(args.page_size, keys[page])
+                keyset = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                store.connection.execute(f'SELECT * FROM "{table}" ORDER BY "{time_col}", rowid LIMIT ? OFFSET ?',
+                                         (args.page_size, page * args.page_size)).fetchall()
+                offset = (time.perf_counter() - start) * 1000
+                print(f"{page:<10}{keyset:>12.1f}{offset:>14.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
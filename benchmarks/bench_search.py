@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+全文搜索基准测试
+
+生成指定数量消息的微信格式数据库，测量建立搜索索引的耗时、索引大小，
+以及若干关键词的搜索耗时，并与LIKE全表扫描比较。
+
+用法:
+    python benchmarks/bench_search.py                        # 100万条消息
+    python benchmarks/bench_search.py --messages 10000000 --tokenizer jieba
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wxdecrypt.search import TOKENIZERS, DEFAULT_TOKENIZER, SearchIndex
+
+SAMPLE_PHRASES = ['今天天气不错', '我们去公园散步吧', '晚上一起吃饭', '明天早上开会', '这个项目进展顺利',
+                  '周末去看电影', '记得带上文件', '北京大学图书馆', 'meeting at 3pm', '收到']
+QUERIES = ['天气', '图书馆', '气', '项目 顺利', 'meeting', '不存在的关键词']
+
+def create_db(path: str, count: int, seed: int = 0) -> None:
+    """生成由常见短语随机组合的消息，分布在1000个会话和约3年时间中"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE message (localId INTEGER PRIMARY KEY, StrTalker TEXT, CreateTime INTEGER, "
+                 "Content TEXT, Type INTEGER, IsSender INTEGER)")
+    base = 1600000000
+    batch = 100000
+    for offset in range(0, count, batch):
+        conn.executemany("INSERT INTO message (StrTalker, CreateTime, Content, Type, IsSender) VALUES (?, ?, ?, 1, ?)",
+                         [(f"wxid_{rng.randrange(1000)}", base + (offset + i) * 100 // max(count // 1000000, 1),
+                           ' '.join(rng.sample(SAMPLE_PHRASES, 2)) + f" {offset + i}", rng.randrange(2))
+                          for i in range(min(batch, count - offset))])
+    conn.commit()
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='全文搜索基准测试')
+    parser.add_argument('--messages', type=int, default=1000000, help='消息数量 (默认: 1000000)')
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=DEFAULT_TOKENIZER,
+                        help=f'索引的分词方式 (默认: {DEFAULT_TOKENIZER})')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='wxdecrypt_search_')
+    try:
+        db_path = os.path.join(work_dir, 'MSG0.db')
+        print(f"生成 {args.messages} 条消息...")
+        create_db(db_path, args.messages)
+
+        index = SearchIndex(db_path, tokenizer=args.tokenizer)
+        start = time.perf_counter()
+        index.update()
+        elapsed = time.perf_counter() - start
+        print(f"建立索引: {elapsed:.1f} 秒，{args.messages / elapsed:.0f} 条/秒，"
+              f"索引 {os.path.getsize(index.path) / 1024 / 1024:.1f} MB，"
+              f"数据库 {os.path.getsize(db_path) / 1024 / 1024:.1f} MB")
+
+        conn = sqlite3.connect(db_path)
+        print(f"\n{'关键词':<16}{'索引(毫秒)':>12}{'LIKE(毫秒)':>12}{'结果数':>10}")
+        print("-" * 50)
+        for query in QUERIES:
+            start = time.perf_counter()
+            hits = index.search(query, limit=50)
+            indexed = (time.perf_counter() - start) * 1000
+            conditions = ' AND '.join('Content LIKE ?' for _ in query.split())
+            start = time.perf_counter()
+            conn.execute(f"SELECT rowid FROM message WHERE {conditions} ORDER BY CreateTime DESC LIMIT 50",
+                         [f'%{word}%' for word in query.split()]).fetchall()
+            scanned = (time.perf_counter() - start) * 1000
+            print(f"{query:<16}{indexed:>12.1f}{scanned:>12.1f}{len(hits):>10}")
+        conn.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
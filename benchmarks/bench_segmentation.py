@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+分词吞吐量基准测试
+
+生成指定数量的中文消息，分别用不同的进程数统计词频，输出每秒处理的消息数，
+并检查各进程数的结果是否一致。每次运行使用新的分词缓存，--unique 使每条消息都不重复，
+用于测量不命中缓存时的吞吐量。
+
+用法:
+    python benchmarks/bench_segmentation.py                     # 20万条消息，进程数1和CPU核心数
+    python benchmarks/bench_segmentation.py --messages 1000000 --workers 1 2 4 8 --unique
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wxdecrypt.segmentation import SEGMENT_BATCH_SIZE, TokenCache, parallel_word_counts, default_workers
+
+SAMPLE_PHRASES = ['今天天气不错', '我们去公园散步吧', '晚上一起吃饭', '明天早上开会',
+                  '这个项目进展顺利', '周末去看电影', '记得带上文件', '北京大学图书馆']
+
+def generate_messages(count: int, unique: bool = False, seed: int = 0) -> list:
+    """生成由常见短语随机组合的消息，unique为True时在每条消息末尾加上序号"""
+    rng = random.Random(seed)
+    messages = [' '.join(rng.sample(SAMPLE_PHRASES, 3)) for _ in range(count)]
+    return [f"{message} {i}" for i, message in enumerate(messages)] if unique else messages
+
+def main():
+    parser = argparse.ArgumentParser(description='分词吞吐量基准测试')
+    parser.add_argument('--messages', type=int, default=200000, help='消息数量 (默认: 200000)')
+    parser.add_argument('--workers', type=int, nargs='+', help='要测试的进程数 (默认: 1和CPU核心数)')
+    parser.add_argument('--unique', action='store_true', help='生成互不重复的消息')
+    args = parser.parse_args()
+
+    workers_list = args.workers or sorted({1, default_workers()})
+    messages = generate_messages(args.messages, args.unique)
+
+    print(f"\n{'进程数':<10}{'耗时(秒)':>10}{'消息/秒':>14}")
+    print("-" * 34)
+    baseline = None
+    for workers in workers_list:
+        batches = (messages[i:i + SEGMENT_BATCH_SIZE] for i in range(0, len(messages), SEGMENT_BATCH_SIZE))
+        start = time.perf_counter()
+        counts = parallel_word_counts(batches, workers, TokenCache())
+        elapsed = time.perf_counter() - start
+        print(f"{workers:<10}{elapsed:>10.2f}{len(messages) / elapsed:>14.0f}")
+        if baseline is None:
+            baseline = counts
+        elif counts != baseline:
+            print(f"警告: {workers} 个进程的词频结果与 {workers_list[0]} 个进程不一致")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+命令行启动时间基准测试
+
+在独立的子进程中多次运行 -v、-l 和 --analyze-only，统计从启动到退出的耗时。
+--analyze-only 使用一个只有少量消息的临时数据库，耗时主要来自模块导入。
+指定 --max-seconds 后，任一命令的最短耗时超过阈值时以非零状态退出，可用于回归检查。
+
+用法:
+    python benchmarks/bench_startup.py                       # 每个命令运行5次
+    python benchmarks/bench_startup.py --repeat 10
+    python benchmarks/bench_startup.py --max-seconds 0.5     # 超过0.5秒视为回归
+    python benchmarks/bench_startup.py --importtime          # 额外输出 -v 最慢的导入模块
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def create_sample_db(path: str, count: int = 200) -> None:
+    """生成包含少量文本消息的微信格式数据库"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE message (CreateTime INTEGER, Content TEXT, Type INTEGER, "
+                 "Status INTEGER, IsSender INTEGER)")
+    base = 1600000000
+    conn.executemany("INSERT INTO message VALUES (?, ?, 1, 0, ?)",
+                     [(base + i * 3600, f"测试消息 {i} 今天天气不错", i % 2) for i in range(count)])
+    conn.commit()
+    conn.close()
+
+def run_once(args: list, cwd: str) -> float:
+    """运行一次命令并返回耗时（秒）"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''),
+               MPLBACKEND='Agg')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'wxdecrypt'] + args, cwd=cwd, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - start
+
+def show_importtime(cwd: str, top: int = 15) -> None:
+    """输出 -v 命令中累计导入耗时最长的模块"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'wxdecrypt', '-v'], cwd=cwd,
+                          env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    print(f"\n-v 中累计导入耗时最长的 {top} 个模块:")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>10.1f} ms  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description='命令行启动时间基准测试')
+    parser.add_argument('--repeat', type=int, default=5, help='每个命令的运行次数 (默认: 5)')
+    parser.add_argument('--max-seconds', type=float, help='最短耗时的上限，超过时返回非零状态')
+    parser.add_argument('--importtime', action='store_true', help='输出 -v 的模块导入耗时')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='startup_bench_')
+    try:
+        db_path = os.path.join(workdir, 'MSG0.db')
+        create_sample_db(db_path)
+        image_root = os.path.join(workdir, 'image')
+        os.makedirs(image_root)
+
+        commands = [
+            ('-v', ['-v']),
+            # 指向空的镜像目录，使 -l 在任何系统上都只测量启动和查找流程本身
+            ('-l', ['-l', '--image-root', image_root]),
+            ('--analyze-only', ['--analyze-only', db_path]),
+        ]
+
+        print(f"\n{'命令':<20}{'最短(秒)':>10}{'中位数(秒)':>12}")
+        print("-" * 42)
+        regressions = []
+        for name, cmd in commands:
+            timings = [run_once(cmd, workdir) for _ in range(args.repeat)]
+            best = min(timings)
+            print(f"{name:<20}{best:>10.3f}{statistics.median(timings):>12.3f}")
+            if args.max_seconds is not None and best > args.max_seconds:
+                regressions.append(name)
+
+        if args.importtime:
+            show_importtime(workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if regressions:
+        print(f"\n超过 {args.max_seconds} 秒的命令: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/username/wxdecrypt",
     packages=find_packages(),
+    package_data={"wxdecrypt": ["assets/*.js"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
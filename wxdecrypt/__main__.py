@@ -1,7 +1,9 @@
 """
 包入口文件，允许直接运行 python -m wxdecrypt
 """
+import multiprocessing
 from wxdecrypt.main import main
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+汇总分析模块
+把多个数据库（同一账号的多个MSG分库、多个账号，以及微信和QQ）的统计结果合并为一份报告，
+并为每个账号单独生成报告。各数据库在多个进程中并行统计，每个数据库仍按水位线增量分析，
+进程之间只传递很小的分组计数和词频
+"""
+import os
+import re
+import html
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
+
+from wxdecrypt.data_analysis import (
+    analyze_database, update_analysis_state, query_bucket_counts, count_message_words,
+    summarize_bucket_counts, create_visualizations, generate_word_frequency, render_report_charts, write_report
+)
+from wxdecrypt.segmentation import init_segmenter, default_workers, get_token_cache
+from wxdecrypt.utils.time_utils import format_times
+
+# 每个账号的报告保存在汇总目录下的这个子目录中
+ACCOUNTS_DIR_NAME = 'accounts'
+
+# 汇总报告的账号列表中显示的高频词数量
+ACCOUNT_TOP_WORDS = 10
+
+def account_label(account: str, is_qq: bool) -> str:
+    """账号的显示名称"""
+    return f"{'QQ' if is_qq else '微信'} {account}"
+
+def _account_dir_name(account: str, is_qq: bool) -> str:
+    """账号报告的目录名，去掉文件名中不允许的字符"""
+    return re.sub(r'[\\/:*?"<>|\s]', '_', f"{'QQ' if is_qq else 'WeChat'}_{account}")
+
+def collect_database_stats(db_path: str, is_qq: bool = False,
+                           account: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    统计单个数据库，在汇总分析的工作进程中调用
+
+    分析状态和消息缓存与单独分析该数据库时共用（数据库所在目录的analysis中），
+    已经分析过的消息不会重复统计
+
+    Args:
+        db_path: 数据库路径
+        is_qq: 是否为QQ数据库
+        account: 所属账号，为None时使用数据库所在目录名
+
+    Returns:
+        Dict: db_path、account、is_qq、message_count、bucket_rows和word_counts；
+        数据库中没有消息时返回None
+    """
+    output_dir = os.path.join(os.path.dirname(db_path), 'analysis')
+    analysis_data = analyze_database(db_path, output_dir, is_qq)
+    if not analysis_data:
+        return None
+
+    # 汇总分析已经按数据库并行，单个数据库内不再启动分词进程
+    if analysis_data['schema'].get('has_rowid'):
+        state = update_analysis_state(analysis_data, output_dir, workers=1)
+        bucket_rows, word_counts = state.bucket_rows(), state.word_counts
+    else:
+        cache = analysis_data.get('message_cache')
+        bucket_rows = query_bucket_counts(db_path, analysis_data['schema'], cache=cache)
+        word_counts = count_message_words(db_path, analysis_data['schema'], analysis_data['message_count'],
+                                          workers=1, cache=cache)
+    # 每个数据库统计完成后保存一次分词缓存（工作进程各自持有缓存）
+    get_token_cache().save()
+
+    return {
+        'db_path': db_path,
+        'account': account or os.path.basename(os.path.dirname(os.path.abspath(db_path))),
+        'is_qq': is_qq,
+        'message_count': sum(row[3] for row in bucket_rows),
+        'bucket_rows': bucket_rows,
+        'word_counts': word_counts,
+    }
+
+def collect_all_stats(databases: List[Dict[str, Any]], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    并行统计多个数据库
+
+    Args:
+        databases: 数据库列表，每项包含path、is_qq和account（可选）
+        workers: 进程数，默认使用CPU核心数，不大于1时依次在当前进程中统计
+
+    Returns:
+        List: 各数据库的collect_database_stats结果，跳过没有消息或统计失败的数据库
+    """
+    workers = min(default_workers() if workers is None else workers, len(databases))
+    results = []
+    if workers <= 1:
+        for db in databases:
+            try:
+                stats = collect_database_stats(db['path'], db.get('is_qq', False), db.get('account'))
+            except Exception as e:
+                print(f"统计数据库时出错 {db['path']}: {e}")
+                continue
+            if stats:
+                results.append(stats)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_segmenter) as executor:
+        futures = {executor.submit(collect_database_stats, db['path'], db.get('is_qq', False),
+                                   db.get('account')): db for db in databases}
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"统计数据库时出错 {futures[future]['path']}: {e}")
+                continue
+            if stats:
+                results.append(stats)
+    # 按输入顺序排列，报告内容与进程完成的先后无关
+    order = {db['path']: i for i, db in enumerate(databases)}
+    results.sort(key=lambda stats: order[stats['db_path']])
+    return results
+
+def merge_stats(stats_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并多个数据库的分组计数和词频"""
+    bucket_counts = Counter()
+    word_counts = Counter()
+    for stats in stats_list:
+        for bucket, msg_type, is_sender, count in stats['bucket_rows']:
+            bucket_counts[(bucket, msg_type, is_sender)] += count
+        word_counts.update(stats['word_counts'])
+    return {
+        'bucket_rows': [key + (count,) for key, count in bucket_counts.items()],
+        'word_counts': word_counts,
+        'databases': [stats['db_path'] for stats in stats_list],
+    }
+
+def _write_charts(merged: Dict[str, Any], output_dir: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """生成合并结果的图表和词频，返回聚合统计和高频词"""
+    analysis_data = {
+        'aggregates': summarize_bucket_counts(merged['bucket_rows']),
+        'word_counts': merged['word_counts'],
+    }
+    charts = []
+    create_visualizations(analysis_data, output_dir, charts)
+    top_words = generate_word_frequency(analysis_data, output_dir, top_n=100, charts=charts)
+    render_report_charts(charts, output_dir)
+    return analysis_data['aggregates'], top_words
+
+def _account_table(accounts: List[Dict[str, Any]]) -> str:
+    """汇总报告中的账号列表"""
+    rows = []
+    for account in accounts:
+        aggregates = account['aggregates']
+        time_range = ''
+        if aggregates.get('first_bucket') is not None:
+            first, last = format_times([aggregates['first_bucket'], aggregates['last_bucket']], '%Y-%m-%d')
+            time_range = f"{first} 至 {last}"
+        top_words = '、'.join(word for word, _ in account['word_counts'].most_common(ACCOUNT_TOP_WORDS))
+        rows.append(f"""
+                    <tr>
+                        <td><a href="{html.escape(account['report'])}">{html.escape(account['label'])}</a></td>
+                        <td>{len(account['databases'])}</td>
+                        <td>{aggregates['total']}</td>
+                        <td>{time_range}</td>
+                        <td>{html.escape(top_words)}</td>
+                    </tr>""")
+    return f"""
+                <h2>各账号统计</h2>
+                <table>
+                    <tr><th>账号</th><th>数据库数</th><th>消息数</th><th>时间范围</th><th>高频词</th></tr>{''.join(rows)}
+                </table>"""
+
+def generate_aggregate_report(databases: List[Dict[str, Any]], output_dir: str,
+                              workers: Optional[int] = None) -> Optional[str]:
+    """
+    汇总分析多个数据库，生成一份合并报告和每个账号的报告
+
+    Args:
+        databases: 数据库列表，每项包含path、is_qq和account（可选）
+        output_dir: 汇总报告的输出目录，账号报告保存在其中的accounts子目录
+        workers: 统计数据库的进程数，默认使用CPU核心数
+
+    Returns:
+        str: 合并报告的路径，没有可分析的消息时返回None
+    """
+    print(f"\n开始汇总分析 {len(databases)} 个数据库...")
+    stats_list = collect_all_stats(databases, workers)
+    if not stats_list:
+        print("没有可分析的消息数据")
+        return None
+
+    # 按账号分组，保持首次出现的顺序
+    groups = {}
+    for stats in stats_list:
+        groups.setdefault((stats['account'], stats['is_qq']), []).append(stats)
+
+    accounts = []
+    for (account, is_qq), group in groups.items():
+        merged = merge_stats(group)
+        account_dir = os.path.join(output_dir, ACCOUNTS_DIR_NAME, _account_dir_name(account, is_qq))
+        label = account_label(account, is_qq)
+        print(f"\n生成账号报告: {label}")
+        aggregates, top_words = _write_charts(merged, account_dir)
+        sources = '、'.join(os.path.basename(path) for path in merged['databases'])
+        report_path = write_report(account_dir, f"账号: {label}（数据库: {sources}）", aggregates, top_words)
+        accounts.append(dict(merged, label=label, aggregates=aggregates,
+                             report=os.path.relpath(report_path, output_dir).replace(os.sep, '/')))
+
+    print("\n生成汇总报告...")
+    merged = merge_stats(stats_list)
+    aggregates, top_words = _write_charts(merged, output_dir)
+    source = f"汇总 {len(accounts)} 个账号的 {len(stats_list)} 个数据库"
+    report_path = write_report(output_dir, source, aggregates, top_words, extra_html=_account_table(accounts))
+    print(f"汇总报告已保存到: {report_path}")
+    return report_path
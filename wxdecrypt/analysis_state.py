@@ -0,0 +1,102 @@
+"""
+增量分析状态
+在每个数据库的缓存目录中保存已处理到的rowid（水位线）、累计的词频和按时间桶的分组计数，
+再次分析时只处理水位线之后的新消息并合并到保存的状态中。
+时间桶按UTC时间戳保存，换算时区在生成图表时进行，修改时区不需要重新分析
+"""
+import os
+import json
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+ANALYSIS_STATE_FILE = 'analysis_state.json'
+
+# 状态格式或统计规则（如停用词）变化时递增，旧状态会被丢弃
+STATE_VERSION = 2
+
+class AnalysisState:
+    """单个数据库的增量分析状态"""
+
+    def __init__(self, db_path: str, schema: Dict[str, Any]):
+        """
+        初始化空的分析状态
+
+        Args:
+            db_path: 数据库路径
+            schema: 消息表结构，结构不同的状态不能合并
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.schema = schema
+        self.last_rowid = 0  # 已处理消息的最大rowid
+        self.message_count = 0  # 已处理的消息数
+        self.bucket_counts = Counter()  # (时间桶, 类型, 是否发送) -> 消息数
+        self.word_counts = Counter()
+
+    @classmethod
+    def load(cls, state_dir: str, db_path: str, schema: Dict[str, Any]) -> 'AnalysisState':
+        """读取目录中的状态，不存在、已损坏或与数据库不匹配时返回空状态"""
+        state = cls(db_path, schema)
+        try:
+            with open(os.path.join(state_dir, ANALYSIS_STATE_FILE), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return state
+
+        if (data.get('version') != STATE_VERSION or data.get('db_path') != state.db_path
+                or data.get('schema') != schema):
+            return state
+        try:
+            state.last_rowid = int(data['last_rowid'])
+            state.message_count = int(data['message_count'])
+            state.bucket_counts = Counter({tuple(row[:3]): row[3] for row in data['bucket_counts']})
+            state.word_counts = Counter(data['word_counts'])
+        except (KeyError, TypeError, ValueError, IndexError):
+            return cls(db_path, schema)
+        return state
+
+    def save(self, state_dir: str) -> None:
+        """写入目录，先写临时文件再替换"""
+        os.makedirs(state_dir, exist_ok=True)
+        path = os.path.join(state_dir, ANALYSIS_STATE_FILE)
+        data = {
+            'version': STATE_VERSION,
+            'db_path': self.db_path,
+            'schema': self.schema,
+            'last_rowid': self.last_rowid,
+            'message_count': self.message_count,
+            'bucket_counts': [list(key) + [count] for key, count in self.bucket_counts.items()],
+            'word_counts': dict(self.word_counts),
+        }
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"保存分析状态失败: {e}")
+
+    def reset(self) -> None:
+        """丢弃已累计的结果，下次从头分析"""
+        self.last_rowid = 0
+        self.message_count = 0
+        self.bucket_counts.clear()
+        self.word_counts.clear()
+
+    def merge(self, upto_rowid: int, bucket_rows: List[Tuple[int, int, int, int]],
+              word_counts: Counter) -> None:
+        """
+        合并水位线之后新消息的统计结果
+
+        Args:
+            upto_rowid: 本次处理到的最大rowid，成为新的水位线
+            bucket_rows: (时间桶, 类型, 是否发送, 消息数) 分组计数
+            word_counts: 新消息的词频
+        """
+        for bucket, msg_type, is_sender, count in bucket_rows:
+            self.bucket_counts[(bucket, msg_type, is_sender)] += count
+            self.message_count += count
+        self.word_counts.update(word_counts)
+        self.last_rowid = upto_rowid
+
+    def bucket_rows(self) -> List[Tuple[int, int, int, int]]:
+        """返回累计的分组计数，格式与merge的bucket_rows相同"""
+        return [key + (count,) for key, count in self.bucket_counts.items()]
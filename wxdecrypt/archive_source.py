@@ -0,0 +1,186 @@
+"""
+压缩包数据源，直接在zip/tar备份中查找并解密数据库
+压缩包成员按与已知路径查找相同的规则匹配，匹配到的成员以流的方式送入解密流程，
+除解密后的明文数据库外不会向磁盘解压任何内容
+"""
+import os
+import shutil
+import time
+import tarfile
+import zipfile
+from typing import List, Dict, Any, Optional, Iterator, Tuple, BinaryIO
+
+from wxdecrypt.wechat_path import (
+    is_wechat_user_folder, is_wechat_db_file, is_qq_db_file, WECHAT_MAIN_DB, MIN_DB_SIZE,
+    _extract_wxid_from_path, _extract_qqid_from_path
+)
+from wxdecrypt.db_decrypt import get_output_path
+from wxdecrypt.utils.crypto_utils import decrypt_stream
+
+# 这些目录的直接子目录是用户文件夹，与find_wechat_db_by_known_paths中的根目录对应
+WECHAT_ROOT_FOLDERS = ('WeChat Files', 'Tencent Files', 'WeChat', 'MicroMsg')
+
+# 记录中path字段的分隔符：压缩包路径::成员名
+MEMBER_SEP = '::'
+
+def is_archive(path: str) -> bool:
+    """判断文件是否为支持的压缩包（zip、tar、tar.gz、tar.bz2、tar.xz）"""
+    if not os.path.isfile(path):
+        return False
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+def match_archive_member(archive_path: str, member: str, size: int,
+                         is_qq: bool = False, mtime: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    按已知路径规则匹配压缩包成员
+
+    Args:
+        archive_path: 压缩包路径
+        member: 成员名（压缩包内的相对路径）
+        size: 成员解压后的大小
+        is_qq: 是否匹配QQ数据库
+        mtime: 成员的修改时间
+
+    Returns:
+        匹配时返回数据库信息字典，否则返回None
+    """
+    parts = [p for p in member.replace('\\', '/').split('/') if p]
+    if not parts or size < MIN_DB_SIZE:
+        return None
+    file = parts[-1]
+
+    record = {
+        'path': f"{archive_path}{MEMBER_SEP}{member}",
+        'db_name': file,
+        'archive': archive_path,
+        'member': member,
+        'size': size,
+        'mtime': mtime,
+        'inode': None,
+    }
+
+    if is_qq:
+        if not is_qq_db_file(file):
+            return None
+        record['qqid'] = _extract_qqid_from_path('/'.join(parts[:-1]))
+        return record
+
+    # 用户文件夹是微信文件目录的直接子目录；没有这类目录时，压缩包根目录即视为微信文件目录
+    dirs = parts[:-1]
+    root_index = next((i for i, d in enumerate(dirs[:-1]) if d in WECHAT_ROOT_FOLDERS), None)
+    user_folder = dirs[root_index + 1] if root_index is not None else (dirs[0] if dirs else None)
+    if not user_folder or not is_wechat_user_folder(user_folder) or not is_wechat_db_file(file):
+        return None
+
+    record.update({
+        'username': user_folder,
+        'wxid': _extract_wxid_from_path(user_folder),
+        'is_main_db': (file == WECHAT_MAIN_DB),
+    })
+    return record
+
+def _iter_members(archive_path: str) -> Iterator[Tuple[str, int, float, Any]]:
+    """
+    单次顺序遍历压缩包成员
+
+    Yields:
+        (成员名, 大小, 修改时间, 打开成员的函数)，打开函数只能在本次迭代内调用
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                yield info.filename, info.file_size, mtime, lambda info=info: zf.open(info)
+    else:
+        # 流模式，tar.gz等压缩格式只需顺序解压一遍
+        with tarfile.open(archive_path, 'r|*') as tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+                yield info.name, info.size, info.mtime, lambda info=info: tf.extractfile(info)
+
+def find_db_in_archive(archive_path: str, is_qq: bool = False) -> List[Dict[str, Any]]:
+    """
+    列出压缩包中的微信/QQ数据库
+
+    Args:
+        archive_path: 压缩包路径
+        is_qq: 是否查找QQ数据库
+
+    Returns:
+        数据库信息列表，与find_wechat_db_by_known_paths的格式相同，另外包含archive、member和size字段
+    """
+    found_dbs = []
+    try:
+        for member, size, mtime, _ in _iter_members(archive_path):
+            record = match_archive_member(archive_path, member, size, is_qq, mtime)
+            if record:
+                found_dbs.append(record)
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        print(f"无法读取压缩包 {archive_path}: {e}")
+    return found_dbs
+
+def decrypt_archive(archive_path: str, output_dir: str, key=None,
+                    is_qq: bool = False) -> List[Dict[str, Any]]:
+    """
+    在单次遍历中查找并解密压缩包内的数据库
+
+    Args:
+        archive_path: 压缩包路径
+        output_dir: 解密后数据库的输出目录
+        key: 微信数据库密钥，QQ数据库不需要
+        is_qq: 是否处理QQ数据库
+
+    Returns:
+        解密结果列表，格式与auto_find_and_decrypt相同
+    """
+    results = []
+    if not is_qq and not key:
+        print("未设置数据库密钥，无法解密压缩包中的微信数据库")
+        return results
+
+    print(f"正在处理压缩包: {archive_path}")
+    try:
+        for member, size, mtime, open_member in _iter_members(archive_path):
+            db_info = match_archive_member(archive_path, member, size, is_qq, mtime)
+            if not db_info:
+                continue
+
+            output_path = get_output_path(db_info, output_dir, is_qq)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            print(f"正在解密压缩包成员: {member}")
+            with open_member() as src:
+                success = _decrypt_member(src, output_path, key, is_qq)
+
+            results.append({
+                'original': db_info,
+                'decrypted_path': output_path if success else None,
+                'success': success
+            })
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        print(f"读取压缩包时出错 {archive_path}: {e}")
+
+    return results
+
+def _decrypt_member(src: BinaryIO, output_path: str, key, is_qq: bool) -> bool:
+    """将压缩包成员流解密（QQ数据库直接复制）到输出路径"""
+    temp_path = output_path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as dst:
+            if is_qq:
+                # QQ数据库通常不加密，直接复制
+                shutil.copyfileobj(src, dst)
+            else:
+                pages = decrypt_stream(key, src, dst)
+                print(f"已解密 {pages} 页")
+        os.replace(temp_path, output_path)
+        print(f"解密成功: {output_path}")
+        return True
+    except Exception as e:
+        print(f"解密失败: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
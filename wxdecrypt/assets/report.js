@@ -0,0 +1,285 @@
+/*
+ * 交互式分析报告的渲染脚本，由interactive_report.py内嵌到报告中，不依赖任何外部资源。
+ * 从页面中id为report-data的JSON读取预先计算的统计结果，在浏览器中绘制SVG图表。
+ * 在每日消息数量图表上拖动选择时间范围，双击恢复全部时间；其他按时间统计的图表随之更新。
+ */
+(function () {
+    'use strict';
+
+    var SVG_NS = 'http://www.w3.org/2000/svg';
+    var WEEKDAYS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'];
+    var COLOR = '#4e79a7';
+
+    var data = JSON.parse(document.getElementById('report-data').textContent);
+    var days = data.days;
+    var dayTotals = data.day_hours.map(function (hours) {
+        return hours.reduce(function (a, b) { return a + b; }, 0);
+    });
+    var range = [0, days.length - 1];
+
+    function el(tag, attrs, parent, text) {
+        var node = document.createElementNS(SVG_NS, tag);
+        for (var key in attrs) {
+            node.setAttribute(key, attrs[key]);
+        }
+        if (text !== undefined) {
+            node.textContent = text;
+        }
+        if (parent) {
+            parent.appendChild(node);
+        }
+        return node;
+    }
+
+    function svg(containerId, width, height) {
+        var container = document.getElementById(containerId);
+        container.innerHTML = '';
+        return el('svg', {viewBox: '0 0 ' + width + ' ' + height, width: '100%'}, container);
+    }
+
+    function niceMax(value) {
+        if (value <= 0) {
+            return 1;
+        }
+        var step = Math.pow(10, Math.floor(Math.log(value) / Math.LN10));
+        var ratio = value / step;
+        return (ratio <= 1 ? 1 : ratio <= 2 ? 2 : ratio <= 5 ? 5 : 10) * step;
+    }
+
+    function yAxis(root, left, top, height, right, maxValue) {
+        for (var i = 0; i <= 4; i++) {
+            var y = top + height - height * i / 4;
+            el('line', {x1: left, x2: right, y1: y, y2: y, stroke: '#e5e5e5'}, root);
+            el('text', {x: left - 6, y: y + 4, 'text-anchor': 'end', 'font-size': 11, fill: '#666'},
+               root, Math.round(maxValue * i / 4));
+        }
+    }
+
+    function sumHours(start, stop) {
+        var hours = [];
+        var weekdayHour = [];
+        var h, w;
+        for (h = 0; h < 24; h++) {
+            hours.push(0);
+        }
+        for (w = 0; w < 7; w++) {
+            weekdayHour.push(hours.slice());
+        }
+        for (var i = start; i <= stop; i++) {
+            var parts = days[i].split('-');
+            var weekday = (new Date(+parts[0], parts[1] - 1, +parts[2]).getDay() + 6) % 7;
+            for (h = 0; h < 24; h++) {
+                hours[h] += data.day_hours[i][h];
+                weekdayHour[weekday][h] += data.day_hours[i][h];
+            }
+        }
+        return {hours: hours, weekdayHour: weekdayHour};
+    }
+
+    function drawDaily() {
+        var width = 1000, height = 320, left = 60, top = 20, plotW = width - left - 20, plotH = height - top - 40;
+        var root = svg('chart-daily', width, height);
+        var start = range[0], stop = range[1], count = stop - start + 1;
+        var maxValue = niceMax(Math.max.apply(null, dayTotals.slice(start, stop + 1)));
+        yAxis(root, left, top, plotH, left + plotW, maxValue);
+
+        function x(i) {
+            return left + (count > 1 ? plotW * (i - start) / (count - 1) : plotW / 2);
+        }
+        var points = [];
+        for (var i = start; i <= stop; i++) {
+            points.push(x(i).toFixed(1) + ',' + (top + plotH - plotH * dayTotals[i] / maxValue).toFixed(1));
+        }
+        el('polyline', {points: points.join(' '), fill: 'none', stroke: COLOR, 'stroke-width': 1.5}, root);
+        var labels = Math.min(count, 8);
+        for (var j = 0; j < labels; j++) {
+            var index = start + Math.round((count - 1) * j / Math.max(labels - 1, 1));
+            el('text', {x: x(index), y: height - 15, 'text-anchor': 'middle', 'font-size': 11, fill: '#666'},
+               root, days[index]);
+        }
+
+        // 拖动选择时间范围
+        var selection = el('rect', {y: top, height: plotH, fill: COLOR, opacity: 0.15, width: 0}, root);
+        var overlay = el('rect', {x: left, y: top, width: plotW, height: plotH, fill: 'transparent',
+                                  style: 'cursor: crosshair'}, root);
+        var dragStart = null;
+        function dayAt(event) {
+            var box = root.getBoundingClientRect();
+            var px = (event.clientX - box.left) * width / box.width;
+            var ratio = Math.min(Math.max((px - left) / plotW, 0), 1);
+            return start + Math.round(ratio * (count - 1));
+        }
+        overlay.addEventListener('mousedown', function (event) {
+            dragStart = dayAt(event);
+            event.preventDefault();
+        });
+        overlay.addEventListener('mousemove', function (event) {
+            if (dragStart === null) {
+                return;
+            }
+            var a = x(Math.min(dragStart, dayAt(event))), b = x(Math.max(dragStart, dayAt(event)));
+            selection.setAttribute('x', a);
+            selection.setAttribute('width', b - a);
+        });
+        overlay.addEventListener('mouseup', function (event) {
+            if (dragStart === null) {
+                return;
+            }
+            var end = dayAt(event);
+            if (end !== dragStart) {
+                setRange(Math.min(dragStart, end), Math.max(dragStart, end));
+            }
+            dragStart = null;
+        });
+        overlay.addEventListener('dblclick', function () {
+            setRange(0, days.length - 1);
+        });
+    }
+
+    function drawHourly(hours) {
+        var width = 1000, height = 300, left = 60, top = 20, plotW = width - left - 20, plotH = height - top - 40;
+        var root = svg('chart-hourly', width, height);
+        var maxValue = niceMax(Math.max.apply(null, hours));
+        yAxis(root, left, top, plotH, left + plotW, maxValue);
+        var slot = plotW / 24;
+        for (var h = 0; h < 24; h++) {
+            var barH = plotH * hours[h] / maxValue;
+            var bar = el('rect', {x: left + h * slot + slot * 0.1, y: top + plotH - barH, width: slot * 0.8,
+                                  height: barH, fill: COLOR}, root);
+            el('title', {}, bar, h + '时: ' + hours[h]);
+            el('text', {x: left + h * slot + slot / 2, y: height - 15, 'text-anchor': 'middle', 'font-size': 11,
+                        fill: '#666'}, root, h);
+        }
+    }
+
+    function drawHeatmap(weekdayHour) {
+        var width = 1000, height = 260, left = 50, top = 10, cellW = (width - left - 20) / 24, cellH = 30;
+        var root = svg('chart-heatmap', width, height);
+        var maxValue = 1;
+        weekdayHour.forEach(function (row) {
+            maxValue = Math.max(maxValue, Math.max.apply(null, row));
+        });
+        for (var w = 0; w < 7; w++) {
+            el('text', {x: left - 8, y: top + w * cellH + cellH / 2 + 4, 'text-anchor': 'end', 'font-size': 12,
+                        fill: '#666'}, root, WEEKDAYS[w]);
+            for (var h = 0; h < 24; h++) {
+                var value = weekdayHour[w][h];
+                var cell = el('rect', {x: left + h * cellW, y: top + w * cellH, width: cellW - 1, height: cellH - 1,
+                                       fill: 'rgb(255,' + Math.round(240 - 200 * value / maxValue) + ','
+                                             + Math.round(200 - 200 * value / maxValue) + ')'}, root);
+                el('title', {}, cell, WEEKDAYS[w] + ' ' + h + '时: ' + value);
+            }
+        }
+        for (var hour = 0; hour < 24; hour++) {
+            el('text', {x: left + hour * cellW + cellW / 2, y: top + 7 * cellH + 16, 'text-anchor': 'middle',
+                        'font-size': 11, fill: '#666'}, root, hour);
+        }
+    }
+
+    function drawBars(containerId, items) {
+        // items为[[标签, 数值], ...]，按给定顺序绘制横向条形图
+        var rowH = 22, left = 160, width = 1000, height = Math.max(items.length, 1) * rowH + 10;
+        var root = svg(containerId, width, height);
+        var maxValue = Math.max.apply(null, items.map(function (item) { return item[1]; }).concat([1]));
+        items.forEach(function (item, i) {
+            var y = 5 + i * rowH;
+            el('text', {x: left - 8, y: y + rowH / 2 + 4, 'text-anchor': 'end', 'font-size': 12}, root, item[0]);
+            var barW = (width - left - 80) * item[1] / maxValue;
+            el('rect', {x: left, y: y + 3, width: barW, height: rowH - 6, fill: COLOR}, root);
+            el('text', {x: left + barW + 6, y: y + rowH / 2 + 4, 'font-size': 11, fill: '#666'}, root, item[1]);
+        });
+    }
+
+    function drawChats() {
+        var table = document.getElementById('chat-table');
+        if (!table || !data.chats.length) {
+            return;
+        }
+        var columns = ['talker', 'message_count', 'sent_count', 'active_days', 'first_day', 'words'];
+        var sortKey = 'message_count', descending = true;
+
+        function render() {
+            var rows = data.chats.slice().sort(function (a, b) {
+                var order = a[sortKey] < b[sortKey] ? -1 : a[sortKey] > b[sortKey] ? 1 : 0;
+                return descending ? -order : order;
+            });
+            var body = table.tBodies[0];
+            body.innerHTML = '';
+            rows.forEach(function (chat) {
+                var tr = body.insertRow();
+                columns.forEach(function (key) {
+                    var value = chat[key];
+                    if (key === 'first_day') {
+                        value = chat.first_day + ' 至 ' + chat.last_day;
+                    } else if (key === 'words') {
+                        value = value.join('、');
+                    }
+                    tr.insertCell().textContent = value;
+                });
+            });
+        }
+
+        Array.prototype.forEach.call(table.tHead.rows[0].cells, function (cell, i) {
+            if (columns[i] === 'words') {
+                return;
+            }
+            cell.style.cursor = 'pointer';
+            cell.addEventListener('click', function () {
+                descending = sortKey === columns[i] ? !descending : true;
+                sortKey = columns[i];
+                render();
+            });
+        });
+        render();
+    }
+
+    function setRange(start, stop) {
+        range = [start, stop];
+        document.getElementById('range-start').value = days[start];
+        document.getElementById('range-end').value = days[stop];
+        var total = dayTotals.slice(start, stop + 1).reduce(function (a, b) { return a + b; }, 0);
+        document.getElementById('range-summary').textContent =
+            days[start] + ' 至 ' + days[stop] + '，共 ' + total + ' 条消息';
+        var sums = sumHours(start, stop);
+        drawDaily();
+        drawHourly(sums.hours);
+        drawHeatmap(sums.weekdayHour);
+    }
+
+    function indexOfDay(value, fallback) {
+        // 找到不早于value的第一天，日期数组按升序排列
+        for (var i = 0; i < days.length; i++) {
+            if (days[i] >= value) {
+                return i;
+            }
+        }
+        return fallback;
+    }
+
+    function onRangeInput() {
+        var start = indexOfDay(document.getElementById('range-start').value, days.length - 1);
+        var stopValue = document.getElementById('range-end').value;
+        var stop = days.length - 1;
+        while (stop > 0 && days[stop] > stopValue) {
+            stop--;
+        }
+        if (start <= stop) {
+            setRange(start, stop);
+        }
+    }
+
+    if (!days.length) {
+        document.getElementById('range-summary').textContent = '没有消息数据';
+        return;
+    }
+    document.getElementById('range-start').addEventListener('change', onRangeInput);
+    document.getElementById('range-end').addEventListener('change', onRangeInput);
+    document.getElementById('range-reset').addEventListener('click', function () {
+        setRange(0, days.length - 1);
+    });
+    setRange(0, days.length - 1);
+    drawBars('chart-types', data.types);
+    drawBars('chart-senders', data.senders);
+    drawBars('chart-words', data.words.slice(0, 30));
+    drawChats();
+})();
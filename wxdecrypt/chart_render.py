@@ -0,0 +1,178 @@
+"""
+图表渲染模块
+分析步骤只生成图表描述（类型、文件名和绘图数据），由这里统一渲染。图表使用面向对象的Figure API
+和Agg画布绘制，不经过pyplot的全局状态，可以在多个进程中同时绘制，也可以在GUI的后台线程中安全调用。
+分辨率可以通过set_default_dpi、环境变量WXDECRYPT_CHART_DPI或--chart-dpi设置，
+预览（preview）配置使用低分辨率，适合快速查看
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Union
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from wxdecrypt.segmentation import default_workers
+from wxdecrypt.utils.font_utils import apply_cjk_font
+
+CHART_DPI_ENV = 'WXDECRYPT_CHART_DPI'
+
+# 分辨率配置：预览、默认和打印
+CHART_PROFILES = {
+    'preview': 72,
+    'standard': 150,
+    'high': 300,
+}
+DEFAULT_PROFILE = 'standard'
+
+_default_dpi = None
+
+def parse_dpi(value: Union[str, int, None]) -> Optional[int]:
+    """把配置名（preview、standard、high）或数字转换为DPI，无法识别时返回None"""
+    if value is None:
+        return None
+    if isinstance(value, str) and value.lower() in CHART_PROFILES:
+        return CHART_PROFILES[value.lower()]
+    try:
+        dpi = int(value)
+    except (TypeError, ValueError):
+        return None
+    return dpi if dpi > 0 else None
+
+def set_default_dpi(value: Union[str, int, None]) -> None:
+    """设置默认分辨率，为None时恢复为环境变量或standard配置"""
+    global _default_dpi
+    _default_dpi = parse_dpi(value)
+
+def resolve_dpi(dpi: Union[str, int, None] = None) -> int:
+    """
+    确定图表分辨率
+
+    优先级：参数 > set_default_dpi > 环境变量WXDECRYPT_CHART_DPI > standard配置
+    """
+    return (parse_dpi(dpi) or _default_dpi or parse_dpi(os.environ.get(CHART_DPI_ENV))
+            or CHART_PROFILES[DEFAULT_PROFILE])
+
+def init_renderer() -> None:
+    """设置中文字体，作为渲染进程的初始化函数"""
+    apply_cjk_font()
+
+def _draw_line(fig: Figure, ax, chart: Dict[str, Any]) -> None:
+    ax.plot(chart['x'], chart['y'])
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.autofmt_xdate()
+
+def _draw_bar(fig: Figure, ax, chart: Dict[str, Any]) -> None:
+    ax.bar(chart['x'], chart['y'])
+    ax.set_xticks(chart['x'])
+    ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+
+def _draw_barh(fig: Figure, ax, chart: Dict[str, Any]) -> None:
+    positions = range(len(chart['y']))
+    ax.barh(positions, chart['x'], align='center')
+    ax.set_yticks(positions)
+    ax.set_yticklabels(chart['y'])
+
+def _draw_heatmap(fig: Figure, ax, chart: Dict[str, Any]) -> None:
+    image = ax.imshow(chart['values'], aspect='auto', cmap='YlOrRd')
+    fig.colorbar(image, ax=ax, label=chart.get('colorbar', ''))
+    ax.set_xticks(range(len(chart['values'][0])))
+    ax.set_yticks(range(len(chart['rows'])))
+    ax.set_yticklabels(chart['rows'])
+
+def _draw_pie(fig: Figure, ax, chart: Dict[str, Any]) -> None:
+    ax.pie(chart['values'], labels=chart['labels'], autopct='%1.1f%%')
+    ax.axis('equal')
+
+def _draw_wordcloud(fig: Figure, ax, chart: Dict[str, Any]) -> None:
+    import wordcloud
+    wc = wordcloud.WordCloud(
+        font_path=apply_cjk_font(),
+        width=800, height=600,
+        background_color='white',
+        max_words=200,
+        max_font_size=150,
+        random_state=42
+    )
+    wc.generate_from_frequencies(chart['frequencies'])
+    ax.imshow(wc, interpolation='bilinear')
+    ax.axis('off')
+
+CHART_DRAWERS = {
+    'line': _draw_line,
+    'bar': _draw_bar,
+    'barh': _draw_barh,
+    'heatmap': _draw_heatmap,
+    'pie': _draw_pie,
+    'wordcloud': _draw_wordcloud,
+}
+
+def render_chart(chart: Dict[str, Any], output_dir: str, dpi: int) -> str:
+    """
+    绘制一张图表并保存为PNG
+
+    Args:
+        chart: 图表描述，包含kind（见CHART_DRAWERS）、file、figsize、title、xlabel、ylabel和绘图数据
+        output_dir: 输出目录
+        dpi: 分辨率
+
+    Returns:
+        str: 图片路径
+    """
+    apply_cjk_font()
+    fig = Figure(figsize=chart['figsize'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    CHART_DRAWERS[chart['kind']](fig, ax, chart)
+    if chart.get('title'):
+        ax.set_title(chart['title'])
+    if chart.get('xlabel'):
+        ax.set_xlabel(chart['xlabel'])
+    if chart.get('ylabel'):
+        ax.set_ylabel(chart['ylabel'])
+    fig.tight_layout()
+    path = os.path.join(output_dir, chart['file'])
+    fig.savefig(path, dpi=dpi)
+    return path
+
+def render_charts(charts: List[Dict[str, Any]], output_dir: str, dpi: Union[str, int, None] = None,
+                  workers: Optional[int] = None) -> List[str]:
+    """
+    渲染多张图表，图表数和CPU核心数都大于1时在多个进程中同时绘制
+
+    Args:
+        charts: 图表描述列表，每项还可以包含label，用于输出提示
+        output_dir: 输出目录
+        dpi: 分辨率或配置名，默认见resolve_dpi
+        workers: 进程数，默认使用CPU核心数，不大于1时在当前进程中绘制
+
+    Returns:
+        List[str]: 成功生成的图片路径
+    """
+    if not charts:
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    dpi = resolve_dpi(dpi)
+    workers = min(default_workers() if workers is None else workers, len(charts))
+    paths = []
+
+    def finish(chart, render):
+        label = chart.get('label', chart['file'])
+        try:
+            path = render()
+        except Exception as e:
+            print(f"生成{label}时出错: {e}")
+            return
+        print(f"已生成{label}: {path}")
+        paths.append(path)
+
+    if workers <= 1:
+        for chart in charts:
+            finish(chart, lambda: render_chart(chart, output_dir, dpi))
+        return paths
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_renderer) as executor:
+        futures = {executor.submit(render_chart, chart, output_dir, dpi): chart for chart in charts}
+        for future in as_completed(futures):
+            finish(futures[future], future.result)
+    return paths
@@ -0,0 +1,447 @@
+"""
+客户端自带的全文索引
+微信的FTSMSG*.db和QQ NT的*_msg_fts.db中已有客户端建立的FTS4/FTS5全文索引，解密后可以直接搜索，不需要先建立索引。
+客户端使用自定义分词器（如微信的MMFtsTokenizer），本机SQLite没有这些分词器时无法执行MATCH，
+此时改为在FTS表的内容表（<表名>_content）中按子串匹配；内容表只有消息文本和少量ID，仍比扫描消息表快得多。
+命中的消息按消息ID（如MsgSvrID、QQ NT的40001列，见message_schema）回到同一账号目录下的消息数据库，取得消息所在的数据库和rowid
+"""
+import os
+import re
+import sqlite3
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from wxdecrypt.message_schema import message_query
+from wxdecrypt.message_store import MessageStore
+from wxdecrypt.utils.time_utils import MILLISECOND_THRESHOLD
+
+# 客户端全文索引数据库的文件名：微信FTSMSG0.db等，QQ NT group_msg_fts.db等
+CLIENT_FTS_FILE = re.compile(r'^(ftsmsg\d*|\w+_msg_fts)\.db$', re.IGNORECASE)
+
+# FTS表及其元数据表中表示消息ID、时间和会话的列（小写），按优先顺序排列
+FTS_ID_COLUMNS = ('msgid', 'msgsvrid', 'msg_id', '40001')
+FTS_TIME_COLUMNS = ('createtime', 'timestamp', 'msgtime', 'time', '40050')
+FTS_TALKER_COLUMNS = ('strtalker', 'talker', 'entityid', 'username', '40027', '40021')
+
+# 不支持中文的内置分词器，关键词包含中文时MATCH的结果不完整，直接按子串匹配
+_BUILTIN_TOKENIZERS = ('simple', 'porter', 'unicode61', 'ascii')
+
+# 判断内容列时抽样的行数
+SAMPLE_ROWS = 200
+
+_CJK = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+def is_client_fts_database(path: str) -> bool:
+    """按文件名判断是否为客户端的全文索引数据库"""
+    return bool(CLIENT_FTS_FILE.match(os.path.basename(path)))
+
+def _split_args(text: str) -> List[str]:
+    """按顶层逗号切分CREATE VIRTUAL TABLE的参数，忽略引号和括号中的逗号"""
+    args, depth, quote, current = [], 0, None, ''
+    for char in text:
+        if quote:
+            quote = None if char == quote else quote
+        elif char in '\'"`[':
+            quote = ']' if char == '[' else char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(current.strip())
+            current = ''
+            continue
+        current += char
+    if current.strip():
+        args.append(current.strip())
+    return args
+
+def _unquote(name: str) -> str:
+    if len(name) >= 2 and name[0] in '\'"`[' and name[-1] in '\'"`]':
+        return name[1:-1]
+    return name
+
+def parse_fts_table(name: str, sql: str) -> Optional[Dict[str, Any]]:
+    """
+    解析FTS虚拟表的定义
+
+    Returns:
+        Dict: module（fts4或fts5）、columns、tokenizer（分词器名称，小写）、content（外部内容表名，
+        contentless表为空字符串，普通表为None）和content_rowid；不是FTS表时返回None
+    """
+    match = re.search(r'\busing\s+(fts[345])\s*\((.*)\)\s*$', sql, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+    table = {'name': name, 'module': match.group(1).lower(), 'columns': [], 'tokenizer': None,
+             'content': None, 'content_rowid': 'rowid'}
+    for arg in _split_args(match.group(2)):
+        key, sep, value = arg.partition('=')
+        if sep:
+            key, value = key.strip().lower(), _unquote(value.strip())
+            if key == 'tokenize':
+                table['tokenizer'] = (value.split() or [''])[0].lower()
+            elif key == 'content':
+                table['content'] = value
+            elif key == 'content_rowid':
+                table['content_rowid'] = value
+        elif arg.split():
+            # FTS4的参数也可以写成"tokenize simple"
+            first = arg.split()[0]
+            if first.lower() == 'tokenize':
+                table['tokenizer'] = (arg.split()[1:] or [''])[0].lower()
+            else:
+                table['columns'].append(_unquote(first))
+    return table
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [col[1] for col in conn.execute(f'PRAGMA table_info("{table}")')]
+
+def _pick(columns: Iterable[str], candidates: Iterable[str]) -> Optional[str]:
+    by_lower = {col.lower(): col for col in columns}
+    return next((by_lower[name] for name in candidates if name in by_lower), None)
+
+def detect_fts_tables(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """
+    识别数据库中可以搜索的FTS表
+
+    Returns:
+        List[Dict]: parse_fts_table的结果，另外包含内容表的表名和ID列（content_table、content_id）、
+        FTS列在内容表中的列名（content_columns）、用于匹配的文本列（text_columns），
+        以及消息ID、时间、会话所在的表和列（id、time、talker，每项为(表, 列)或None）
+    """
+    tables = {name.lower(): name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    result = []
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND sql LIKE '%USING fts%'"
+                                  ).fetchall():
+        table = parse_fts_table(name, sql or '')
+        if not table or not table['columns']:
+            continue
+        if table['content'] == '':
+            # contentless表不保存文本，无法回退到子串匹配，也取不到消息内容
+            continue
+        if table['content']:
+            content_table, content_id = table['content'], table['content_rowid']
+            content_columns = table['columns']
+        else:
+            # 普通FTS表的内容保存在影子表中：FTS4为docid, c0<列名>, ...；FTS5为id, c0, c1, ...
+            content_table = tables.get(f'{name.lower()}_content')
+            if not content_table:
+                continue
+            actual = _table_columns(conn, content_table)
+            content_id = actual[0]
+            expected = ([f'c{i}{col}' for i, col in enumerate(table['columns'])] if table['module'] != 'fts5'
+                        else [f'c{i}' for i in range(len(table['columns']))])
+            content_columns = expected if set(expected) <= set(actual) else actual[1:len(table['columns']) + 1]
+        table.update(content_table=content_table, content_id=content_id,
+                     content_columns=dict(zip(table['columns'], content_columns)))
+
+        # 微信把消息ID、会话等放在<表名>_MetaData中，按docid与内容表对应
+        meta_table = tables.get(f'{name.lower()}_metadata')
+        meta_columns = _table_columns(conn, meta_table) if meta_table else []
+        for key, candidates in (('id', FTS_ID_COLUMNS), ('time', FTS_TIME_COLUMNS), ('talker', FTS_TALKER_COLUMNS)):
+            column = _pick(table['columns'], candidates)
+            if column:
+                table[key] = ('content', table['content_columns'][column])
+            else:
+                column = _pick(meta_columns, candidates)
+                table[key] = ('meta', column) if column else None
+        table['meta_table'] = meta_table if any(v and v[0] == 'meta' for v in
+                                                (table['id'], table['time'], table['talker'])) else None
+        table['meta_key'] = _pick(meta_columns, ('docid',)) or 'rowid'
+
+        reserved = {v[1] for v in (table['id'], table['time'], table['talker']) if v and v[0] == 'content'}
+        table['text_columns'] = _text_columns(conn, content_table,
+                                              [c for c in table['content_columns'].values() if c not in reserved])
+        if table['text_columns']:
+            result.append(table)
+    return result
+
+def _text_columns(conn: sqlite3.Connection, table: str, columns: List[str]) -> List[str]:
+    """抽样判断哪些列保存消息文本：至少有一个值是包含非数字字符的字符串"""
+    if not columns:
+        return []
+    select = ', '.join(f'"{col}"' for col in columns)
+    found = set()
+    for row in conn.execute(f'SELECT {select} FROM "{table}" LIMIT {SAMPLE_ROWS}'):
+        for col, value in zip(columns, row):
+            if isinstance(value, str) and not value.strip().isdigit():
+                found.add(col)
+    # 空表时无法判断，全部作为文本列
+    return [col for col in columns if col in found] or list(columns)
+
+def _match_usable(tokenizer: Optional[str], keyword: str) -> bool:
+    """内置分词器不能切分中文，关键词包含中文时MATCH会漏掉结果；trigram分词器要求每个关键词至少3个字"""
+    if tokenizer in _BUILTIN_TOKENIZERS or tokenizer is None:
+        return not _CJK.search(keyword)
+    if tokenizer == 'trigram':
+        return all(len(part) >= 3 for part in keyword.split())
+    return True
+
+def _quote(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+class ClientFtsSearch:
+    """在一个账号目录的客户端全文索引中搜索，并把结果对应回消息数据库"""
+
+    def __init__(self, fts_paths: List[str], message_databases: Optional[List[Dict[str, Any]]] = None):
+        """
+        Args:
+            fts_paths: 客户端全文索引数据库路径
+            message_databases: 同一账号的消息数据库，每项包含path和is_qq（见db_decrypt.find_message_databases）
+        """
+        self.fts_paths = [os.path.abspath(path) for path in fts_paths]
+        self.message_databases = message_databases or []
+        self._stores = None
+        self._fts_tables = None
+
+    def _tables(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """全部客户端全文索引数据库中可以搜索的FTS表，返回(数据库路径, detect_fts_tables的结果)"""
+        if self._fts_tables is None:
+            self._fts_tables = []
+            for path in self.fts_paths:
+                try:
+                    conn = sqlite3.connect(path)
+                except sqlite3.Error:
+                    continue
+                try:
+                    self._fts_tables.extend((path, table) for table in detect_fts_tables(conn))
+                except sqlite3.Error as e:
+                    print(f"读取全文索引失败 {path}: {e}")
+                finally:
+                    conn.close()
+        return self._fts_tables
+
+    def _query_table(self, conn: sqlite3.Connection, table: Dict[str, Any], keyword: str,
+                     start: Optional[int], end: Optional[int], talkers: Optional[List[Any]], limit: int,
+                     before: Optional[Tuple[Any, ...]] = None) -> List[Dict[str, Any]]:
+        """
+        在一个FTS表中搜索一页结果
+
+        有时间列时按(时间, docid)从新到旧排列；没有时间列时按docid从大到小排列（docid按写入顺序分配，
+        与时间顺序基本一致）。talkers为会话列可能的取值，为None时不按会话筛选
+
+        Returns:
+            List[Dict]: 每项包含docid、msg_id、time、talker、content和key，key传给before读取下一页
+        """
+        def ref(key):
+            if not table[key]:
+                return 'NULL'
+            alias = 'c' if table[key][0] == 'content' else 'm'
+            return f'{alias}."{table[key][1]}"'
+
+        docid = f'c."{table["content_id"]}"'
+        text = ' || char(10) || '.join(f'COALESCE(c."{col}", \'\')' for col in table['text_columns'])
+        value = f'CAST({ref("time")} AS INTEGER)'
+        time_expr = (f'(CASE WHEN {value} > {MILLISECOND_THRESHOLD} THEN {value} / 1000 ELSE {value} END)'
+                     if table['time'] else 'NULL')
+        select = (f'SELECT {docid}, {ref("id")}, {time_expr}, {ref("talker")}, {text} '
+                  f'FROM "{table["content_table"]}" c')
+        if table['meta_table']:
+            select += f' LEFT JOIN "{table["meta_table"]}" m ON m."{table["meta_key"]}" = {docid}'
+        conditions, params = [], []
+        if table['time']:
+            if start is not None:
+                conditions.append(f'{time_expr} >= ?')
+                params.append(start)
+            if end is not None:
+                conditions.append(f'{time_expr} <= ?')
+                params.append(end)
+            if before is not None:
+                conditions.append(f'({time_expr}, {docid}) < (?, ?)')
+                params.extend(before)
+            order = f'{time_expr} DESC, {docid} DESC'
+        else:
+            if before is not None:
+                conditions.append(f'{docid} < ?')
+                params.append(before[-1])
+            order = f'{docid} DESC'
+        if talkers is not None and table['talker']:
+            conditions.append(f'{ref("talker")} IN ({", ".join("?" * len(talkers))})')
+            params.extend(talkers)
+        suffix = ''.join(f' AND {cond}' for cond in conditions) + f' ORDER BY {order} LIMIT ?'
+
+        rows = None
+        if _match_usable(table['tokenizer'], keyword):
+            match = ' '.join(_quote(part) for part in keyword.split())
+            try:
+                rows = conn.execute(
+                    f'{select} WHERE {docid} IN '
+                    f'(SELECT rowid FROM "{table["name"]}" WHERE "{table["name"]}" MATCH ?){suffix}',
+                    [match] + params + [limit]).fetchall()
+            except sqlite3.OperationalError:
+                # 通常是本机没有客户端的自定义分词器
+                rows = None
+        if rows is None:
+            like = ' AND '.join(f'{text} LIKE ?' for _ in keyword.split())
+            rows = conn.execute(f'{select} WHERE {like}{suffix}',
+                                [f'%{part}%' for part in keyword.split()] + params + [limit]).fetchall()
+        return [dict(docid=row_docid, msg_id=msg_id, time=timestamp, talker=talker, content=content,
+                     key=(timestamp, row_docid) if table['time'] else (row_docid,))
+                for row_docid, msg_id, timestamp, talker, content in rows]
+
+    @staticmethod
+    def _entity_names(conn: sqlite3.Connection) -> Dict[Any, str]:
+        """微信FTSMSG中的entityId是NameToId表的rowid"""
+        try:
+            return dict(conn.execute('SELECT rowid, userName FROM NameToId'))
+        except sqlite3.Error:
+            return {}
+
+    def _message_stores(self) -> List[MessageStore]:
+        """同一账号的消息数据库中可以按消息ID查找的消息表"""
+        if self._stores is not None:
+            return self._stores
+        self._stores = []
+        for db in self.message_databases:
+            if is_client_fts_database(db['path']):
+                continue
+            try:
+                self._stores.extend(store for store in MessageStore.open_all(db['path'], db.get('is_qq', False))
+                                    if store.schema.get('msg_id'))
+            except sqlite3.Error:
+                continue
+        return self._stores
+
+    def _resolve(self, hits: List[Dict[str, Any]]) -> None:
+        """按消息ID找到消息所在的数据库和rowid，消息数据库中的时间和会话优先"""
+        pending = {}
+        for hit in hits:
+            if hit['msg_id'] is not None:
+                pending.setdefault(hit['msg_id'], []).append(hit)
+        for store in self._message_stores():
+            if not pending:
+                break
+            try:
+                found = store.find_by_msg_ids(list(pending))
+            except sqlite3.Error:
+                continue
+            finally:
+                store.close()
+            for msg_id, record in found.items():
+                for hit in pending.pop(msg_id, []):
+                    hit.update(db_path=store.db_path, rowid=record.rowid)
+                    if record.time is not None:
+                        hit['time'] = record.time
+                    if record.talker is not None:
+                        hit['talker'] = str(record.talker)
+
+    def covered_upto(self, db_path: str, is_qq: bool = False) -> int:
+        """
+        消息数据库中已被客户端全文索引覆盖的范围
+
+        找到第一条消息ID不在任何FTS表中的文本消息，它之前的消息都能通过客户端索引搜到。
+        客户端索引通常只覆盖部分分片，或者还没有索引最近的消息
+
+        Returns:
+            int: rowid不超过该值的文本消息都在客户端索引中；消息表没有消息ID、FTS表没有消息ID列
+            或无法确认时返回0
+        """
+        sources = [(path, table['meta_table'] if table['id'][0] == 'meta' else table['content_table'], table['id'][1])
+                   for path, table in self._tables() if table['id']]
+        paths = sorted({path for path, _, _ in sources})
+        # SQLite默认最多同时附加10个数据库
+        if not sources or len(paths) > 9:
+            return 0
+        try:
+            store = MessageStore(db_path, is_qq)
+        except sqlite3.Error:
+            return 0
+        try:
+            if not store.schema or not store.schema.get('msg_id') or not store.schema.get('has_rowid'):
+                return 0
+            conn = store.connection
+            aliases = {path: f'client_fts{i}' for i, path in enumerate(paths)}
+            attached = []
+            try:
+                for path, alias in aliases.items():
+                    conn.execute('ATTACH DATABASE ? AS ' + alias, (path,))
+                    attached.append(alias)
+                # NOT IN的子查询中只要有一个NULL，结果就都是NULL，会把整个数据库误判为已覆盖
+                ids = ' UNION ALL '.join(f'SELECT "{column}" FROM {aliases[path]}."{table}" WHERE "{column}" IS NOT NULL'
+                                         for path, table, column in sources)
+                msg_id = f'"{store.schema["msg_id"]}"'
+                query, params = message_query(store.schema, 'MIN(rowid)')
+                first = conn.execute(f'{query} AND ({msg_id} IS NULL OR {msg_id} NOT IN ({ids}))',
+                                     params).fetchone()[0]
+            finally:
+                for alias in attached:
+                    conn.execute('DETACH DATABASE ' + alias)
+            return store.max_rowid() if first is None else first - 1
+        except sqlite3.Error:
+            return 0
+        finally:
+            store.close()
+
+    @staticmethod
+    def _talker_values(conn: sqlite3.Connection, chat: str) -> List[Any]:
+        """会话在FTS表中可能的取值：用户名本身、数字形式的QQ号，以及微信NameToId中的entityId"""
+        values = [chat]
+        if chat.isdigit():
+            values.append(int(chat))
+        try:
+            values.extend(rowid for rowid, in conn.execute('SELECT rowid FROM NameToId WHERE userName = ?', (chat,)))
+        except sqlite3.Error:
+            pass
+        return values
+
+    @staticmethod
+    def _accept(hit: Dict[str, Any], start: Optional[int], end: Optional[int], chat: Optional[str]) -> bool:
+        """时间或会话未知的消息无法判断是否符合条件，指定了筛选条件时不返回"""
+        timestamp = hit['time']
+        if (start is not None or end is not None) and timestamp is None:
+            return False
+        if start is not None and timestamp < start or end is not None and timestamp > end:
+            return False
+        return chat is None or hit['talker'] == chat
+
+    def search(self, keyword: str, start: Optional[int] = None, end: Optional[int] = None,
+               chat: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        搜索消息，按时间从新到旧返回，参数见search.SearchIndex.search
+
+        FTS表中有时间列且能按会话筛选时，筛选、排序和LIMIT都在SQLite中完成，各表合并后只对返回的消息
+        查找对应的消息数据库；否则按页读取，逐页对应回消息数据库后筛选，直到凑够limit条
+
+        Returns:
+            List[Dict]: 每项包含db_path、rowid、time、talker和content；找到对应的消息时db_path和rowid
+            指向消息数据库，否则指向全文索引数据库和docid
+        """
+        if not keyword.split() or limit <= 0:
+            return []
+        pending, results = [], []
+        for path, table in self._tables():
+            conn = sqlite3.connect(path)
+            try:
+                names = self._entity_names(conn)
+                talkers = self._talker_values(conn, chat) if chat is not None else None
+                in_sql = table['time'] is not None and (chat is None or table['talker'] is not None)
+                before, found = None, 0
+                while True:
+                    hits = self._query_table(conn, table, keyword, start, end, talkers, limit, before)
+                    for hit in hits:
+                        hit.update(db_path=path, rowid=hit['docid'])
+                        if hit['talker'] is not None:
+                            hit['talker'] = str(names.get(hit['talker'], hit['talker']))
+                    if in_sql:
+                        pending.extend(hits)
+                        break
+                    self._resolve(hits)
+                    accepted = [hit for hit in hits if self._accept(hit, start, end, chat)]
+                    results.extend(accepted)
+                    found += len(accepted)
+                    if len(hits) < limit or found >= limit:
+                        break
+                    before = hits[-1]['key']
+            except sqlite3.Error as e:
+                print(f"读取全文索引失败 {path}: {e}")
+            finally:
+                conn.close()
+
+        # 只对合并后会返回的消息查找消息数据库
+        pending.sort(key=lambda hit: (hit['time'] or 0, hit['docid']), reverse=True)
+        pending = pending[:limit]
+        self._resolve(pending)
+        results.extend(hit for hit in pending if self._accept(hit, start, end, chat))
+        for hit in results:
+            del hit['docid'], hit['msg_id'], hit['key']
+        results.sort(key=lambda hit: (hit['time'] or 0, hit['rowid'] or 0), reverse=True)
+        return results[:limit]
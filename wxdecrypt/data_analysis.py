@@ -2,162 +2,410 @@
 数据分析模块，提供数据可视化和词频分析功能
 """
 import os
-import sqlite3
+import csv
+import html
+import heapq
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import jieba
 from collections import Counter
 from datetime import datetime
-import wordcloud
-import matplotlib.font_manager as fm
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterator
+
+from wxdecrypt.analysis_state import AnalysisState
+from wxdecrypt.chart_render import render_charts
+from wxdecrypt.interactive_report import resolve_report_mode, report_payload, write_interactive_report
+from wxdecrypt.message_store import MessageStore
+from wxdecrypt.message_columns import (
+    CACHE_DIR_NAME, SOURCE_COLUMNS, MessageColumns, db_signature, schema_fingerprint, write_message_columns
+)
+from wxdecrypt.segmentation import (
+    SEGMENT_BATCH_SIZE, PARALLEL_MIN_MESSAGES, parallel_word_counts, get_token_cache
+)
+from wxdecrypt.utils.font_utils import resolve_cjk_font
+from wxdecrypt.utils.time_utils import BUCKET_SECONDS, to_datetime_index, format_times
 
-# 检查是否有中文字体
 def check_chinese_font():
-    """检查系统中可用的中文字体"""
-    chinese_fonts = []
-    for f in fm.findSystemFonts():
-        try:
-            font = fm.FontProperties(fname=f)
-            if font.get_name() and any([
-                'simhei' in font.get_name().lower(),
-                'microsoft yahei' in font.get_name().lower(),
-                'simsun' in font.get_name().lower(),
-                'nsimsun' in font.get_name().lower(),
-                'kaiti' in font.get_name().lower(),
-                'fangsong' in font.get_name().lower(),
-                'STHeiti' in font.get_name(),
-                'pingfang' in font.get_name().lower(),
-                'heiti' in font.get_name().lower(),
-                'songti' in font.get_name().lower(),
-                'hei' in font.get_name().lower()
-            ]):
-                chinese_fonts.append(f)
-        except:
-            continue
-    return chinese_fonts[0] if chinese_fonts else None
+    """返回系统中可用的中文字体文件路径，结果按字体目录指纹缓存"""
+    return resolve_cjk_font()
+
+# 流式读取消息时每批的行数，内存占用只与批大小有关，与消息总数无关
+MESSAGE_CHUNK_SIZE = 50000
+
+# iter_message_chunks可以读取的列（此外还可以读取rowid）
+MESSAGE_COLUMNS = ('timestamp', 'content', 'type', 'is_sender', 'talker')
+
+WEEKDAY_LABELS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+# 报告中列出的消息最多的会话数
+CHAT_TOP_K = 20
+
+# 每个会话统计高频词时只读取最近的这些消息，通过(会话, 时间)索引直接定位
+CHAT_RECENT_MESSAGES = 2000
+
+# 报告中每个会话显示的高频词数量
+CHAT_TOP_WORDS = 10
+
+# 全部会话的统计结果
+CHAT_STATS_FILE = '会话统计.csv'
+
+def _to_array(name: str, values: Tuple[Any, ...]) -> np.ndarray:
+    """将一批数据转换为NumPy数组，整数列中的NULL记为-1"""
+    if name in ('content', 'talker'):
+        return np.array(values, dtype=object)
+    dtype = {'rowid': np.int64, 'timestamp': np.int64, 'type': np.int32, 'is_sender': np.int8}[name]
+    return np.fromiter((-1 if v is None else v for v in values), dtype=dtype, count=len(values))
+
+def iter_message_chunks(db_path: str, schema: Dict[str, Any],
+                        columns: Tuple[str, ...] = MESSAGE_COLUMNS,
+                        chunk_size: int = MESSAGE_CHUNK_SIZE,
+                        rowid_range: Optional[Tuple[int, int]] = None,
+                        cache: Optional[MessageColumns] = None,
+                        order_by_rowid: bool = False, text_only: bool = True) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    按批读取消息，每批以列数组的形式返回
+    
+    Args:
+        db_path: 数据库路径
+        schema: detect_message_schema返回的表结构
+        columns: 需要读取的列，只统计时间时不读取content可以大幅减少内存和IO
+        chunk_size: 每批的行数
+        rowid_range: (after, upto)，只读取after < rowid <= upto的消息；为None时读取全部
+        cache: 消息列缓存，不为None时从缓存读取而不查询数据库
+        order_by_rowid: 是否按rowid升序返回
+        text_only: 是否只读取有内容的文本消息
+        
+    Yields:
+        Dict[str, np.ndarray]: 列名 -> 数组；timestamp为int64秒（毫秒时间戳已换算），type和is_sender为整数（-1表示未知），
+        content和talker为对象数组
+    """
+    if cache is not None:
+        yield from cache.iter_chunks(columns, chunk_size, rowid_range, text_only)
+        return
+    with MessageStore(db_path, schema=schema) as store:
+        for rows in store.iter_rows(columns, chunk_size, rowid_range, order_by_rowid, text_only):
+            yield {name: _to_array(name, values) for name, values in zip(columns, zip(*rows))}
+
+def query_bucket_counts(db_path: str, schema: Dict[str, Any],
+                        rowid_range: Optional[Tuple[int, int]] = None,
+                        cache: Optional[MessageColumns] = None) -> List[Tuple[Any, ...]]:
+    """
+    在SQLite中按时间桶、类型和发送方分组计数
+    
+    不需要逐条读取消息，消息数量再多也只返回几千行分组结果
+    
+    Args:
+        db_path: 数据库路径
+        schema: detect_message_schema返回的表结构
+        rowid_range: (after, upto)，只统计after < rowid <= upto的消息；为None时统计全部
+        cache: 消息列缓存，不为None时在缓存上统计
+        
+    Returns:
+        List: (时间桶, 类型, 是否发送, 消息数)，时间桶为UTC时间戳除以BUCKET_SECONDS
+    """
+    if cache is not None:
+        return cache.bucket_counts(rowid_range)
+    with MessageStore(db_path, schema=schema) as store:
+        return store.bucket_counts(rowid_range)
+
+def summarize_bucket_counts(rows: List[Tuple[Any, ...]], tz=None) -> Dict[str, Any]:
+    """
+    把分组计数一次性换算成各项统计
+    
+    Args:
+        rows: query_bucket_counts返回的分组计数
+        tz: 按哪个时区划分日期和小时，默认见time_utils.resolve_timezone
+        
+    Returns:
+        Dict: by_day（按日期）、by_hour（0-23时）、day_hour（按日期和小时）、weekday_hour（7×24，周一为0）、
+        by_type（按类型）、by_sender（按是否发送）、total（消息总数）以及
+        first_bucket和last_bucket（最早和最晚时间桶的起始时间戳，没有消息时为None）
+    """
+    bucket_col, type_col, sender_col, count_col = zip(*rows) if rows else ((), (), (), ())
+    buckets = _to_array('timestamp', bucket_col)
+    types = _to_array('type', type_col)
+    senders = _to_array('is_sender', sender_col)
+    counts = np.array(count_col, dtype=np.int64)
+    
+    bucket_starts = buckets * BUCKET_SECONDS
+    times = to_datetime_index(bucket_starts, tz)
+    weekday_hour = np.zeros((7, 24), dtype=np.int64)
+    np.add.at(weekday_hour, (times.weekday, times.hour), counts)
+    
+    return {
+        'by_day': pd.Series(counts).groupby(times.normalize()).sum().sort_index(),
+        'by_hour': pd.Series(np.bincount(times.hour, weights=counts, minlength=24).astype(np.int64)),
+        'day_hour': pd.Series(counts).groupby([times.normalize(), times.hour]).sum().sort_index(),
+        'weekday_hour': pd.DataFrame(weekday_hour, index=WEEKDAY_LABELS),
+        'by_type': pd.Series(counts[types >= 0]).groupby(types[types >= 0]).sum().sort_index(),
+        'by_sender': pd.Series(counts[senders >= 0]).groupby(senders[senders >= 0]).sum().sort_index(),
+        'total': int(counts.sum()),
+        'first_bucket': int(bucket_starts.min()) if len(bucket_starts) else None,
+        'last_bucket': int(bucket_starts.max()) if len(bucket_starts) else None,
+    }
+
+def compute_message_aggregates(db_path: str, schema: Dict[str, Any], tz=None,
+                               cache: Optional[MessageColumns] = None) -> Dict[str, Any]:
+    """统计数据库中全部消息的各项聚合结果，返回值见summarize_bucket_counts"""
+    return summarize_bucket_counts(query_bucket_counts(db_path, schema, cache=cache), tz)
+
+def count_message_words(db_path: str, schema: Dict[str, Any], message_count: int,
+                        rowid_range: Optional[Tuple[int, int]] = None,
+                        workers: Optional[int] = None,
+                        cache: Optional[MessageColumns] = None) -> Counter:
+    """
+    对消息分词并统计词频
+    
+    Args:
+        db_path: 数据库路径
+        schema: detect_message_schema返回的表结构
+        message_count: 需要分词的消息数，消息较少时总是在当前进程中分词
+        rowid_range: (after, upto)，只统计after < rowid <= upto的消息；为None时统计全部
+        workers: 分词进程数，默认使用CPU核心数
+        cache: 消息列缓存，不为None时从缓存读取消息
+        
+    Returns:
+        Counter: 过滤停用词后的词频
+    """
+    if message_count < PARALLEL_MIN_MESSAGES:
+        workers = 1
+    # 按批读取文本，分配到多个进程分词，合并各批过滤停用词后的词频
+    batches = ([content for content in chunk['content'] if isinstance(content, str)]
+               for chunk in iter_message_chunks(db_path, schema, ('content',), SEGMENT_BATCH_SIZE,
+                                                rowid_range, cache))
+    return parallel_word_counts(batches, workers)
 
-# 设置中文字体
-CHINESE_FONT = check_chinese_font()
-if CHINESE_FONT:
-    plt.rcParams['font.sans-serif'] = [fm.FontProperties(fname=CHINESE_FONT).get_name()]
-    plt.rcParams['axes.unicode_minus'] = False
-else:
-    print("警告: 未找到中文字体，图表中的中文可能无法正确显示")
+def _recent_chat_words(store: MessageStore, talker: Any) -> Counter:
+    """统计会话最近CHAT_RECENT_MESSAGES条消息的词频"""
+    records, _ = store.page(CHAT_RECENT_MESSAGES, descending=True, talker=talker, text_only=True)
+    contents = [record.content for record in records if isinstance(record.content, str)]
+    batches = (contents[i:i + SEGMENT_BATCH_SIZE] for i in range(0, len(contents), SEGMENT_BATCH_SIZE))
+    return parallel_word_counts(batches, 1, verbose=False)
+
+def compute_chat_stats(db_path: str, schema: Dict[str, Any], output_dir: str,
+                       top_k: int = CHAT_TOP_K, tz=None) -> List[Dict[str, Any]]:
+    """
+    统计各会话的消息数、活跃天数和时间范围，全部会话写入会话统计.csv，返回消息最多的top_k个会话
+    
+    分组计数在SQLite中完成，Python只逐行处理分组结果并用堆选出前top_k个会话；
+    高频词只对这些会话统计，读取每个会话最近的CHAT_RECENT_MESSAGES条消息
+    
+    Args:
+        db_path: 数据库路径
+        schema: detect_message_schema返回的表结构，需要有会话列
+        output_dir: 输出目录
+        top_k: 返回的会话数
+        tz: 按哪个时区划分日期
+        
+    Returns:
+        List[Dict]: 按消息数从多到少排列，每项包含talker、message_count、active_days、
+        first_time、last_time、sent_count和top_words（[(词, 次数)]）；没有会话列时为空列表
+    """
+    if not schema.get('talker'):
+        print("消息表中没有会话信息，跳过会话统计")
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    csv_path = os.path.join(output_dir, CHAT_STATS_FILE)
+    with MessageStore(db_path, schema=schema) as store:
+        names = store.talker_names()
+        with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['会话', '消息数', '活跃天数', '最早消息', '最晚消息', '发送消息数'])
+            
+            def rows():
+                # 逐行写入文件，同时交给heapq.nlargest选出前top_k个
+                for row in store.iter_chat_stats(MESSAGE_CHUNK_SIZE, tz):
+                    talker = names.get(row[0], row[0])
+                    first, last = format_times([row[3], row[4]], tz=tz)
+                    writer.writerow([talker, row[1], row[2], first, last, row[5]])
+                    yield row
+            
+            top_rows = heapq.nlargest(top_k, rows(), key=lambda row: row[1])
+        print(f"已生成会话统计文件: {csv_path}")
+        
+        chats = []
+        for talker, count, active_days, first, last, sent in top_rows:
+            chats.append({
+                'talker': names.get(talker, talker),
+                'message_count': count,
+                'active_days': active_days,
+                'first_time': first,
+                'last_time': last,
+                'sent_count': sent,
+                'top_words': _recent_chat_words(store, talker).most_common(CHAT_TOP_WORDS),
+            })
+    if chats:
+        print(f"已统计消息最多的 {len(chats)} 个会话的高频词，分词缓存{get_token_cache().report()}")
+    return chats
+
+def chat_stats_html(chats: List[Dict[str, Any]]) -> str:
+    """报告中消息最多的会话列表"""
+    if not chats:
+        return ''
+    rows = []
+    for chat in chats:
+        first, last = format_times([chat['first_time'], chat['last_time']], '%Y-%m-%d')
+        top_words = '、'.join(word for word, _ in chat['top_words'])
+        rows.append(f"""
+                    <tr>
+                        <td>{html.escape(str(chat['talker']))}</td>
+                        <td>{chat['message_count']}</td>
+                        <td>{chat['sent_count']}</td>
+                        <td>{chat['active_days']}</td>
+                        <td>{first} 至 {last}</td>
+                        <td>{html.escape(top_words)}</td>
+                    </tr>""")
+    return f"""
+                <h2>消息最多的 {len(chats)} 个会话</h2>
+                <p>全部会话的统计见 <a href="{CHAT_STATS_FILE}">{CHAT_STATS_FILE}</a>，高频词按每个会话最近 {CHAT_RECENT_MESSAGES} 条消息统计</p>
+                <table>
+                    <tr><th>会话</th><th>消息数</th><th>发送</th><th>活跃天数</th><th>时间范围</th><th>高频词</th></tr>{''.join(rows)}
+                </table>"""
+
+def database_cache_dir(output_dir: str, db_path: str) -> str:
+    """
+    数据库的缓存目录：输出目录/.cache/数据库文件名
+    
+    同一账号的多个数据库（MSG0.db、MSG1.db等）共用一个分析目录，缓存和分析状态按数据库分开保存
+    """
+    return os.path.join(output_dir, CACHE_DIR_NAME, os.path.basename(db_path))
+
+def update_analysis_state(analysis_data: Dict[str, Any], output_dir: str,
+                          workers: Optional[int] = None) -> AnalysisState:
+    """
+    把水位线之后的新消息合并到保存的分析状态
+    
+    水位线之前的消息数与保存的不一致时（如数据库被重建或删除过消息），丢弃状态从头分析
+    
+    Args:
+        analysis_data: analyze_database返回的分析数据
+        output_dir: 输出目录，分析状态保存在其中数据库的缓存目录里
+        workers: 分词进程数
+        
+    Returns:
+        AnalysisState: 更新并保存后的分析状态
+    """
+    db_path, schema = analysis_data['db_path'], analysis_data['schema']
+    cache = analysis_data.get('message_cache')
+    state_dir = database_cache_dir(output_dir, db_path)
+    state = AnalysisState.load(state_dir, db_path, schema)
+    
+    if cache is not None:
+        upto = cache.max_rowid
+        if state.last_rowid and state.last_rowid <= upto:
+            analyzed_count = cache.row_slice((0, state.last_rowid)).stop
+    else:
+        with MessageStore(db_path, schema=schema) as store:
+            upto = store.max_rowid()
+            if state.last_rowid and state.last_rowid <= upto:
+                analyzed_count = store.count((0, state.last_rowid), text_only=False)
+    if state.last_rowid and (state.last_rowid > upto or analyzed_count != state.message_count):
+        print("数据库中已分析的消息发生了变化，重新分析全部消息")
+        state.reset()
+    
+    rowid_range = (state.last_rowid, upto)
+    bucket_rows = query_bucket_counts(db_path, schema, rowid_range, cache)
+    new_count = sum(row[3] for row in bucket_rows)
+    if state.last_rowid:
+        print(f"上次分析后新增 {new_count} 条消息")
+    word_counts = (count_message_words(db_path, schema, new_count, rowid_range, workers, cache)
+                   if new_count else Counter())
+    
+    state.merge(upto, bucket_rows, word_counts)
+    state.save(state_dir)
+    return state
+
+def build_message_cache(db_path: str, schema: Dict[str, Any], is_qq: bool, cache_dir: str,
+                        previous: Optional[MessageColumns] = None) -> MessageColumns:
+    """
+    生成数据库的消息列缓存
+    
+    旧缓存的表结构相同、且其中的消息在数据库中没有变化时（如只新增了消息），只追加新消息；
+    否则重新读取全部消息
+    
+    Args:
+        db_path: 数据库路径
+        schema: detect_message_schema返回的表结构
+        is_qq: 是否为QQ数据库
+        cache_dir: 缓存目录
+        previous: 已有的缓存，为None时重新生成
+        
+    Returns:
+        MessageColumns: 生成的缓存
+    """
+    # 先记录签名和最大rowid，读取期间数据库发生变化时下次会重新校验
+    manifest = dict(db_signature(db_path), is_qq=is_qq, schema=schema, fingerprint=schema_fingerprint(schema))
+    with MessageStore(db_path, is_qq, schema) as store:
+        manifest['max_rowid'] = store.max_rowid()
+        if (previous is not None and previous.manifest.get('fingerprint') == manifest['fingerprint']
+                and previous.manifest.get('db_path') == manifest['db_path']
+                and previous.max_rowid <= manifest['max_rowid']):
+            if store.count((0, previous.max_rowid), text_only=False) != previous.count:
+                previous = None
+        else:
+            previous = None
+    
+    after = previous.max_rowid if previous is not None else 0
+    print("正在更新消息缓存..." if previous is not None else "正在生成消息缓存...")
+    # 缓存全部类型的消息，按类型统计时需要；分词时再筛选文本消息
+    chunks = iter_message_chunks(db_path, schema, SOURCE_COLUMNS, MESSAGE_CHUNK_SIZE,
+                                 (after, manifest['max_rowid']), order_by_rowid=True, text_only=False)
+    return write_message_columns(cache_dir, manifest, chunks, previous)
 
-def analyze_database(db_path: str, output_dir: str, is_qq: bool = False) -> Dict[str, Any]:
+def analyze_database(db_path: str, output_dir: str, is_qq: bool = False,
+                     use_cache: bool = True) -> Dict[str, Any]:
     """
-    分析数据库，提取可视化和词频分析所需的数据
+    分析数据库，检测消息表结构并统计消息数量
+    
+    消息内容不会一次性读入内存，后续步骤通过iter_message_chunks按批读取。
+    使用缓存时消息列保存在database_cache_dir中，数据库没有变化时直接使用缓存，不再查询数据库
     
     Args:
         db_path: 数据库路径
         output_dir: 输出目录
         is_qq: 是否为QQ数据库
+        use_cache: 是否使用消息列缓存
         
     Returns:
-        Dict: 包含分析结果的字典
+        Dict: 包含数据库路径、表结构、消息数量和消息列缓存（message_cache）的字典
     """
     if not os.path.exists(db_path):
         print(f"数据库文件不存在: {db_path}")
         return {}
     
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 检测表结构
-        tables = cursor.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
-        tables = [t[0] for t in tables]
-        
-        print(f"数据库中的表: {', '.join(tables)}")
-        
-        messages = []
-        
-        # 微信数据库通常有Message表
-        if 'message' in [t.lower() for t in tables]:
-            print("检测到微信消息表，开始读取数据...")
-            # 检查表结构以确定正确的列名
-            table_info = cursor.execute("PRAGMA table_info(message);").fetchall()
-            column_names = [col[1] for col in table_info]
-            
-            # 典型的微信消息表结构
-            if 'CreateTime' in column_names and 'Content' in column_names:
-                query = """
-                SELECT CreateTime, Content, Type, Status, IsSender FROM message
-                WHERE Content IS NOT NULL AND Content != ''
-                ORDER BY CreateTime
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    create_time, content, msg_type, status, is_sender = row
-                    # 确保CreateTime是整数时间戳
-                    try:
-                        create_time = int(create_time)
-                        create_time_str = datetime.fromtimestamp(create_time).strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        create_time_str = str(create_time)
-                    
-                    # 只处理文本消息
-                    if msg_type == 1:  # 通常1表示文本消息
-                        messages.append({
-                            'timestamp': create_time,
-                            'datetime': create_time_str,
-                            'content': content,
-                            'is_sender': bool(is_sender),
-                            'type': msg_type
-                        })
+        cache_dir = database_cache_dir(output_dir, db_path)
+        cache = MessageColumns.load(cache_dir) if use_cache else None
+        if cache is not None and cache.matches(db_path, is_qq):
+            schema, message_count = cache.schema, cache.count
+            print(f"使用消息缓存，共有 {message_count} 条消息")
+        else:
+            with MessageStore(db_path, is_qq) as store:
+                schema = store.schema
+                message_count = 0
+                if schema:
+                    print(f"检测到消息表: {schema['table']}")
+                    message_count = store.count(text_only=False)
+                    print(f"共有 {message_count} 条消息")
                 
-                print(f"成功读取 {len(messages)} 条消息")
-        
-        # QQ数据库表结构不同，需要适配
-        elif 'msg' in [t.lower() for t in tables] and is_qq:
-            print("检测到QQ消息表，开始读取数据...")
-            # 检查表结构以确定正确的列名
-            table_info = cursor.execute("PRAGMA table_info(msg);").fetchall()
-            column_names = [col[1] for col in table_info]
-            
-            # 尝试识别QQ消息表结构（可能需要根据实际数据库调整）
-            time_col = next((col for col in column_names if 'time' in col.lower()), None)
-            content_col = next((col for col in column_names if 'content' in col.lower() or 'msg' in col.lower()), None)
+                # 先建立会话索引再生成缓存，避免之后建立索引改变数据库文件使缓存失效
+                if message_count:
+                    store.ensure_index('talker')
             
-            if time_col and content_col:
-                query = f"""
-                SELECT {time_col}, {content_col} FROM msg
-                WHERE {content_col} IS NOT NULL AND {content_col} != ''
-                ORDER BY {time_col}
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    time_val, content = row
-                    try:
-                        time_val = int(time_val)
-                        time_str = datetime.fromtimestamp(time_val).strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        time_str = str(time_val)
-                    
-                    messages.append({
-                        'timestamp': time_val,
-                        'datetime': time_str,
-                        'content': content,
-                        'is_sender': None,  # QQ数据可能无法确定
-                        'type': None
-                    })
-                
-                print(f"成功读取 {len(messages)} 条消息")
-        
-        conn.close()
+            # 需要按rowid追加和定位消息，WITHOUT ROWID表不使用缓存
+            if use_cache and message_count and schema.get('has_rowid'):
+                cache = build_message_cache(db_path, schema, is_qq, cache_dir, cache)
+            else:
+                cache = None
         
         # 如果有消息数据，进行分析
-        if messages:
+        if message_count:
             return {
-                'messages': messages,
                 'db_path': db_path,
-                'output_dir': output_dir
+                'output_dir': output_dir,
+                'is_qq': is_qq,
+                'schema': schema,
+                'message_count': message_count,
+                'message_cache': cache
             }
         else:
             print("未找到消息数据")
@@ -167,84 +415,81 @@ def analyze_database(db_path: str, output_dir: str, is_qq: bool = False) -> Dict
         print(f"分析数据库时出错: {e}")
         return {}
 
-def create_visualizations(analysis_data: Dict[str, Any], output_dir: str) -> None:
+def create_visualizations(analysis_data: Dict[str, Any], output_dir: str,
+                          charts: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     """
     创建数据可视化图表
     
     Args:
         analysis_data: 分析数据
         output_dir: 输出目录
+        charts: 不为None时只把图表描述加入该列表，由调用方与其他图表一起渲染
+        
+    Returns:
+        Dict: compute_message_aggregates的统计结果
     """
-    if not analysis_data or 'messages' not in analysis_data:
+    if not analysis_data or ('schema' not in analysis_data and not analysis_data.get('aggregates')):
         print("没有足够的数据用于可视化")
-        return
-    
-    messages = analysis_data['messages']
-    os.makedirs(output_dir, exist_ok=True)
+        return {}
     
-    # 转换为pandas数据框以便分析
-    df = pd.DataFrame(messages)
+    # 各项统计都由SQLite分组计数得到，不读取消息本身；增量分析时直接使用累计的分组计数
+    aggregates = analysis_data.get('aggregates') or compute_message_aggregates(
+        analysis_data['db_path'], analysis_data['schema'], cache=analysis_data.get('message_cache'))
+    pending = []
     
     # 1. 按日期统计消息数量
-    if 'timestamp' in df.columns:
-        df['date'] = pd.to_datetime(df['timestamp'], unit='s').dt.date
-        messages_by_date = df.groupby('date').size()
-        
-        plt.figure(figsize=(12, 6))
-        messages_by_date.plot(kind='line')
-        plt.title('每日消息数量')
-        plt.xlabel('日期')
-        plt.ylabel('消息数量')
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '每日消息数量.png'), dpi=300)
-        print(f"已生成每日消息数量图表: {os.path.join(output_dir, '每日消息数量.png')}")
-        plt.close()
+    messages_by_date = aggregates['by_day']
+    if not messages_by_date.empty:
+        pending.append({
+            'kind': 'line', 'file': '每日消息数量.png', 'label': '每日消息数量图表', 'figsize': (12, 6),
+            'title': '每日消息数量', 'xlabel': '日期', 'ylabel': '消息数量',
+            'x': list(messages_by_date.index.date), 'y': messages_by_date.tolist(),
+        })
         
         # 2. 按小时统计消息数量
-        df['hour'] = pd.to_datetime(df['timestamp'], unit='s').dt.hour
-        messages_by_hour = df.groupby('hour').size()
-        
-        plt.figure(figsize=(10, 6))
-        messages_by_hour.plot(kind='bar')
-        plt.title('各时段消息数量')
-        plt.xlabel('小时')
-        plt.ylabel('消息数量')
-        plt.xticks(range(24))
-        plt.grid(True, linestyle='--', alpha=0.7, axis='y')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '各时段消息数量.png'), dpi=300)
-        print(f"已生成各时段消息数量图表: {os.path.join(output_dir, '各时段消息数量.png')}")
-        plt.close()
-    
-    # 3. 按消息类型统计（如果有类型信息）
-    if 'type' in df.columns and df['type'].notna().any():
-        messages_by_type = df.groupby('type').size()
+        pending.append({
+            'kind': 'bar', 'file': '各时段消息数量.png', 'label': '各时段消息数量图表', 'figsize': (10, 6),
+            'title': '各时段消息数量', 'xlabel': '小时', 'ylabel': '消息数量',
+            'x': list(range(24)), 'y': aggregates['by_hour'].tolist(),
+        })
         
-        plt.figure(figsize=(8, 8))
-        messages_by_type.plot(kind='pie', autopct='%1.1f%%')
-        plt.title('消息类型分布')
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '消息类型分布.png'), dpi=300)
-        print(f"已生成消息类型分布图表: {os.path.join(output_dir, '消息类型分布.png')}")
-        plt.close()
-    
-    # 4. 按发送方统计（如果有发送方信息）
-    if 'is_sender' in df.columns and df['is_sender'].notna().any():
-        messages_by_sender = df.groupby('is_sender').size()
-        
-        plt.figure(figsize=(8, 8))
-        messages_by_sender.plot(kind='pie', labels=['接收', '发送'], autopct='%1.1f%%')
-        plt.title('发送/接收消息比例')
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, '发送接收比例.png'), dpi=300)
-        print(f"已生成发送接收比例图表: {os.path.join(output_dir, '发送接收比例.png')}")
-        plt.close()
+        # 3. 按星期和小时统计消息数量
+        weekday_hour = aggregates['weekday_hour']
+        pending.append({
+            'kind': 'heatmap', 'file': '星期时段分布.png', 'label': '星期时段分布图表', 'figsize': (12, 5),
+            'title': '星期时段分布', 'xlabel': '小时', 'colorbar': '消息数量',
+            'values': weekday_hour.values.tolist(), 'rows': list(weekday_hour.index),
+        })
+    
+    # 4. 按消息类型统计（如果有类型信息）
+    messages_by_type = aggregates['by_type']
+    if not messages_by_type.empty:
+        pending.append({
+            'kind': 'pie', 'file': '消息类型分布.png', 'label': '消息类型分布图表', 'figsize': (8, 8),
+            'title': '消息类型分布',
+            'values': messages_by_type.tolist(), 'labels': [str(t) for t in messages_by_type.index],
+        })
+    
+    # 5. 按发送方统计（如果有发送方信息）
+    messages_by_sender = aggregates['by_sender']
+    if not messages_by_sender.empty:
+        pending.append({
+            'kind': 'pie', 'file': '发送接收比例.png', 'label': '发送接收比例图表', 'figsize': (8, 8),
+            'title': '发送/接收消息比例',
+            'values': messages_by_sender.tolist(),
+            'labels': ['发送' if is_sender else '接收' for is_sender in messages_by_sender.index],
+        })
+    
+    if charts is not None:
+        charts.extend(pending)
+    else:
+        render_charts(pending, output_dir)
+    return aggregates
 
 def generate_word_frequency(analysis_data: Dict[str, Any], output_dir: str, 
-                           top_n: int = 100, generate_wordcloud: bool = True) -> Dict[str, int]:
+                           top_n: int = 100, generate_wordcloud: bool = True,
+                           workers: Optional[int] = None,
+                           charts: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
     """
     生成词频分析
     
@@ -253,36 +498,24 @@ def generate_word_frequency(analysis_data: Dict[str, Any], output_dir: str,
         output_dir: 输出目录
         top_n: 返回前N个高频词
         generate_wordcloud: 是否生成词云图
+        workers: 分词进程数，默认使用CPU核心数；消息较少时总是在当前进程中分词
+        charts: 不为None时只把图表描述加入该列表，由调用方与其他图表一起渲染
         
     Returns:
         Dict: 词频统计结果
     """
-    if not analysis_data or 'messages' not in analysis_data:
+    if not analysis_data or ('schema' not in analysis_data and analysis_data.get('word_counts') is None):
         print("没有足够的数据用于词频分析")
         return {}
     
-    messages = analysis_data['messages']
     os.makedirs(output_dir, exist_ok=True)
     
-    # 提取所有文本内容
-    all_text = " ".join([msg['content'] for msg in messages if msg['content']])
-    
-    # 使用jieba进行分词
-    jieba.setLogLevel(20)  # 设置jieba的日志级别为INFO，减少输出
-    words = jieba.cut(all_text, cut_all=False)
-    
-    # 过滤停用词
-    stopwords = set(['的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', 
-                   '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', 
-                   '着', '没有', '看', '好', '自己', '这', '这个', '那', '那个',
-                   '。', ',', '?', '!', '、', ':', '"', '"', "'", "'", '(', ')',
-                   '[', ']', '{', '}', '[', ']', '<', '>', ':', ';', '"', '...',
-                   '\n', '\t', '\r', ' ', '+', '-', '*', '/', '='])
-    
-    filtered_words = [word for word in words if len(word) > 1 and word not in stopwords]
-    
-    # 统计词频
-    word_freq = Counter(filtered_words)
+    # 增量分析时直接使用累计的词频
+    word_freq = analysis_data.get('word_counts')
+    if word_freq is None:
+        word_freq = count_message_words(analysis_data['db_path'], analysis_data['schema'],
+                                        analysis_data.get('message_count', 0), workers=workers,
+                                        cache=analysis_data.get('message_cache'))
     
     # 获取前N个高频词
     top_words = word_freq.most_common(top_n)
@@ -296,45 +529,33 @@ def generate_word_frequency(analysis_data: Dict[str, Any], output_dir: str,
     
     print(f"已生成词频统计文件: {os.path.join(output_dir, '词频统计.txt')}")
     
-    # 生成词频统计图表
-    words, freqs = zip(*top_words[:30])  # 图表中只显示前30个词
+    if not top_words:
+        print("没有可统计的词语")
+        return {}
     
-    plt.figure(figsize=(12, 8))
-    plt.barh(range(len(words)), freqs, align='center')
-    plt.yticks(range(len(words)), words)
-    plt.xlabel('频率')
-    plt.title('词频统计 (Top 30)')
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, '词频统计.png'), dpi=300)
-    print(f"已生成词频统计图表: {os.path.join(output_dir, '词频统计.png')}")
-    plt.close()
+    # 生成词频统计图表，图表中只显示前30个词
+    words, freqs = zip(*top_words[:30])
+    pending = [{
+        'kind': 'barh', 'file': '词频统计.png', 'label': '词频统计图表', 'figsize': (12, 8),
+        'title': '词频统计 (Top 30)', 'xlabel': '频率',
+        'x': list(freqs), 'y': list(words),
+    }]
     
     # 生成词云图
     if generate_wordcloud:
-        try:
-            wc = wordcloud.WordCloud(
-                font_path=CHINESE_FONT if CHINESE_FONT else None,
-                width=800, height=600,
-                background_color='white',
-                max_words=200,
-                max_font_size=150,
-                random_state=42
-            )
-            wc.generate_from_frequencies(dict(top_words))
-            
-            plt.figure(figsize=(10, 8))
-            plt.imshow(wc, interpolation='bilinear')
-            plt.axis('off')
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, '词云图.png'), dpi=300)
-            print(f"已生成词云图: {os.path.join(output_dir, '词云图.png')}")
-            plt.close()
-        except Exception as e:
-            print(f"生成词云图时出错: {e}")
+        pending.append({
+            'kind': 'wordcloud', 'file': '词云图.png', 'label': '词云图', 'figsize': (10, 8),
+            'frequencies': dict(top_words),
+        })
     
+    if charts is not None:
+        charts.extend(pending)
+    else:
+        render_charts(pending, output_dir)
     return dict(top_words)
 
-def analyze_decrypted_database(db_path: str, output_dir: str = None, is_qq: bool = False) -> None:
+def analyze_decrypted_database(db_path: str, output_dir: str = None, is_qq: bool = False,
+                               incremental: bool = True) -> Dict[str, Any]:
     """
     分析已解密的数据库，生成可视化和词频分析
     
@@ -342,6 +563,11 @@ def analyze_decrypted_database(db_path: str, output_dir: str = None, is_qq: bool
         db_path: 数据库路径
         output_dir: 输出目录，若为None则使用数据库所在目录
         is_qq: 是否为QQ数据库
+        incremental: 是否只分析上次分析后的新消息（分析状态保存在输出目录中）
+        
+    Returns:
+        Dict: 分析数据，aggregates中为聚合统计结果，top_words中为高频词，chat_stats中为消息最多的会话；
+        分析失败时返回空字典
     """
     if not output_dir:
         output_dir = os.path.join(os.path.dirname(db_path), 'analysis')
@@ -356,26 +582,72 @@ def analyze_decrypted_database(db_path: str, output_dir: str = None, is_qq: bool
     
     if not analysis_data:
         print("分析失败，无法继续")
-        return
+        return {}
+    
+    # 合并上次分析后的新消息，图表和词频都由累计结果生成
+    if incremental and analysis_data['schema'].get('has_rowid'):
+        state = update_analysis_state(analysis_data, output_dir)
+        analysis_data['aggregates'] = summarize_bucket_counts(state.bucket_rows())
+        analysis_data['word_counts'] = state.word_counts
     
-    # 创建可视化
-    create_visualizations(analysis_data, output_dir)
+    # 创建可视化和词频分析，图表统一渲染
+    charts = []
+    analysis_data['aggregates'] = create_visualizations(analysis_data, output_dir, charts)
+    analysis_data['top_words'] = generate_word_frequency(analysis_data, output_dir, top_n=100, charts=charts)
+    render_report_charts(charts, output_dir)
     
-    # 生成词频分析
-    generate_word_frequency(analysis_data, output_dir, top_n=100)
+    # 按会话统计
+    analysis_data['chat_stats'] = compute_chat_stats(db_path, analysis_data['schema'], output_dir)
+    get_token_cache().save()
     
     print(f"分析完成！所有结果已保存到: {output_dir}")
+    return analysis_data
 
-def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False) -> None:
+def render_report_charts(charts: List[Dict[str, Any]], output_dir: str) -> None:
+    """渲染报告中的图表，交互式报告在浏览器中绘制图表，不需要生成图片"""
+    if resolve_report_mode() == 'static':
+        render_charts(charts, output_dir)
+
+def write_report(output_dir: str, source: str, aggregates: Dict[str, Any], top_words: Dict[str, int],
+                 chat_stats: Optional[List[Dict[str, Any]]] = None, extra_html: str = '') -> str:
     """
-    生成分析报告，包括可视化和词频分析
+    按报告模式写入分析报告
     
     Args:
-        db_path: 数据库路径
         output_dir: 输出目录
-        is_qq: 是否为QQ数据库
+        source: 报告开头显示的数据来源说明
+        aggregates: summarize_bucket_counts的统计结果
+        top_words: generate_word_frequency返回的高频词
+        chat_stats: compute_chat_stats的结果
+        extra_html: 追加在图表之后的HTML片段
+        
+    Returns:
+        str: 报告路径
+    """
+    if resolve_report_mode() == 'interactive':
+        return write_interactive_report(output_dir, source, report_payload(aggregates, top_words, chat_stats),
+                                        extra_html)
+    return write_report_html(output_dir, source, aggregates, chat_stats_html(chat_stats) + extra_html)
+
+def write_report_html(output_dir: str, source: str, aggregates: Dict[str, Any],
+                      extra_html: str = '') -> str:
+    """
+    写入HTML分析报告，图表需要已经生成在output_dir中
+    
+    Args:
+        output_dir: 输出目录
+        source: 报告开头显示的数据来源说明
+        aggregates: summarize_bucket_counts的统计结果，用于显示时间范围
+        extra_html: 追加在图表之后的HTML片段
+        
+    Returns:
+        str: 报告路径
     """
-    analyze_decrypted_database(db_path, output_dir, is_qq)
+    # 时间只在这里格式化为字符串
+    time_range = ''
+    if aggregates.get('first_bucket') is not None:
+        first, last = format_times([aggregates['first_bucket'], aggregates['last_bucket']], '%Y-%m-%d')
+        time_range = f"<p>消息时间范围: {first} 至 {last}（共 {aggregates['total']} 条消息）</p>"
     
     # 生成HTML报告
     report_path = os.path.join(output_dir, 'analysis_report.html')
@@ -412,6 +684,18 @@ def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False)
                     max-width: 100%;
                     border: 1px solid #ddd;
                 }}
+                table {{
+                    border-collapse: collapse;
+                    width: 100%;
+                }}
+                th, td {{
+                    border: 1px solid #ddd;
+                    padding: 6px 10px;
+                    text-align: left;
+                }}
+                th {{
+                    background-color: #f0f0f0;
+                }}
                 .footer {{
                     margin-top: 30px;
                     text-align: center;
@@ -423,8 +707,9 @@ def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False)
         <body>
             <div class="container">
                 <h1>聊天记录分析报告</h1>
-                <p>数据库路径: {db_path}</p>
+                <p>{html.escape(source)}</p>
                 <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+                {time_range}
                 
                 <h2>数据可视化</h2>
                 
@@ -438,6 +723,11 @@ def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False)
                     <img src="各时段消息数量.png" alt="各时段消息数量" />
                 </div>
                 
+                <div class="visualization">
+                    <h3>星期时段分布</h3>
+                    <img src="星期时段分布.png" alt="星期时段分布" />
+                </div>
+                
                 <div class="visualization">
                     <h3>词频统计</h3>
                     <img src="词频统计.png" alt="词频统计" />
@@ -448,6 +738,8 @@ def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False)
                     <img src="词云图.png" alt="词云图" />
                 </div>
                 
+                {extra_html}
+                
                 <div class="footer">
                     <p>由微信/QQ数据库解密与分析工具生成</p>
                 </div>
@@ -459,6 +751,22 @@ def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False)
     print(f"已生成分析报告: {report_path}")
     return report_path
 
+def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False,
+                             incremental: bool = True) -> None:
+    """
+    生成分析报告，包括可视化和词频分析
+    
+    Args:
+        db_path: 数据库路径
+        output_dir: 输出目录
+        is_qq: 是否为QQ数据库
+        incremental: 是否只分析上次分析后的新消息
+    """
+    analysis_data = analyze_decrypted_database(db_path, output_dir, is_qq, incremental)
+    
+    return write_report(output_dir, f"数据库路径: {db_path}", analysis_data.get('aggregates') or {},
+                        analysis_data.get('top_words') or {}, analysis_data.get('chat_stats'))
+
 if __name__ == "__main__":
     # 测试
     db_path = input("请输入已解密的数据库路径: ")
@@ -8,10 +8,95 @@ import hashlib
 import binascii
 import shutil
 import glob
+import time
 from typing import Optional, List, Dict, Any, Union
 
 from wxdecrypt.utils.memory_utils import get_wechat_key
 from wxdecrypt.wechat_path import get_wechat_db_path, get_qq_db_path
+from wxdecrypt.key_cache import KeyCache, get_db_key
+from wxdecrypt.key_broker import KeyBroker
+
+def get_output_path(db_info: Dict[str, Any], output_dir: str, is_qq: bool) -> str:
+    """计算数据库解密后的保存路径：输出目录/应用名/用户ID/数据库名"""
+    if is_qq:
+        # QQ数据库使用QQ号作为目录名
+        user_id = db_info.get('qqid', 'unknown')
+        app_name = "QQ"
+    else:
+        # 微信数据库使用用户名作为目录名
+        user_id = db_info.get('username', 'unknown')
+        app_name = "WeChat"
+    return os.path.join(output_dir, app_name, user_id, db_info['db_name'])
+
+def format_size(size: Optional[int]) -> str:
+    """将字节数格式化为便于阅读的字符串"""
+    if size is None:
+        return "未知"
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def schedule_largest_first(db_infos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    按文件大小从大到小排列解密任务
+    
+    最大的数据库（通常是聊天记录）最先完成，剩余时间的估计也会随着大文件完成迅速稳定。
+    没有大小信息的记录排在最后，保持原有的相对顺序。
+    """
+    return sorted(db_infos, key=lambda db: -(db.get('size') or 0))
+
+def find_message_databases(root: str) -> List[Dict[str, Any]]:
+    """
+    在解密输出目录中查找数据库
+
+    输出目录的结构为 WeChat/<账号>/*.db 和 QQ/<QQ号>/*.db，账号取数据库所在目录名，
+    路径中包含QQ目录的视为QQ数据库；分析结果、缓存和索引都在analysis目录中，会被跳过
+    """
+    databases = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != 'analysis')
+        parts = [part.lower() for part in os.path.relpath(dirpath, root).split(os.sep)]
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.db'):
+                databases.append({
+                    'path': os.path.join(dirpath, filename),
+                    'account': os.path.basename(os.path.abspath(dirpath)),
+                    'is_qq': 'qq' in parts,
+                })
+    return databases
+
+class DecryptProgress:
+    """按已处理的字节数统计解密进度并估计剩余时间"""
+    
+    def __init__(self, db_infos: List[Dict[str, Any]]):
+        self.total_count = len(db_infos)
+        self.total_bytes = sum(db.get('size') or 0 for db in db_infos)
+        self.done_count = 0
+        self.done_bytes = 0
+        self.start_time = time.time()
+    
+    def advance(self, db_info: Dict[str, Any]) -> None:
+        """记录一个数据库处理完成（无论成功与否）"""
+        self.done_count += 1
+        self.done_bytes += db_info.get('size') or 0
+    
+    def eta(self) -> Optional[float]:
+        """估计的剩余秒数，缺少大小信息或尚未处理任何数据时返回None"""
+        elapsed = time.time() - self.start_time
+        if not self.total_bytes or not self.done_bytes or elapsed <= 0:
+            return None
+        return (self.total_bytes - self.done_bytes) * elapsed / self.done_bytes
+    
+    def describe(self) -> str:
+        """返回进度描述，如：3/10 (120.5 MB/300.0 MB)，预计剩余 12 秒"""
+        text = f"{self.done_count}/{self.total_count}"
+        if self.total_bytes:
+            text += f" ({format_size(self.done_bytes)}/{format_size(self.total_bytes)})"
+        eta = self.eta()
+        if eta is not None and self.done_count < self.total_count:
+            text += f"，预计剩余 {eta:.0f} 秒"
+        return text
 
 class WeChatDBDecrypt:
     """微信/QQ数据库解密类"""
@@ -24,6 +109,11 @@ class WeChatDBDecrypt:
         self.decrypt_qq = False  # 是否解密QQ数据库
         self.search_drives = None  # 要搜索的驱动器
         self.full_scan = False  # 是否进行全盘搜索
+        self.stop_at_first_account = False  # 全盘搜索时找到第一个完整账号即停止
+        self.backend = None  # 数据库发现后端，None表示使用当前系统
+        self.use_key_cache = True  # 是否使用按wxid保存的密钥缓存
+        self.account_keys = {}  # wxid -> 密钥
+        self.key_broker = None  # 共享的密钥服务，None时使用解密器自己的密钥服务
         
     def auto_find_and_decrypt(self, output_dir: str = "./output") -> List[Dict[str, Any]]:
         """
@@ -44,11 +134,11 @@ class WeChatDBDecrypt:
         # 查找数据库路径
         if self.decrypt_qq:
             print(f"使用{'全盘' if self.full_scan else ''}搜索方式查找QQ数据库...")
-            self.db_paths = get_qq_db_path(self.search_drives)
+            self.db_paths = get_qq_db_path(self.search_drives, self.stop_at_first_account, self.backend)
             print(f"找到 {len(self.db_paths)} 个QQ数据库")
         else:
             print(f"使用{'全盘' if self.full_scan else ''}搜索方式查找微信数据库...")
-            self.db_paths = get_wechat_db_path(self.search_drives)
+            self.db_paths = get_wechat_db_path(self.search_drives, self.stop_at_first_account, self.backend)
             print(f"找到 {len(self.db_paths)} 个微信数据库")
             
         if not self.db_paths:
@@ -60,7 +150,8 @@ class WeChatDBDecrypt:
         
         # 获取密钥
         if not self.decrypt_qq:  # QQ数据库通常不加密
-            self.key = get_wechat_key()
+            self.account_keys = self.get_key_broker().resolve(self.db_paths, self.acquire_key)
+            self.key = next(iter(self.account_keys.values()), None)
             if not self.key:
                 print("未能获取微信数据库密钥")
                 return results
@@ -68,8 +159,9 @@ class WeChatDBDecrypt:
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
-        # 解密所有数据库
-        for db_info in self.db_paths:
+        # 解密所有数据库，大文件优先
+        progress = DecryptProgress(self.db_paths)
+        for db_info in schedule_largest_first(self.db_paths):
             db_path = db_info['path']
             db_name = db_info['db_name']
             
@@ -88,7 +180,10 @@ class WeChatDBDecrypt:
             
             # 解密数据库
             output_path = os.path.join(user_output_dir, db_name)
+            self.select_key(db_info)
             success = self.decrypt_db(db_path, output_path)
+            progress.advance(db_info)
+            print(f"进度: {progress.describe()}")
             
             results.append({
                 'original': db_info,
@@ -98,6 +193,21 @@ class WeChatDBDecrypt:
             
         return results
     
+    def get_key_broker(self) -> KeyBroker:
+        """返回使用的密钥服务，未设置共享服务时按use_key_cache创建"""
+        if self.key_broker is None:
+            self.key_broker = KeyBroker(KeyCache() if self.use_key_cache else None)
+        return self.key_broker
+    
+    def select_key(self, db_info: Dict[str, Any]) -> None:
+        """切换到数据库所属微信账号的密钥"""
+        if not self.decrypt_qq and self.account_keys:
+            self.key = get_db_key(self.account_keys, db_info) or self.key
+    
+    def acquire_key(self):
+        """从运行中的微信进程获取数据库密钥"""
+        return get_wechat_key()
+    
     def _handle_test_mode(self, output_dir: str) -> List[Dict[str, Any]]:
         """处理测试模式"""
         results = []
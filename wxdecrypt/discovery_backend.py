@@ -0,0 +1,146 @@
+"""
+数据库发现所需的系统访问后端
+将注册表、用户目录和驱动器的访问抽象出来，使数据库查找既能运行在真实的Windows系统上，
+也能在Linux上针对挂载的NTFS镜像或测试目录树运行
+"""
+import os
+import re
+import json
+import string
+import platform
+from typing import List, Dict, Optional
+
+# winreg仅在Windows上可用
+try:
+    import winreg
+    HAS_WINREG = True
+except ImportError:
+    winreg = None
+    HAS_WINREG = False
+
+HKEY_CURRENT_USER = 'HKEY_CURRENT_USER'
+HKEY_LOCAL_MACHINE = 'HKEY_LOCAL_MACHINE'
+
+# 镜像中不属于真实用户的配置文件目录
+_SYSTEM_PROFILES = {'Public', 'Default', 'Default User', 'All Users', 'desktop.ini'}
+
+_WINDOWS_PATH_RE = re.compile(r'^([A-Za-z]):[\\/]?(.*)$')
+
+class DiscoveryBackend:
+    """数据库发现后端基类"""
+
+    name = 'base'
+
+    def user_profiles(self) -> List[str]:
+        """返回所有用户配置文件目录（相当于%USERPROFILE%）"""
+        raise NotImplementedError
+
+    def registry_value(self, hive: str, key_path: str, value_name: str) -> Optional[str]:
+        """读取注册表值，不存在时返回None"""
+        raise NotImplementedError
+
+    def available_drives(self) -> List[str]:
+        """返回全盘搜索的起始目录列表"""
+        raise NotImplementedError
+
+    def to_local_path(self, path: str) -> Optional[str]:
+        """将Windows路径（如注册表中的'D:\\WeChat'）转换为当前后端可访问的路径"""
+        return path
+
+class WindowsBackend(DiscoveryBackend):
+    """真实Windows系统后端，使用winreg和环境变量"""
+
+    name = 'windows'
+
+    def user_profiles(self) -> List[str]:
+        user_profile = os.environ.get('USERPROFILE', '')
+        return [user_profile] if user_profile else []
+
+    def registry_value(self, hive: str, key_path: str, value_name: str) -> Optional[str]:
+        if not HAS_WINREG:
+            return None
+        try:
+            key = winreg.OpenKey(getattr(winreg, hive), key_path)
+        except (OSError, AttributeError):
+            return None
+        try:
+            return winreg.QueryValueEx(key, value_name)[0]
+        except OSError:
+            return None
+        finally:
+            winreg.CloseKey(key)
+
+    def available_drives(self) -> List[str]:
+        drives = []
+        for letter in string.ascii_uppercase:
+            drive = f"{letter}:"
+            if os.path.exists(drive):
+                drives.append(drive)
+        return drives
+
+class MountedImageBackend(DiscoveryBackend):
+    """
+    挂载的Windows磁盘镜像或测试目录树后端
+
+    镜像根目录对应系统盘（C:），其下的Users目录中的每个子目录被视为一个用户配置文件。
+    注册表内容无法直接从镜像读取，可以通过字典或JSON文件提供，格式为
+    {"HKEY_CURRENT_USER\\\\Software\\\\Tencent\\\\WeChat": {"FileSavePath": "D:\\\\Data"}}
+    """
+
+    name = 'image'
+
+    def __init__(self, root: str, registry: Optional[Dict[str, Dict[str, str]]] = None,
+                 drive_map: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            root: 系统盘的挂载目录
+            registry: 注册表内容，键为"HIVE\\键路径"，值为该键下的值字典
+            drive_map: 其他盘符到挂载目录的映射，如{'D:': '/mnt/d'}
+        """
+        self.root = os.path.abspath(root)
+        self.registry = {k.lower(): v for k, v in (registry or {}).items()}
+        self.drive_map = {'C:': self.root}
+        for drive, mount in (drive_map or {}).items():
+            self.drive_map[drive.upper().rstrip('\\/')] = os.path.abspath(mount)
+
+    def user_profiles(self) -> List[str]:
+        users_dir = os.path.join(self.root, 'Users')
+        try:
+            names = sorted(os.listdir(users_dir))
+        except OSError:
+            return []
+        return [
+            os.path.join(users_dir, name) for name in names
+            if name not in _SYSTEM_PROFILES and os.path.isdir(os.path.join(users_dir, name))
+        ]
+
+    def registry_value(self, hive: str, key_path: str, value_name: str) -> Optional[str]:
+        values = self.registry.get(f"{hive}\\{key_path}".lower())
+        if not values:
+            return None
+        return values.get(value_name)
+
+    def available_drives(self) -> List[str]:
+        return list(dict.fromkeys(self.drive_map.values()))
+
+    def to_local_path(self, path: str) -> Optional[str]:
+        match = _WINDOWS_PATH_RE.match(path)
+        if not match:
+            return path
+        drive, rest = match.groups()
+        mount = self.drive_map.get(f"{drive.upper()}:")
+        if not mount:
+            return None
+        parts = [p for p in re.split(r'[\\/]+', rest) if p]
+        return os.path.join(mount, *parts)
+
+def load_registry_file(path: str) -> Dict[str, Dict[str, str]]:
+    """读取JSON格式的注册表导出内容"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def get_default_backend() -> Optional[DiscoveryBackend]:
+    """返回当前系统的默认后端，非Windows系统返回None"""
+    if platform.system() == 'Windows':
+        return WindowsBackend()
+    return None
@@ -6,6 +6,7 @@ import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
+import multiprocessing
 import queue
 import time
 import platform
@@ -13,22 +14,17 @@ from typing import List, Dict, Any, Optional
 
 # 导入其他模块
 from wxdecrypt.wechat_path import get_wechat_db_path, get_qq_db_path
-from wxdecrypt.db_decrypt import WeChatDBDecrypt
-from wxdecrypt.utils.memory_utils import get_wechat_key  # 确保导入get_wechat_key函数
+from wxdecrypt.db_decrypt import WeChatDBDecrypt, format_size, schedule_largest_first, DecryptProgress
+from wxdecrypt.key_cache import KeyCache, get_db_key
+from wxdecrypt.key_broker import KeyBroker
+from wxdecrypt.utils.lazy_import import (
+    has_modules, ANALYSIS_MODULES, generate_analysis_report, generate_aggregate_report,
+    create_real_decryptor
+)
 
-# 尝试导入真实解密模块
-try:
-    from wxdecrypt.real_decrypt import RealWeChatDBDecrypt
-    HAS_REAL_DECRYPT = True
-except ImportError:
-    HAS_REAL_DECRYPT = False
-
-# 导入数据分析模块（如果安装了相关依赖）
-try:
-    from wxdecrypt.data_analysis import generate_analysis_report
-    HAS_ANALYSIS = True
-except ImportError:
-    HAS_ANALYSIS = False
+# 真实解密模块和数据分析模块在使用时才导入
+HAS_REAL_DECRYPT = has_modules('wxdecrypt.real_decrypt')
+HAS_ANALYSIS = has_modules(*ANALYSIS_MODULES)
 
 class RedirectText:
     """重定向stdout到tkinter Text控件"""
@@ -80,6 +76,7 @@ class WxDecryptApp:
         self.full_scan_var = tk.BooleanVar(value=False)
         self.selected_dbs = []
         self.key = None
+        self.key_broker = KeyBroker(KeyCache())  # 所有解密线程共用，避免重复读取微信进程
         self.status_var = tk.StringVar(value="就绪")
         self.analyzing = False
         self.last_report_path = None
@@ -149,6 +146,10 @@ class WxDecryptApp:
         self.full_scan_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(options_frame, text="全盘搜索", variable=self.full_scan_var).pack(side=tk.LEFT, padx=20)
         
+        # 找到第一个完整账号即停止
+        self.first_account_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="找到首个账号即停止", variable=self.first_account_var).pack(side=tk.LEFT, padx=5)
+        
         # 按钮区域
         button_frame = ttk.Frame(control_frame)
         button_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -161,7 +162,7 @@ class WxDecryptApp:
         result_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # 创建表格
-        columns = ('id', 'type', 'username', 'db_name', 'path')
+        columns = ('id', 'type', 'username', 'db_name', 'size', 'path')
         self.result_tree = ttk.Treeview(result_frame, columns=columns, show='headings')
         
         # 设置列标题
@@ -169,6 +170,7 @@ class WxDecryptApp:
         self.result_tree.heading('type', text='类型')
         self.result_tree.heading('username', text='用户名/QQ号')
         self.result_tree.heading('db_name', text='数据库名')
+        self.result_tree.heading('size', text='大小')
         self.result_tree.heading('path', text='路径')
         
         # 设置列宽
@@ -176,6 +178,7 @@ class WxDecryptApp:
         self.result_tree.column('type', width=60, stretch=tk.NO)
         self.result_tree.column('username', width=120, stretch=tk.NO)
         self.result_tree.column('db_name', width=120, stretch=tk.NO)
+        self.result_tree.column('size', width=80, stretch=tk.NO, anchor=tk.E)
         self.result_tree.column('path', width=450)
         
         # 添加滚动条
@@ -307,6 +310,7 @@ class WxDecryptApp:
         app_type = self.app_var.get()
         drive = self.drive_var.get()
         full_scan = self.full_scan_var.get()
+        first_account = self.first_account_var.get()
         
         # 处理搜索驱动器
         search_drives = None
@@ -314,21 +318,21 @@ class WxDecryptApp:
             search_drives = [drive]
         
         # 开始搜索线程
-        threading.Thread(target=self._search_thread, args=(app_type, search_drives, full_scan), daemon=True).start()
+        threading.Thread(target=self._search_thread, args=(app_type, search_drives, full_scan, first_account), daemon=True).start()
     
-    def _search_thread(self, app_type, search_drives, full_scan):
+    def _search_thread(self, app_type, search_drives, full_scan, first_account=False):
         """搜索线程"""
         try:
             if app_type in ["微信", "全部"]:
                 # 搜索微信数据库
-                wechat_dbs = get_wechat_db_path(search_drives) if full_scan or search_drives else get_wechat_db_path()
+                wechat_dbs = get_wechat_db_path(search_drives if full_scan or search_drives else None, first_account)
                 for db in wechat_dbs:
                     db['type'] = "微信"
                 self.found_databases.extend(wechat_dbs)
             
             if app_type in ["QQ", "全部"]:
                 # 搜索QQ数据库
-                qq_dbs = get_qq_db_path(search_drives) if full_scan or search_drives else get_qq_db_path()
+                qq_dbs = get_qq_db_path(search_drives if full_scan or search_drives else None, first_account)
                 for db in qq_dbs:
                     db['type'] = "QQ"
                 self.found_databases.extend(qq_dbs)
@@ -355,11 +359,14 @@ class WxDecryptApp:
             db_name = db.get('db_name', 'unknown')
             path = db.get('path', 'unknown')
             
+            size = format_size(db.get('size'))
+            
             # 插入到表格
-            self.result_tree.insert('', 'end', values=(idx, db_type, username_display, db_name, path))
+            self.result_tree.insert('', 'end', values=(idx, db_type, username_display, db_name, size, path))
         
         count = len(self.found_databases)
-        self.status_var.set(f"搜索完成，找到 {count} 个数据库")
+        total_size = sum(db.get('size') or 0 for db in self.found_databases)
+        self.status_var.set(f"搜索完成，找到 {count} 个数据库，共 {format_size(total_size)}")
     
     def clear_search_results(self):
         """清除搜索结果"""
@@ -429,7 +436,7 @@ class WxDecryptApp:
             # 选择解密器
             if use_real_decrypt:
                 print("使用真实解密模块（基于PyWxDump）...")
-                decryptor = RealWeChatDBDecrypt()
+                decryptor = create_real_decryptor()
             else:
                 decryptor = WeChatDBDecrypt()
             
@@ -458,22 +465,9 @@ class WxDecryptApp:
             print(f"开始解密数据库: {db_path}")
             print(f"输出路径: {output_path}")
             
-            # 获取密钥（如果需要）
+            # 获取密钥（如果需要），由共享的密钥服务提供
             if not is_qq:
-                if use_real_decrypt:
-                    try:
-                        # 使用PyWxDump获取真实密钥
-                        from PyWxDump.wx import get_key as wx_get_key
-                        key = wx_get_key()
-                        if not key:
-                            print("未能通过PyWxDump获取微信密钥，尝试备用方法...")
-                            key = get_wechat_key()
-                    except Exception as e:
-                        print(f"使用PyWxDump获取密钥失败: {e}")
-                        print("使用备用方法...")
-                        key = get_wechat_key()
-                
-                self.key = decryptor.key = key
+                self.key = decryptor.key = self.key_broker.key_for(db, decryptor.acquire_key)
                 if not decryptor.key:
                     print("未能获取微信数据库密钥")
                     self.root.after(0, lambda: self.status_var.set("解密失败"))
@@ -525,8 +519,8 @@ class WxDecryptApp:
             # 选择解密器
             if use_real_decrypt:
                 print("使用真实解密模块（基于PyWxDump）...")
-                wechat_decryptor = RealWeChatDBDecrypt()
-                qq_decryptor = RealWeChatDBDecrypt()
+                wechat_decryptor = create_real_decryptor()
+                qq_decryptor = create_real_decryptor()
             else:
                 wechat_decryptor = WeChatDBDecrypt()
                 qq_decryptor = WeChatDBDecrypt()
@@ -534,34 +528,22 @@ class WxDecryptApp:
             # 设置QQ解密器
             qq_decryptor.decrypt_qq = True
             
-            # 获取微信密钥
+            # 获取微信密钥，由共享的密钥服务按账号提供
+            account_keys = {}
             wechat_dbs = [db for db in self.found_databases if db.get('type', '') == "微信"]
             if wechat_dbs:
-                if use_real_decrypt:
-                    try:
-                        # 使用PyWxDump获取真实密钥
-                        from PyWxDump.wx import get_key as wx_get_key
-                        key = wx_get_key()
-                        if not key:
-                            print("未能通过PyWxDump获取微信密钥，尝试备用方法...")
-                            key = get_wechat_key()
-                    except Exception as e:
-                        print(f"使用PyWxDump获取密钥失败: {e}")
-                        print("尝试使用备用方法...")
-                        key = get_wechat_key()
-                else:
-                    key = get_wechat_key()  # 直接调用导入的函数
-                
-                wechat_decryptor.key = key
-                if not wechat_decryptor.key:
+                account_keys = self.key_broker.resolve(wechat_dbs, wechat_decryptor.acquire_key)
+                if not any(account_keys.values()):
                     print("未能获取微信数据库密钥，将跳过微信数据库解密")
             
             # 创建输出目录
             os.makedirs(output_dir, exist_ok=True)
             
-            # 解密所有数据库
+            # 解密所有数据库，大文件优先，按已处理的字节数估计剩余时间
             success_count = 0
-            for db in self.found_databases:
+            analysis_targets = []
+            progress = DecryptProgress(self.found_databases)
+            for db in schedule_largest_first(self.found_databases):
                 db_type = db.get('type', '')
                 is_qq = (db_type == "QQ")
                 
@@ -587,31 +569,27 @@ class WxDecryptApp:
                 print(f"解密数据库 ({db_type}): {db_path}")
                 
                 # 解密
+                if not is_qq:
+                    wechat_decryptor.key = get_db_key(account_keys, db)
                 if not is_qq and not wechat_decryptor.key:
                     print("跳过，未获取到微信密钥")
+                    progress.advance(db)
                     continue
                 
                 success = decryptor.decrypt_db(db_path, output_path)
+                progress.advance(db)
+                status = f"正在解密所有数据库: {progress.describe()}"
+                self.root.after(0, lambda status=status: self.status_var.set(status))
                 
                 if success:
                     success_count += 1
                     print(f"解密成功: {output_path}")
                     
-                    # 如果需要分析
+                    # 仅分析主数据库或消息数据库，全部解密完成后生成汇总报告
                     if analyze and HAS_ANALYSIS:
-                        # 仅分析主数据库或消息数据库
                         is_main = db.get('is_main_db', False)
                         if is_main or 'msg' in db_name.lower():
-                            analysis_dir = os.path.join(os.path.dirname(output_path), 'analysis')
-                            os.makedirs(analysis_dir, exist_ok=True)
-                            print(f"开始分析数据库: {output_path}")
-                            
-                            try:
-                                report_path = generate_analysis_report(output_path, analysis_dir, is_qq)
-                                print(f"分析完成! 报告保存到: {report_path}")
-                                self.last_report_path = report_path
-                            except Exception as e:
-                                print(f"分析数据库时出错: {e}")
+                            analysis_targets.append({'path': output_path, 'account': user_id, 'is_qq': is_qq})
                 else:
                     print(f"解密失败: {db_path}")
             
@@ -621,6 +599,21 @@ class WxDecryptApp:
             if success_count > 0:
                 print("\n成功解密的数据库可在以下目录找到:")
                 print(f"{os.path.abspath(output_dir)}")
+            
+            if analysis_targets:
+                self.root.after(0, lambda: self.status_var.set("正在生成汇总分析报告..."))
+                summary = f"解密完成，成功 {success_count}/{len(self.found_databases)} 个数据库"
+                try:
+                    report_path = generate_aggregate_report(analysis_targets, os.path.join(output_dir, 'analysis'))
+                    if report_path:
+                        self.last_report_path = report_path
+                        summary += "，已生成汇总报告"
+                    else:
+                        summary += "，没有可分析的消息，未生成汇总报告"
+                except Exception as e:
+                    print(f"汇总分析时出错: {e}")
+                    summary += "，汇总报告生成失败"
+                self.root.after(0, lambda: self.status_var.set(summary))
         
         except Exception as e:
             print(f"解密过程出错: {e}")
@@ -750,4 +743,5 @@ def start_gui():
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     start_gui()
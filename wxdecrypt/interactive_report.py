@@ -0,0 +1,239 @@
+"""
+交互式分析报告
+把预先计算的统计结果（按日期和小时的消息数、消息类型、高频词和会话统计）以JSON形式嵌入报告，
+由内嵌的assets/report.js在浏览器中绘制图表，不需要生成图片，也不依赖任何外部资源。
+在报告中选择时间范围后，按时间统计的图表立即更新，不需要重新生成报告。
+报告模式可以通过set_default_report_mode、环境变量WXDECRYPT_REPORT_MODE或--report-mode设置
+"""
+import os
+import json
+import html
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+from wxdecrypt.utils.time_utils import format_times
+
+REPORT_MODE_ENV = 'WXDECRYPT_REPORT_MODE'
+
+# static：图片报告；interactive：浏览器中绘制图表的交互式报告
+REPORT_MODES = ('static', 'interactive')
+DEFAULT_REPORT_MODE = 'static'
+
+REPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'report.js')
+
+# 报告中嵌入的高频词数量
+REPORT_TOP_WORDS = 100
+
+_default_report_mode = None
+
+def set_default_report_mode(mode: Optional[str]) -> None:
+    """设置默认报告模式，为None时恢复为环境变量或static"""
+    global _default_report_mode
+    _default_report_mode = mode
+
+def resolve_report_mode(mode: Optional[str] = None) -> str:
+    """
+    确定报告模式
+
+    优先级：参数 > set_default_report_mode > 环境变量WXDECRYPT_REPORT_MODE > static
+    """
+    mode = (mode or _default_report_mode or os.environ.get(REPORT_MODE_ENV) or DEFAULT_REPORT_MODE).lower()
+    return mode if mode in REPORT_MODES else DEFAULT_REPORT_MODE
+
+def report_payload(aggregates: Dict[str, Any], top_words: Dict[str, int],
+                   chat_stats: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    生成嵌入报告的统计数据
+
+    Args:
+        aggregates: summarize_bucket_counts的统计结果
+        top_words: 按频率从高到低排列的高频词
+        chat_stats: compute_chat_stats的结果
+
+    Returns:
+        Dict: days为从第一天到最后一天的连续日期，day_hours为每天24个小时的消息数，
+        types、senders和words为[标签, 数值]列表，chats为会话统计
+    """
+    day_hour = aggregates.get('day_hour')
+    days, day_hours = [], []
+    if day_hour is not None and len(day_hour):
+        counts = {}
+        for (day, hour), count in day_hour.items():
+            counts.setdefault(day.date(), [0] * 24)[hour] = int(count)
+        # 补齐没有消息的日期，图表的横轴按天连续
+        day, last = min(counts), max(counts)
+        while day <= last:
+            days.append(day.strftime('%Y-%m-%d'))
+            day_hours.append(counts.get(day, [0] * 24))
+            day += timedelta(days=1)
+
+    chats = []
+    for chat in chat_stats or []:
+        first_day, last_day = format_times([chat['first_time'], chat['last_time']], '%Y-%m-%d')
+        chats.append({
+            'talker': str(chat['talker']),
+            'message_count': chat['message_count'],
+            'sent_count': chat['sent_count'],
+            'active_days': chat['active_days'],
+            'first_day': first_day,
+            'last_day': last_day,
+            'words': [word for word, _ in chat['top_words']],
+        })
+
+    by_type = aggregates.get('by_type')
+    by_sender = aggregates.get('by_sender')
+    return {
+        'days': days,
+        'day_hours': day_hours,
+        'types': [[str(t), int(c)] for t, c in by_type.items()] if by_type is not None else [],
+        'senders': ([['发送' if s else '接收', int(c)] for s, c in by_sender.items()]
+                    if by_sender is not None else []),
+        'words': [[word, int(count)] for word, count in list(top_words.items())[:REPORT_TOP_WORDS]],
+        'chats': chats,
+    }
+
+def write_interactive_report(output_dir: str, source: str, payload: Dict[str, Any],
+                             extra_html: str = '') -> str:
+    """
+    写入交互式报告
+
+    Args:
+        output_dir: 输出目录
+        source: 报告开头显示的数据来源说明
+        payload: report_payload生成的统计数据
+        extra_html: 追加在图表之后的HTML片段
+
+    Returns:
+        str: 报告路径
+    """
+    with open(REPORT_SCRIPT, 'r', encoding='utf-8') as f:
+        script = f.read()
+    # 防止数据中的</script>提前结束脚本标签
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+    chat_table = ''
+    if payload['chats']:
+        chat_table = """
+                <h2>消息最多的会话</h2>
+                <p>点击表头排序</p>
+                <table id="chat-table">
+                    <thead><tr><th>会话</th><th>消息数</th><th>发送</th><th>活跃天数</th><th>时间范围</th><th>高频词</th></tr></thead>
+                    <tbody></tbody>
+                </table>"""
+
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, 'analysis_report.html')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>聊天记录分析报告</title>
+            <style>
+                body {{
+                    font-family: Arial, sans-serif;
+                    margin: 0;
+                    padding: 20px;
+                    background-color: #f5f5f5;
+                }}
+                .container {{
+                    max-width: 1200px;
+                    margin: 0 auto;
+                    background-color: white;
+                    padding: 20px;
+                    box-shadow: 0 0 10px rgba(0,0,0,0.1);
+                }}
+                h1, h2, h3 {{
+                    color: #333;
+                }}
+                .visualization {{
+                    margin: 20px 0;
+                }}
+                .controls {{
+                    position: sticky;
+                    top: 0;
+                    background-color: white;
+                    padding: 10px 0;
+                    border-bottom: 1px solid #ddd;
+                }}
+                table {{
+                    border-collapse: collapse;
+                    width: 100%;
+                }}
+                th, td {{
+                    border: 1px solid #ddd;
+                    padding: 6px 10px;
+                    text-align: left;
+                }}
+                th {{
+                    background-color: #f0f0f0;
+                }}
+                .footer {{
+                    margin-top: 30px;
+                    text-align: center;
+                    color: #777;
+                    font-size: 0.9em;
+                }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>聊天记录分析报告</h1>
+                <p>{html.escape(source)}</p>
+                <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+
+                <div class="controls">
+                    时间范围: <input type="date" id="range-start" /> 至 <input type="date" id="range-end" />
+                    <button id="range-reset">全部时间</button>
+                    <span id="range-summary"></span>
+                </div>
+
+                <h2>数据可视化</h2>
+                <p>在每日消息数量图表上拖动可以选择时间范围，双击恢复全部时间</p>
+
+                <div class="visualization">
+                    <h3>每日消息数量</h3>
+                    <div id="chart-daily"></div>
+                </div>
+
+                <div class="visualization">
+                    <h3>各时段消息数量</h3>
+                    <div id="chart-hourly"></div>
+                </div>
+
+                <div class="visualization">
+                    <h3>星期时段分布</h3>
+                    <div id="chart-heatmap"></div>
+                </div>
+
+                <div class="visualization">
+                    <h3>消息类型分布</h3>
+                    <div id="chart-types"></div>
+                </div>
+
+                <div class="visualization">
+                    <h3>发送/接收消息比例</h3>
+                    <div id="chart-senders"></div>
+                </div>
+
+                <div class="visualization">
+                    <h3>词频统计 (Top 30)</h3>
+                    <div id="chart-words"></div>
+                </div>
+                {chat_table}
+                {extra_html}
+
+                <div class="footer">
+                    <p>由微信/QQ数据库解密与分析工具生成</p>
+                </div>
+            </div>
+            <script type="application/json" id="report-data">{data}</script>
+            <script>
+{script}
+            </script>
+        </body>
+        </html>
+        """)
+
+    print(f"已生成交互式分析报告: {report_path}")
+    return report_path
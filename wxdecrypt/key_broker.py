@@ -0,0 +1,111 @@
+"""
+进程内共享的密钥服务
+命令行和图形界面的所有解密线程都通过同一个KeyBroker获取微信数据库密钥：
+已缓存且校验通过的密钥直接返回；需要读取微信进程时，同一时刻只会进行一次获取，
+并发的请求会等待这次获取的结果，而不会重复读取进程内存
+"""
+import time
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+from wxdecrypt.key_cache import KeyCache, resolve_account_keys, get_db_key
+
+# 缓存无法提供密钥时，这段时间内（秒）从进程获取的密钥仍会被复用，
+# 避免未能通过校验的密钥（如测试密钥）让每个线程都重新读取一次进程
+PROCESS_KEY_REUSE_SECONDS = 30.0
+
+class _Flight:
+    """一次正在进行的密钥获取"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class KeyBroker:
+    """线程安全的密钥服务，合并并发的密钥获取请求"""
+
+    def __init__(self, cache: Optional[KeyCache] = None):
+        """
+        初始化密钥服务
+
+        Args:
+            cache: 按wxid保存的密钥缓存，为None时只在当前进程内缓存
+        """
+        self.cache = cache if cache is not None else KeyCache(passphrase='', use_keyring=False)
+        self.lock = threading.Lock()
+        self.resolve_lock = threading.Lock()
+        self.process_key = None  # 最近一次从微信进程获取的密钥
+        self.process_key_time = 0.0  # 获取process_key的时间
+        self.flight = None  # 正在进行的获取，没有时为None
+        self.acquire_count = 0  # 实际读取微信进程的次数
+
+    def acquire(self, acquirer: Callable[[], Any], max_age: Optional[float] = None):
+        """
+        从微信进程获取密钥，并发调用只会触发一次获取
+
+        Args:
+            acquirer: 实际获取密钥的函数，如解密器的acquire_key
+            max_age: 已获取的密钥可复用的最长时间（秒），为None时总是复用
+
+        Returns:
+            密钥，获取失败时返回None
+        """
+        with self.lock:
+            fresh = max_age is None or time.monotonic() - self.process_key_time <= max_age
+            if self.process_key is not None and fresh:
+                return self.process_key
+            flight = self.flight
+            leader = flight is None
+            if leader:
+                flight = self.flight = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            return flight.result
+
+        try:
+            result = acquirer()
+        except Exception as e:
+            print(f"获取微信数据库密钥失败: {e}")
+            result = None
+
+        with self.lock:
+            if result:
+                self.process_key = result
+                self.process_key_time = time.monotonic()
+                self.acquire_count += 1
+            self.flight = None
+        flight.result = result
+        flight.done.set()
+        return result
+
+    def resolve(self, db_infos: List[Dict[str, Any]], acquirer: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        为数据库所属的每个微信账号确定密钥
+
+        缓存中的密钥校验通过时直接使用，只有校验失败的账号才会读取微信进程。
+        多个线程同时调用时依次进行：后到的线程通常可以直接使用前一个线程写入缓存的密钥。
+
+        Args:
+            db_infos: 数据库信息列表
+            acquirer: 实际获取密钥的函数
+
+        Returns:
+            wxid -> 密钥
+        """
+        with self.resolve_lock:
+            # 缓存无法提供密钥时，较早获取的密钥多半也已失效（如重新登录），需要重新读取进程
+            return resolve_account_keys(
+                db_infos, lambda: self.acquire(acquirer, PROCESS_KEY_REUSE_SECONDS), self.cache)
+
+    def key_for(self, db_info: Dict[str, Any], acquirer: Callable[[], Any]):
+        """返回单个数据库对应的密钥"""
+        return get_db_key(self.resolve([db_info], acquirer), db_info)
+
+    def invalidate(self, wxid: Optional[str] = None) -> None:
+        """丢弃已获取的密钥；指定wxid时同时删除该账号的缓存密钥"""
+        with self.lock:
+            self.process_key = None
+        if wxid:
+            with self.resolve_lock:
+                self.cache.remove(wxid)
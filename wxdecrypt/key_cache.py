@@ -0,0 +1,361 @@
+"""
+数据库密钥缓存
+按wxid保存已经获取到的数据库密钥，避免每次运行都从微信进程内存中重新获取。
+密钥优先使用口令加密后保存到本地文件（设置环境变量WXDECRYPT_KEY_PASSPHRASE时），
+否则保存到系统密钥环（需要安装keyring）；两者都不可用时只在当前进程内缓存。
+使用前会用数据库第一页的HMAC校验密钥，校验失败（如重新登录后）才重新获取。
+缓存条目中同时保存按数据库salt派生的HMAC密钥，校验时只需计算一次HMAC，不必重新运行PBKDF2
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+from typing import List, Dict, Any, Optional, Callable, Union
+
+from wxdecrypt.utils.lazy_import import has_modules
+
+# keyring导入时会扫描所有后端，只在实际读写密钥环时才导入
+HAS_KEYRING = has_modules('keyring')
+
+# 尝试导入AES实现（pycryptodome）
+try:
+    from Crypto.Cipher import AES
+    from Crypto.Random import get_random_bytes
+    HAS_AES = True
+except ImportError:
+    HAS_AES = False
+
+from wxdecrypt.utils.crypto_utils import (
+    normalize_key, verify_key, derive_keys, check_page_hmac, DEFAULT_PAGE_SIZE, SALT_SIZE
+)
+
+KEY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.wxdecrypt')
+KEY_CACHE_FILE = os.path.join(KEY_CACHE_DIR, 'key_cache.json')
+PASSPHRASE_ENV = 'WXDECRYPT_KEY_PASSPHRASE'
+KEYRING_SERVICE = 'wxdecrypt'
+
+# 口令派生参数
+PASSPHRASE_KDF_ITERATIONS = 200000
+PASSPHRASE_SALT_SIZE = 16
+GCM_NONCE_SIZE = 12
+
+# 每个账号最多保存的HMAC密钥数（每个校验过的数据库salt一个）
+MAX_MAC_KEYS = 8
+
+def read_first_page(db_path: str, page_size: int = DEFAULT_PAGE_SIZE) -> Optional[bytes]:
+    """读取数据库的第一页，文件无法读取或不足一页时返回None"""
+    try:
+        with open(db_path, 'rb') as f:
+            page = f.read(page_size)
+    except OSError:
+        return None
+    return page if len(page) == page_size else None
+
+def validate_key_for_db(key: Union[bytes, str, None], db_path: str) -> bool:
+    """
+    用数据库第一页的HMAC校验密钥
+
+    派生的HMAC密钥按(密钥, salt)缓存，同一个数据库的重复校验只需计算一次HMAC
+    """
+    if not key:
+        return False
+    first_page = read_first_page(db_path)
+    return first_page is not None and verify_key(key, first_page)
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text.encode('ascii'))
+
+def _encode_entry(entry: Dict[str, Any]) -> str:
+    """将缓存条目（密钥及各salt的HMAC密钥）序列化为需要保护的文本"""
+    return json.dumps({
+        'key': entry['key'].hex(),
+        'mac_keys': {salt: mac_key.hex() for salt, mac_key in entry['mac_keys'].items()},
+    })
+
+def _decode_entry(secret: Union[bytes, str, None]) -> Optional[Dict[str, Any]]:
+    """
+    解析缓存条目，兼容只保存了密钥的旧格式（口令模式为原始字节，密钥环为十六进制字符串）
+
+    Returns:
+        {'key': 密钥, 'mac_keys': {salt十六进制: HMAC密钥}}，无法解析时返回None
+    """
+    if not secret:
+        return None
+    text = secret.decode('utf-8', 'replace') if isinstance(secret, bytes) else secret
+    if text.startswith('{'):
+        try:
+            data = json.loads(text)
+            return {
+                'key': bytes.fromhex(data['key']),
+                'mac_keys': {salt: bytes.fromhex(mac_key) for salt, mac_key in data.get('mac_keys', {}).items()},
+            }
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+    key = normalize_key(secret)
+    return {'key': key, 'mac_keys': {}} if key else None
+
+class KeyCache:
+    """按wxid缓存数据库密钥"""
+
+    def __init__(self, cache_file: str = KEY_CACHE_FILE, passphrase: Optional[str] = None,
+                 use_keyring: bool = True):
+        """
+        初始化密钥缓存
+
+        Args:
+            cache_file: 口令加密模式下的缓存文件路径
+            passphrase: 加密口令，默认读取环境变量WXDECRYPT_KEY_PASSPHRASE
+            use_keyring: 没有口令时是否使用系统密钥环
+        """
+        self.cache_file = cache_file
+        self.passphrase = passphrase if passphrase is not None else os.environ.get(PASSPHRASE_ENV)
+        self.memory = {}  # wxid -> {'key': 密钥, 'mac_keys': {salt: HMAC密钥}}，当前进程内的缓存
+        self.wrapping_keys = {}  # salt -> 由口令派生的密钥，每次运行每个salt只派生一次
+
+        if self.passphrase and HAS_AES:
+            self.storage = 'passphrase'
+        elif use_keyring and HAS_KEYRING:
+            self.storage = 'keyring'
+        else:
+            self.storage = 'memory'
+            if self.passphrase:
+                print("需要安装pycryptodome才能使用口令保护的密钥缓存，密钥仅在本次运行中缓存")
+
+    def get(self, wxid: str) -> Optional[bytes]:
+        """读取wxid对应的缓存密钥，不存在时返回None"""
+        entry = self._get_entry(wxid)
+        return entry['key'] if entry else None
+
+    def validate(self, wxid: str, db_path: str) -> bool:
+        """
+        用数据库第一页的HMAC校验wxid的缓存密钥
+
+        优先使用条目中保存的该salt的HMAC密钥，只计算一次HMAC；没有保存或校验失败时
+        才由密钥重新派生（PBKDF2），通过后把新的HMAC密钥写回缓存
+        """
+        entry = self._get_entry(wxid)
+        first_page = read_first_page(db_path)
+        if not entry or first_page is None:
+            return False
+
+        mac_key = entry['mac_keys'].get(first_page[:SALT_SIZE].hex())
+        if mac_key and check_page_hmac(mac_key, first_page, 1):
+            return True
+        if not verify_key(entry['key'], first_page):
+            return False
+        if self._remember_mac_key(entry, first_page):
+            self._store(wxid, entry)
+        return True
+
+    def put(self, wxid: str, key: Union[bytes, str], db_path: Optional[str] = None) -> None:
+        """
+        保存wxid对应的密钥
+
+        Args:
+            wxid: 微信账号
+            key: 数据库密钥
+            db_path: 已用该密钥校验过的数据库，提供时同时保存其salt对应的HMAC密钥
+        """
+        key = normalize_key(key)
+        if not key:
+            return
+        entry = {'key': key, 'mac_keys': {}}
+        first_page = read_first_page(db_path) if db_path else None
+        if first_page is not None and verify_key(key, first_page):
+            self._remember_mac_key(entry, first_page)
+        self.memory[wxid] = entry
+        self._store(wxid, entry)
+
+    def _get_entry(self, wxid: str) -> Optional[Dict[str, Any]]:
+        """读取wxid对应的缓存条目，不存在时返回None"""
+        if wxid in self.memory:
+            return self.memory[wxid]
+
+        entry = None
+        if self.storage == 'passphrase':
+            entry = _decode_entry(self._load_passphrase_entry(wxid))
+        elif self.storage == 'keyring':
+            import keyring
+            from keyring.errors import KeyringError
+            try:
+                entry = _decode_entry(keyring.get_password(KEYRING_SERVICE, wxid))
+            except KeyringError as e:
+                print(f"读取系统密钥环失败: {e}")
+
+        if entry:
+            self.memory[wxid] = entry
+        return entry
+
+    def _remember_mac_key(self, entry: Dict[str, Any], first_page: bytes) -> bool:
+        """在条目中记录数据库salt对应的HMAC密钥（derive_keys已按(密钥, salt)缓存），返回条目是否改变"""
+        salt = first_page[:SALT_SIZE]
+        _, mac_key = derive_keys(entry['key'], salt)
+        mac_keys = entry['mac_keys']
+        if mac_keys.get(salt.hex()) == mac_key:
+            return False
+        mac_keys[salt.hex()] = mac_key
+        # 只保留最近的几个salt（数据库重建后salt会改变）
+        while len(mac_keys) > MAX_MAC_KEYS:
+            del mac_keys[next(iter(mac_keys))]
+        return True
+
+    def _store(self, wxid: str, entry: Dict[str, Any]) -> None:
+        """把缓存条目写入持久化存储"""
+        if self.storage == 'passphrase':
+            self._save_passphrase_entry(wxid, _encode_entry(entry).encode('utf-8'))
+        elif self.storage == 'keyring':
+            import keyring
+            from keyring.errors import KeyringError
+            try:
+                keyring.set_password(KEYRING_SERVICE, wxid, _encode_entry(entry))
+            except KeyringError as e:
+                print(f"写入系统密钥环失败: {e}")
+
+    def remove(self, wxid: str) -> None:
+        """删除wxid对应的缓存密钥"""
+        self.memory.pop(wxid, None)
+
+        if self.storage == 'passphrase':
+            entries = self._load_entries()
+            if entries.pop(wxid, None) is not None:
+                self._save_entries(entries)
+        elif self.storage == 'keyring':
+            import keyring
+            from keyring.errors import KeyringError
+            try:
+                keyring.delete_password(KEYRING_SERVICE, wxid)
+            except KeyringError:
+                pass
+
+    def _derive_wrapping_key(self, salt: bytes) -> bytes:
+        """由口令派生用于加密缓存条目的密钥，结果按salt保存在当前进程内"""
+        if salt not in self.wrapping_keys:
+            self.wrapping_keys[salt] = hashlib.pbkdf2_hmac(
+                'sha256', self.passphrase.encode('utf-8'), salt, PASSPHRASE_KDF_ITERATIONS, dklen=32)
+        return self.wrapping_keys[salt]
+
+    def _load_entries(self) -> Dict[str, Dict[str, str]]:
+        """读取缓存文件，文件不存在或损坏时返回空字典"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_entries(self, entries: Dict[str, Dict[str, str]]) -> None:
+        """写入缓存文件，先写临时文件再替换"""
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_path = self.cache_file + '.tmp'
+        # 仅当前用户可读写
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(temp_path, self.cache_file)
+
+    def _load_passphrase_entry(self, wxid: str) -> Optional[bytes]:
+        """读取并解密缓存文件中的条目，口令错误时返回None"""
+        entry = self._load_entries().get(wxid)
+        if not entry:
+            return None
+        try:
+            wrapping_key = self._derive_wrapping_key(_unb64(entry['salt']))
+            cipher = AES.new(wrapping_key, AES.MODE_GCM, nonce=_unb64(entry['nonce']))
+            cipher.update(wxid.encode('utf-8'))
+            return cipher.decrypt_and_verify(_unb64(entry['ciphertext']), _unb64(entry['tag']))
+        except (KeyError, ValueError):
+            print(f"无法解密 {wxid} 的缓存密钥，口令可能已更改")
+            return None
+
+    def _save_passphrase_entry(self, wxid: str, secret: bytes) -> None:
+        """加密缓存条目并写入缓存文件"""
+        # 复用本次运行已经派生过的salt，避免再运行一次口令派生；nonce每次都重新生成
+        salt = next(iter(self.wrapping_keys), None) or get_random_bytes(PASSPHRASE_SALT_SIZE)
+        nonce = get_random_bytes(GCM_NONCE_SIZE)
+        cipher = AES.new(self._derive_wrapping_key(salt), AES.MODE_GCM, nonce=nonce)
+        cipher.update(wxid.encode('utf-8'))
+        ciphertext, tag = cipher.encrypt_and_digest(secret)
+
+        entries = self._load_entries()
+        entries[wxid] = {
+            'salt': _b64(salt),
+            'nonce': _b64(nonce),
+            'ciphertext': _b64(ciphertext),
+            'tag': _b64(tag),
+            'updated': int(time.time()),
+        }
+        try:
+            self._save_entries(entries)
+        except OSError as e:
+            print(f"保存密钥缓存失败: {e}")
+
+def _group_accounts(db_infos: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    按wxid分组，为每个账号选出用于校验密钥的数据库
+
+    优先使用主数据库，否则使用该账号最大的数据库
+    """
+    probes = {}
+    for db_info in db_infos:
+        wxid = db_info.get('wxid') or db_info.get('username') or 'unknown'
+        current = probes.get(wxid)
+        if current is None or _probe_rank(db_info) > _probe_rank(current):
+            probes[wxid] = db_info
+    return {wxid: db_info['path'] for wxid, db_info in probes.items()}
+
+def _probe_rank(db_info: Dict[str, Any]):
+    """校验用数据库的排序依据：(是否主数据库, 文件大小)"""
+    return bool(db_info.get('is_main_db')), db_info.get('size') or 0
+
+def resolve_account_keys(db_infos: List[Dict[str, Any]], acquire: Callable[[], Any],
+                         cache: Optional[KeyCache] = None) -> Dict[str, Any]:
+    """
+    为每个微信账号确定数据库密钥
+
+    先用缓存的密钥校验各账号的数据库，全部通过时不需要访问微信进程；
+    否则调用一次acquire获取密钥，校验通过的账号会写入缓存。
+
+    Args:
+        db_infos: 数据库信息列表
+        acquire: 从微信进程获取密钥的函数
+        cache: 密钥缓存，为None时不使用缓存
+
+    Returns:
+        wxid -> 密钥；获取到的密钥未能通过校验时仍会返回，由解密步骤给出最终结果
+    """
+    keys = {}
+    missing = []
+    for wxid, probe_path in _group_accounts(db_infos).items():
+        cached = cache.get(wxid) if cache else None
+        if cached and cache.validate(wxid, probe_path):
+            print(f"使用缓存的密钥: {wxid}")
+            keys[wxid] = cached
+        else:
+            if cached:
+                print(f"缓存的密钥已失效: {wxid}")
+                cache.remove(wxid)
+            missing.append((wxid, probe_path))
+
+    if not missing:
+        return keys
+
+    key = acquire()
+    if not key:
+        return keys
+
+    for wxid, probe_path in missing:
+        keys[wxid] = key
+        if validate_key_for_db(key, probe_path):
+            if cache:
+                cache.put(wxid, key, probe_path)
+        else:
+            print(f"警告: 获取到的密钥未能通过 {wxid} 数据库的校验，不会写入缓存")
+    return keys
+
+def get_db_key(account_keys: Dict[str, Any], db_info: Dict[str, Any]):
+    """从resolve_account_keys的结果中取出数据库对应的密钥"""
+    wxid = db_info.get('wxid') or db_info.get('username') or 'unknown'
+    return account_keys.get(wxid)
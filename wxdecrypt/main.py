@@ -4,32 +4,27 @@
 import os
 import sys
 import argparse
-from typing import List, Dict, Any, Optional, Tuple, Union
+import multiprocessing
+from typing import List, Dict, Any, Optional, Tuple, Union, TYPE_CHECKING
 
 from wxdecrypt.wechat_path import get_wechat_db_path, get_qq_db_path
-from wxdecrypt.db_decrypt import WeChatDBDecrypt
+from wxdecrypt.discovery_backend import MountedImageBackend, load_registry_file
+from wxdecrypt.db_decrypt import WeChatDBDecrypt, format_size, find_message_databases
+from wxdecrypt.key_cache import KeyCache
+from wxdecrypt.key_broker import KeyBroker
+from wxdecrypt.utils.lazy_import import (
+    has_modules, ANALYSIS_MODULES, generate_analysis_report, generate_aggregate_report,
+    create_real_decryptor
+)
 from wxdecrypt import __version__
 
-# 导入数据分析模块（如果安装了相关依赖）
-try:
-    from wxdecrypt.data_analysis import generate_analysis_report
-    HAS_ANALYSIS = True
-except ImportError:
-    HAS_ANALYSIS = False
+if TYPE_CHECKING:
+    from wxdecrypt.watch import DatabaseWatcher
 
-# 尝试导入GUI模块
-try:
-    from wxdecrypt.gui import start_gui
-    HAS_GUI = True
-except ImportError:
-    HAS_GUI = False
-
-# 导入真实解密模块
-try:
-    from wxdecrypt.real_decrypt import RealWeChatDBDecrypt
-    HAS_REAL_DECRYPT = True
-except ImportError:
-    HAS_REAL_DECRYPT = False
+# 可选功能只检查依赖是否已安装，对应模块在用到时才导入
+HAS_ANALYSIS = has_modules(*ANALYSIS_MODULES)
+HAS_GUI = has_modules('tkinter')
+HAS_REAL_DECRYPT = has_modules('wxdecrypt.real_decrypt')
 
 def parse_args():
     """解析命令行参数"""
@@ -50,6 +45,17 @@ def parse_args():
                        help='指定要搜索的驱动器，用逗号分隔，如"C:,D:",如果不指定则自动搜索所有驱动器')
     parser.add_argument('-f', '--full-scan', action='store_true',
                        help='进行全盘搜索，可能需要较长时间')
+    parser.add_argument('--first-account', action='store_true',
+                       help='全盘搜索时找到第一个完整账号后立即停止')
+    
+    # 挂载镜像选项
+    parser.add_argument('--image-root',
+                       help='在挂载的Windows镜像或目录树中查找数据库，指定镜像系统盘(C:)的挂载目录')
+    parser.add_argument('--registry-file',
+                       help='配合--image-root使用，JSON格式的注册表导出内容')
+    parser.add_argument('--image-drive', action='append', type=parse_image_drive, default=[],
+                       metavar='D:=/mnt/d',
+                       help='配合--image-root使用，镜像中其他盘符的挂载目录，可以多次指定')
     
     # QQ相关选项
     parser.add_argument('--qq', action='store_true', 
@@ -63,6 +69,15 @@ def parse_args():
                           help='解密后进行数据分析，生成可视化图表和词频分析')
         parser.add_argument('--analyze-only', 
                           help='仅对指定的已解密数据库文件进行分析，不执行解密操作')
+        parser.add_argument('--aggregate', action='store_true',
+                          help='把所有数据库合并为一份汇总报告，并为每个账号生成报告；'
+                               '配合--analyze-only时可以指定解密输出目录')
+        parser.add_argument('--timezone',
+                          help='按哪个时区统计消息时间，如Asia/Shanghai (默认: 系统时区)')
+        parser.add_argument('--chart-dpi',
+                          help='图表分辨率，可以是数字或preview(72)、standard(150)、high(300) (默认: standard)')
+        parser.add_argument('--report-mode', choices=['static', 'interactive'],
+                          help='报告模式：static为图片报告，interactive在浏览器中绘制可按时间筛选的图表 (默认: static)')
     
     # GUI选项
     parser.add_argument('--cli', action='store_true',
@@ -71,17 +86,33 @@ def parse_args():
     # 真实解密选项
     parser.add_argument('-b', '--basic', action='store_true',
                        help='使用基本解密模式')
+    parser.add_argument('--no-key-cache', action='store_true',
+                       help='不使用密钥缓存，每次都从微信进程获取密钥')
+    
+    # 压缩包选项
+    parser.add_argument('--archive', action='append',
+                       help='直接在zip/tar备份中查找并解密数据库，无需先解压，可多次指定')
+    parser.add_argument('--key',
+                       help='微信数据库密钥（十六进制），处理压缩包时使用，不指定则从运行中的微信获取')
+    
+    # 监视模式选项
+    parser.add_argument('-w', '--watch', action='store_true',
+                       help='解密后持续监视数据库变化，有变化时自动重新解密')
+    parser.add_argument('--watch-interval', type=float, default=5.0,
+                       help='未安装watchdog时的轮询间隔，单位秒 (默认: 5)')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                       help='监视模式下的防抖时间，文件停止写入该时间后才重新解密，单位秒 (默认: 2)')
     
     return parser.parse_args()
 
-def list_databases(list_qq=False, drives=None, full_scan=False):
+def list_databases(list_qq=False, drives=None, full_scan=False, first_account=False, backend=None):
     """列出所有找到的数据库"""
     # 处理驱动器参数
     search_drives = parse_drives(drives) if drives else None
     
     if not list_qq:
         print("正在查找微信数据库...")
-        db_paths = get_wechat_db_path(search_drives) if full_scan or drives else get_wechat_db_path()
+        db_paths = get_wechat_db_path(search_drives if full_scan or drives else None, first_account, backend)
         
         if not db_paths:
             print("\n未找到任何微信数据库")
@@ -102,11 +133,12 @@ def list_databases(list_qq=False, drives=None, full_scan=False):
             print(f"   微信ID: {db['wxid']}")
             print(f"   数据库: {db['db_name']}")
             print(f"   是否主数据库: {'是' if db.get('is_main_db', False) else '否'}")
+            print(f"   大小: {format_size(db.get('size'))}")
             print(f"   路径: {db['path']}")
             print()
     else:
         print("正在查找QQ数据库...")
-        qq_dbs = get_qq_db_path(search_drives) if full_scan or drives else get_qq_db_path()
+        qq_dbs = get_qq_db_path(search_drives if full_scan or drives else None, first_account, backend)
         
         if not qq_dbs:
             print("\n未找到任何QQ数据库")
@@ -123,12 +155,28 @@ def list_databases(list_qq=False, drives=None, full_scan=False):
         for idx, db in enumerate(qq_dbs, 1):
             print(f"{idx}. QQ号: {db['qqid']}")
             print(f"   数据库: {db['db_name']}")
+            print(f"   大小: {format_size(db.get('size'))}")
             print(f"   路径: {db['path']}")
             print()
 
+def create_decryptor(use_real_decrypt: bool = True):
+    """根据是否使用真实解密选择解密器"""
+    if use_real_decrypt and HAS_REAL_DECRYPT:
+        print("使用真实解密模块（基于PyWxDump）...")
+        return create_real_decryptor()
+    
+    if use_real_decrypt:
+        print("真实解密模块不可用，将使用基本解密模块...")
+    else:
+        print("使用基本解密模块...")
+    return WeChatDBDecrypt()
+
 def decrypt_all_databases(output_dir: str = "./output", analyze: bool = False, 
                         decrypt_qq: bool = False, search_drives: List[str] = None,
-                        test_mode: bool = False, use_real_decrypt: bool = True) -> List[Dict[str, Any]]:
+                        test_mode: bool = False, use_real_decrypt: bool = True,
+                        first_account: bool = False, backend=None,
+                        watcher: Optional['DatabaseWatcher'] = None,
+                        key_broker: Optional[KeyBroker] = None) -> List[Dict[str, Any]]:
     """
     解密所有找到的微信/QQ数据库
     
@@ -139,6 +187,10 @@ def decrypt_all_databases(output_dir: str = "./output", analyze: bool = False,
         search_drives: 要搜索的驱动器列表
         test_mode: 是否为测试模式
         use_real_decrypt: 是否使用真实解密
+        first_account: 全盘搜索时找到第一个完整账号后立即停止
+        backend: 数据库发现后端，None表示使用当前系统
+        watcher: 监视器，指定后解密成功的数据库会加入监视
+        key_broker: 共享的密钥服务，多次调用之间复用已获取的密钥
         
     Returns:
         解密结果列表
@@ -150,20 +202,15 @@ def decrypt_all_databases(output_dir: str = "./output", analyze: bool = False,
         print("开始解密微信数据库...")
     
     # 选择解密器
-    if use_real_decrypt and HAS_REAL_DECRYPT:
-        print("使用真实解密模块（基于PyWxDump）...")
-        decryptor = RealWeChatDBDecrypt()
-    else:
-        if use_real_decrypt:
-            print("真实解密模块不可用，将使用基本解密模块...")
-        else:
-            print("使用基本解密模块...")
-        decryptor = WeChatDBDecrypt()
+    decryptor = create_decryptor(use_real_decrypt)
     
     # 设置参数
     decryptor.test_mode = test_mode
     decryptor.decrypt_qq = decrypt_qq
     decryptor.search_drives = search_drives
+    decryptor.stop_at_first_account = first_account
+    decryptor.backend = backend
+    decryptor.key_broker = key_broker
     
     # 开始解密
     results = decryptor.auto_find_and_decrypt(output_dir)
@@ -172,6 +219,10 @@ def decrypt_all_databases(output_dir: str = "./output", analyze: bool = False,
     success_count = sum(1 for r in results if r['success'])
     print(f"\n解密完成！成功: {success_count}/{len(results)}")
     
+    # 加入监视
+    if watcher is not None:
+        watcher.add(decryptor, [r['original'] for r in results if r['success']])
+    
     # 成功的数据库解密路径
     if success_count > 0:
         print("\n成功解密的数据库:")
@@ -188,6 +239,61 @@ def decrypt_all_databases(output_dir: str = "./output", analyze: bool = False,
     
     return results
 
+def process_archives(archives: List[str], output_dir: str, decrypt_qq: bool = False,
+                     list_only: bool = False, key: Optional[str] = None,
+                     use_real_decrypt: bool = True,
+                     key_broker: Optional[KeyBroker] = None) -> List[Dict[str, Any]]:
+    """
+    在压缩包中查找并解密数据库
+    
+    Args:
+        archives: 压缩包路径列表
+        output_dir: 输出目录
+        decrypt_qq: 是否处理QQ数据库
+        list_only: 仅列出压缩包中的数据库
+        key: 微信数据库密钥（十六进制），为None时从运行中的微信获取
+        use_real_decrypt: 获取密钥时是否使用真实解密模块
+        key_broker: 共享的密钥服务
+        
+    Returns:
+        解密结果列表
+    """
+    from wxdecrypt.archive_source import find_db_in_archive, decrypt_archive, is_archive
+    
+    results = []
+    app_name = "QQ" if decrypt_qq else "微信"
+    valid_archives = []
+    for archive in archives:
+        if is_archive(archive):
+            valid_archives.append(archive)
+        else:
+            print(f"警告: 不是有效的压缩包: {archive}")
+    archives = valid_archives
+    
+    if list_only:
+        for archive in archives:
+            dbs = find_db_in_archive(archive, decrypt_qq)
+            print(f"\n压缩包 {archive} 中找到 {len(dbs)} 个{app_name}数据库:")
+            for idx, db in enumerate(dbs, 1):
+                user = db['qqid'] if decrypt_qq else db['username']
+                print(f"{idx}. {user} / {db['db_name']} ({format_size(db['size'])})")
+                print(f"   成员: {db['member']}")
+        return results
+    
+    if not decrypt_qq and not key:
+        key_broker = key_broker or KeyBroker()
+        key = key_broker.acquire(create_decryptor(use_real_decrypt).acquire_key)
+        if not key:
+            print("未能获取微信数据库密钥")
+            return results
+    
+    for archive in archives:
+        results.extend(decrypt_archive(archive, output_dir, key, decrypt_qq))
+    
+    success_count = sum(1 for r in results if r['success'])
+    print(f"\n压缩包处理完成！成功: {success_count}/{len(results)}")
+    return results
+
 def analyze_decrypted_results(results, is_qq=False):
     """分析解密后的数据库"""
     print("\n开始分析解密后的数据库...")
@@ -222,6 +328,40 @@ def analyze_decrypted_results(results, is_qq=False):
             except Exception as e:
                 print(f"分析数据库时出错: {e}")
 
+def aggregate_targets(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """从解密结果中选出参与汇总分析的数据库：QQ数据库、微信主数据库和消息数据库"""
+    databases = []
+    for result in results:
+        if not result['success']:
+            continue
+        original = result['original']
+        if 'username' in original:
+            if not (original.get('is_main_db', False) or 'msg' in original['db_name'].lower()):
+                continue
+            databases.append({'path': result['decrypted_path'], 'account': original['username'],
+                              'is_qq': False})
+        else:
+            databases.append({'path': result['decrypted_path'], 'account': original.get('qqid'),
+                              'is_qq': True})
+    return databases
+
+def run_aggregate_analysis(databases: List[Dict[str, Any]], output_dir: str) -> bool:
+    """对多个数据库生成汇总报告，报告保存在output_dir/analysis中"""
+    if not HAS_ANALYSIS:
+        print("错误: 数据分析功能不可用，请安装必要的依赖")
+        return False
+    
+    if not databases:
+        print("没有可汇总分析的数据库")
+        return False
+    
+    try:
+        report_path = generate_aggregate_report(databases, os.path.join(output_dir, 'analysis'))
+    except Exception as e:
+        print(f"汇总分析时出错: {e}")
+        return False
+    return report_path is not None
+
 def analyze_single_database(db_path, is_qq=False):
     """分析指定的单个数据库"""
     if not HAS_ANALYSIS:
@@ -244,6 +384,28 @@ def analyze_single_database(db_path, is_qq=False):
         print(f"分析数据库时出错: {e}")
         return False
 
+def create_backend(args):
+    """根据命令行参数创建数据库发现后端，未指定镜像时返回None（使用当前系统）"""
+    if not args.image_root:
+        return None
+    
+    registry = load_registry_file(args.registry_file) if args.registry_file else None
+    drive_map = dict(args.image_drive)
+    print(f"在挂载的镜像中查找数据库: {args.image_root}")
+    for drive, mount in drive_map.items():
+        print(f"  {drive} -> {mount}")
+    return MountedImageBackend(args.image_root, registry, drive_map)
+
+def parse_image_drive(value: str) -> Tuple[str, str]:
+    """解析--image-drive参数，如"D:=/mnt/d"，返回(盘符, 挂载目录)"""
+    drive, sep, mount = value.partition('=')
+    drive = drive.strip().upper().rstrip('\\/')
+    if not drive.endswith(':'):
+        drive += ':'
+    if not sep or len(drive) != 2 or not drive[0].isalpha() or not mount.strip():
+        raise argparse.ArgumentTypeError(f"格式应为 盘符=挂载目录，如 D:=/mnt/d: {value}")
+    return drive, mount.strip()
+
 def parse_drives(drives_str: str) -> List[str]:
     """解析驱动器字符串，返回驱动器列表"""
     if not drives_str:
@@ -320,9 +482,28 @@ def run_cli():
     # 检查依赖
     check_dependencies()
     
+    if getattr(args, 'timezone', None):
+        from wxdecrypt.utils.time_utils import set_default_timezone
+        set_default_timezone(args.timezone)
+    
+    if getattr(args, 'chart_dpi', None):
+        from wxdecrypt.chart_render import set_default_dpi, parse_dpi
+        if parse_dpi(args.chart_dpi) is None:
+            print(f"错误: 无效的图表分辨率: {args.chart_dpi}")
+            return
+        set_default_dpi(args.chart_dpi)
+    
+    if getattr(args, 'report_mode', None):
+        from wxdecrypt.interactive_report import set_default_report_mode
+        set_default_report_mode(args.report_mode)
+    
     # 如果指定了只分析模式
     if HAS_ANALYSIS and hasattr(args, 'analyze_only') and args.analyze_only:
         db_path = args.analyze_only
+        if args.aggregate and os.path.isdir(db_path):
+            if run_aggregate_analysis(find_message_databases(db_path), db_path):
+                print("\n分析完成!")
+            return
         is_qq = args.qq or ('qq' in db_path.lower() or 'msg3.0' in db_path.lower())
         if analyze_single_database(db_path, is_qq):
             print("\n分析完成!")
@@ -339,26 +520,61 @@ def run_cli():
             decrypt_all_databases(output_dir, args.analyze, False, None, True, not args.basic)
         return
     
+    # 所有解密共用一个密钥服务，微信密钥最多只从进程中获取一次
+    key_broker = KeyBroker(None if args.no_key_cache else KeyCache())
+    
+    # 处理压缩包中的数据库
+    if args.archive:
+        if args.both:
+            process_archives(args.archive, args.output, False, args.list, args.key, not args.basic,
+                             key_broker)
+            process_archives(args.archive, args.output, True, args.list, args.key, not args.basic,
+                             key_broker)
+        else:
+            process_archives(args.archive, args.output, args.qq, args.list, args.key, not args.basic,
+                             key_broker)
+        return
+    
+    backend = create_backend(args)
+    
     if args.list:
         if args.qq:
-            list_databases(True, args.drives, args.full_scan)
+            list_databases(True, args.drives, args.full_scan, args.first_account, backend)
         elif args.both:
-            list_databases(False, args.drives, args.full_scan)
-            list_databases(True, args.drives, args.full_scan)
+            list_databases(False, args.drives, args.full_scan, args.first_account, backend)
+            list_databases(True, args.drives, args.full_scan, args.first_account, backend)
         else:
-            list_databases(False, args.drives, args.full_scan)
+            list_databases(False, args.drives, args.full_scan, args.first_account, backend)
         return
     
-    # 分析功能标志
-    analyze = HAS_ANALYSIS and args.analyze
+    # 分析功能标志，汇总分析时在所有数据库解密完成后统一分析
+    aggregate = HAS_ANALYSIS and args.aggregate
+    analyze = HAS_ANALYSIS and args.analyze and not aggregate
+    
+    # 监视模式
+    watcher = None
+    if args.watch:
+        from wxdecrypt.watch import DatabaseWatcher
+        watcher = DatabaseWatcher(args.output, args.debounce, args.watch_interval)
     
+    results = []
     if args.qq:
-        decrypt_all_databases(args.output, analyze, True, args.drives, args.test, not args.basic)
+        results += decrypt_all_databases(args.output, analyze, True, args.drives, args.test, not args.basic,
+                                         args.first_account, backend, watcher, key_broker)
     elif args.both:
-        decrypt_all_databases(args.output, analyze, False, args.drives, args.test, not args.basic)
-        decrypt_all_databases(args.output, analyze, True, args.drives, args.test, not args.basic)
+        results += decrypt_all_databases(args.output, analyze, False, args.drives, args.test, not args.basic,
+                                         args.first_account, backend, watcher, key_broker)
+        results += decrypt_all_databases(args.output, analyze, True, args.drives, args.test, not args.basic,
+                                         args.first_account, backend, watcher, key_broker)
     else:
-        decrypt_all_databases(args.output, analyze, False, args.drives, args.test, not args.basic)
+        results += decrypt_all_databases(args.output, analyze, False, args.drives, args.test, not args.basic,
+                                         args.first_account, backend, watcher, key_broker)
+    
+    if aggregate:
+        run_aggregate_analysis(aggregate_targets(results), args.output)
+    
+    if watcher is not None:
+        watcher.run()
 
 def main():
     """主函数，默认启动GUI界面，如果指定了命令行参数则使用命令行界面"""
@@ -368,6 +584,11 @@ def main():
     # 检查命令行参数
     args = sys.argv[1:]
     
+    # search子命令有自己的参数
+    if args and args[0] == 'search':
+        from wxdecrypt.search import run_search_cli
+        sys.exit(run_search_cli(args[1:]))
+    
     # 如果指定了--cli或其他命令行参数，则使用命令行界面
     if '--cli' in args or len(args) > 0:
         run_cli()
@@ -376,6 +597,7 @@ def main():
     # 否则启动GUI界面
     if HAS_GUI:
         try:
+            from wxdecrypt.gui import start_gui
             start_gui()
         except Exception as e:
             print(f"启动GUI界面时出错: {e}")
@@ -386,4 +608,5 @@ def main():
         run_cli()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+消息列缓存
+把分析用到的消息列（rowid、时间、类型、是否发送、会话和消息内容）保存在分析目录的.cache下
+以数据库文件名命名的目录中，
+数值列为NumPy内存映射文件，消息内容为UTF-8拼接的二进制文件加偏移数组。
+缓存包含全部类型的消息，供按类型统计；只有文本消息保存内容，分词时按类型和内容筛选。
+再次分析同一个数据库时直接映射这些文件，不需要重新检测表结构、查询和转换。
+数据库大小、修改时间或表结构变化时缓存失效，由调用方重新生成或追加新消息
+"""
+import os
+import json
+import hashlib
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
+
+import numpy as np
+
+from wxdecrypt.utils.time_utils import BUCKET_SECONDS
+
+CACHE_DIR_NAME = '.cache'
+MANIFEST_FILE = 'manifest.json'
+CONTENT_FILE = 'content.bin'
+
+# 缓存格式变化时递增，旧缓存会被重新生成
+CACHE_VERSION = 2
+
+# 从数据库读取的列，顺序与iter_message_chunks的columns参数一致
+SOURCE_COLUMNS = ('rowid', 'timestamp', 'type', 'is_sender', 'talker', 'content')
+
+# 数值列及其类型；talker保存为会话列表中的序号，content_offsets比消息数多一项
+NUMERIC_COLUMNS = {
+    'rowid': np.int64,
+    'timestamp': np.int64,
+    'type': np.int32,
+    'is_sender': np.int8,
+    'talker': np.int32,
+    'content_offsets': np.int64,
+}
+
+# 按批统计分组计数时每批的行数
+BUCKET_CHUNK_SIZE = 1000000
+
+def schema_fingerprint(schema: Dict[str, Any]) -> str:
+    """表结构的指纹，结构或缓存格式变化时不同"""
+    text = json.dumps({'version': CACHE_VERSION, 'schema': schema}, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _text_type_mask(schema: Dict[str, Any], types: np.ndarray) -> np.ndarray:
+    """消息类型是否为需要分词的文本类型，表结构不区分类型时全部为True"""
+    if schema.get('text_type') is not None and schema.get('type'):
+        return types == schema['text_type']
+    return np.ones(len(types), dtype=bool)
+
+def db_signature(db_path: str) -> Dict[str, Any]:
+    """数据库文件的路径、大小和修改时间"""
+    stat = os.stat(db_path)
+    return {'db_path': os.path.abspath(db_path), 'db_size': stat.st_size, 'db_mtime_ns': stat.st_mtime_ns}
+
+class MessageColumns:
+    """内存映射的消息列，rowid按升序排列"""
+
+    def __init__(self, cache_dir: str, manifest: Dict[str, Any]):
+        self.cache_dir = cache_dir
+        self.manifest = manifest
+        self.count = manifest['count']
+        self.schema = manifest['schema']
+        self.talkers = manifest['talkers']
+        self._arrays = {}
+
+    @classmethod
+    def load(cls, cache_dir: str) -> Optional['MessageColumns']:
+        """读取缓存目录，不存在、版本不同或已损坏时返回None"""
+        try:
+            with open(os.path.join(cache_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('version') != CACHE_VERSION:
+            return None
+        return cls(cache_dir, manifest)
+
+    def matches(self, db_path: str, is_qq: bool) -> bool:
+        """数据库文件自生成缓存后没有变化"""
+        try:
+            signature = db_signature(db_path)
+        except OSError:
+            return False
+        return (self.manifest.get('is_qq') == is_qq
+                and all(self.manifest.get(name) == value for name, value in signature.items()))
+
+    @property
+    def max_rowid(self) -> int:
+        """生成缓存时表中的最大rowid（包括不参与分析的消息）"""
+        return self.manifest['max_rowid']
+
+    def array(self, name: str) -> np.ndarray:
+        """以内存映射方式打开一列"""
+        if name not in self._arrays:
+            length = self.count + 1 if name == 'content_offsets' else self.count
+            if length == 0:
+                self._arrays[name] = np.zeros(0, dtype=NUMERIC_COLUMNS[name])
+            else:
+                self._arrays[name] = np.memmap(os.path.join(self.cache_dir, f'{name}.bin'),
+                                               dtype=NUMERIC_COLUMNS[name], mode='r', shape=(length,))
+        return self._arrays[name]
+
+    def _content_blob(self) -> np.ndarray:
+        if 'content' not in self._arrays:
+            size = int(self.array('content_offsets')[-1]) if self.count else 0
+            path = os.path.join(self.cache_dir, CONTENT_FILE)
+            self._arrays['content'] = (np.memmap(path, dtype=np.uint8, mode='r', shape=(size,))
+                                       if size else np.zeros(0, dtype=np.uint8))
+        return self._arrays['content']
+
+    def texts(self, start: int, stop: int) -> np.ndarray:
+        """解码第start到stop条消息的内容"""
+        offsets = self.array('content_offsets')[start:stop + 1]
+        if len(offsets) < 2:
+            return np.zeros(0, dtype=object)
+        blob = self._content_blob()[offsets[0]:offsets[-1]].tobytes()
+        relative = (offsets - offsets[0]).tolist()
+        return np.array([blob[relative[i]:relative[i + 1]].decode('utf-8', errors='surrogatepass')
+                         for i in range(len(relative) - 1)], dtype=object)
+
+    def row_slice(self, rowid_range: Optional[Tuple[int, int]] = None) -> slice:
+        """rowid在(after, upto]范围内的消息所在的位置"""
+        if rowid_range is None:
+            return slice(0, self.count)
+        rowids = self.array('rowid')
+        after, upto = rowid_range
+        return slice(int(np.searchsorted(rowids, after, side='right')),
+                     int(np.searchsorted(rowids, upto, side='right')))
+
+    def iter_chunks(self, columns: Tuple[str, ...], chunk_size: int,
+                    rowid_range: Optional[Tuple[int, int]] = None,
+                    text_only: bool = True) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        按批返回消息列，格式与data_analysis.iter_message_chunks相同
+
+        text_only为True时只返回有内容的文本消息（与message_schema.message_query的筛选条件相同）
+        """
+        rows = self.row_slice(rowid_range)
+        talkers = np.array(self.talkers + [None], dtype=object)  # 序号-1对应None
+        for start in range(rows.start, rows.stop, chunk_size):
+            stop = min(start + chunk_size, rows.stop)
+            keep = slice(None)
+            if text_only:
+                keep = np.diff(self.array('content_offsets')[start:stop + 1]) > 0
+                keep &= _text_type_mask(self.schema, np.asarray(self.array('type')[start:stop]))
+                if not keep.any():
+                    continue
+            chunk = {}
+            for name in columns:
+                if name == 'content':
+                    chunk[name] = self.texts(start, stop)[keep]
+                elif name == 'talker':
+                    chunk[name] = talkers[np.asarray(self.array('talker')[start:stop])][keep]
+                else:
+                    chunk[name] = np.asarray(self.array(name)[start:stop])[keep]
+            yield chunk
+
+    def bucket_counts(self, rowid_range: Optional[Tuple[int, int]] = None) -> List[Tuple[Any, ...]]:
+        """按时间桶、类型和发送方分组计数，格式与data_analysis.query_bucket_counts相同"""
+        rows = self.row_slice(rowid_range)
+        counts = Counter()
+        for start in range(rows.start, rows.stop, BUCKET_CHUNK_SIZE):
+            stop = min(start + BUCKET_CHUNK_SIZE, rows.stop)
+            keys = np.stack([
+                np.asarray(self.array('timestamp')[start:stop]) // BUCKET_SECONDS,
+                self.array('type')[start:stop].astype(np.int64),
+                self.array('is_sender')[start:stop].astype(np.int64),
+            ], axis=1)
+            unique_keys, key_counts = np.unique(keys, axis=0, return_counts=True)
+            for (bucket, msg_type, is_sender), count in zip(unique_keys.tolist(), key_counts.tolist()):
+                counts[(bucket, None if msg_type < 0 else msg_type,
+                        None if is_sender < 0 else is_sender)] += count
+        return [key + (count,) for key, count in counts.items()]
+
+    def close(self) -> None:
+        """释放内存映射，Windows上映射中的文件不能被覆盖"""
+        self._arrays.clear()
+
+def write_message_columns(cache_dir: str, manifest: Dict[str, Any],
+                          chunks: Iterable[Dict[str, np.ndarray]],
+                          append_to: Optional[MessageColumns] = None) -> MessageColumns:
+    """
+    把按rowid升序读取的消息写入缓存
+
+    Args:
+        cache_dir: 缓存目录
+        manifest: 数据库签名、is_qq、表结构和max_rowid（读取时表中的最大rowid）等信息，写入清单文件
+        chunks: iter_message_chunks按SOURCE_COLUMNS读取的消息
+        append_to: 不为None时把消息追加到该缓存之后，否则重新生成
+
+    Returns:
+        MessageColumns: 写入后的缓存
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    if append_to is not None:
+        count = append_to.count
+        talkers = list(append_to.talkers)
+        content_size = int(append_to.array('content_offsets')[-1])
+        append_to.close()
+        mode = 'r+b'
+    else:
+        # 先删除清单，写到一半中断时缓存整体失效
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        count, talkers, content_size = 0, [], 0
+        mode = 'wb'
+
+    talker_index = {talker: i for i, talker in enumerate(talkers)}
+    names = [name for name in NUMERIC_COLUMNS] + ['content']
+    files = {}
+    try:
+        for name in names:
+            path = os.path.join(cache_dir, CONTENT_FILE if name == 'content' else f'{name}.bin')
+            files[name] = open(path, mode if os.path.exists(path) else 'wb')
+            # 追加时从清单记录的位置写起，忽略上次中断时写入的多余数据
+            if name == 'content':
+                files[name].seek(content_size)
+            elif append_to is not None:
+                length = count + 1 if name == 'content_offsets' else count
+                files[name].seek(length * np.dtype(NUMERIC_COLUMNS[name]).itemsize)
+        if append_to is None:
+            files['content_offsets'].write(np.zeros(1, dtype=np.int64).tobytes())
+
+        for chunk in chunks:
+            n = len(chunk['rowid'])
+            if not n:
+                continue
+            for name in ('rowid', 'timestamp', 'type', 'is_sender'):
+                files[name].write(chunk[name].astype(NUMERIC_COLUMNS[name]).tobytes())
+            codes = np.empty(n, dtype=np.int32)
+            for i, talker in enumerate(chunk['talker'].tolist()):
+                if talker is None:
+                    codes[i] = -1
+                    continue
+                if not isinstance(talker, (str, int)):
+                    talker = str(talker)  # 清单为JSON格式
+                code = talker_index.get(talker)
+                if code is None:
+                    code = talker_index[talker] = len(talkers)
+                    talkers.append(talker)
+                codes[i] = code
+            files['talker'].write(codes.tobytes())
+
+            # 非文本消息（图片、链接等的XML）不参与分词，不保存内容
+            is_text = _text_type_mask(manifest['schema'], chunk['type']).tolist()
+            encoded = [text.encode('utf-8', errors='surrogatepass') if text_row and isinstance(text, str) else b''
+                       for text, text_row in zip(chunk['content'].tolist(), is_text)]
+            lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=n)
+            files['content_offsets'].write((content_size + np.cumsum(lengths)).tobytes())
+            files['content'].write(b''.join(encoded))
+            content_size += int(lengths.sum())
+            count += n
+    finally:
+        for f in files.values():
+            f.close()
+
+    manifest = dict(manifest, version=CACHE_VERSION, count=count, talkers=talkers)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return MessageColumns(cache_dir, manifest)
@@ -0,0 +1,186 @@
+"""
+消息表结构
+识别微信和QQ数据库中的消息表及各字段对应的列，并构造读取消息的SQL。
+只依赖sqlite3，读取消息的接口见message_store.MessageStore
+"""
+import sqlite3
+from typing import List, Dict, Any, Optional, Tuple
+
+from wxdecrypt.utils.time_utils import sql_epoch_seconds
+
+# 微信文本消息的类型值
+WECHAT_TEXT_TYPE = 1
+
+# 微信消息表中表示会话的列，按优先顺序排列
+WECHAT_TALKER_COLUMNS = ('StrTalker', 'Talker', 'TalkerId')
+
+# 微信消息表中保存消息内容的列：旧版Message表为Content，PC版MSG表为StrContent
+WECHAT_CONTENT_COLUMNS = ('Content', 'StrContent')
+
+# 微信消息表中的服务器消息ID，与客户端全文索引中的msgId对应
+WECHAT_MSG_ID_COLUMNS = ('MsgSvrID', 'msgSvrId')
+
+# QQ NT的消息表（nt_msg.db）和各字段对应的列，列名为数字编号
+QQ_NT_TABLES = ('c2c_msg_table', 'group_msg_table')
+QQ_NT_COLUMNS = {
+    'msg_id': '40001',
+    'time': '40050',
+    'type': '40011',
+    'talker': '40027',
+    'sender': '40033',
+    'content': '40800',
+}
+
+def detect_message_schemas(cursor: sqlite3.Cursor, is_qq: bool = False,
+                           verbose: bool = True) -> List[Dict[str, Any]]:
+    """
+    检测数据库中的全部消息表
+    
+    Args:
+        cursor: 数据库游标
+        is_qq: 是否为QQ数据库
+        verbose: 是否输出检测过程
+        
+    Returns:
+        List[Dict]: 每个消息表的表名和各字段对应的列名（table、time、content、type、is_sender、talker、
+        sender、msg_id，没有的字段为None），text_type为需要筛选的文本消息类型（None表示不筛选），
+        has_rowid表示能否按rowid增量分析；QQ NT的私聊和群聊各为一项
+    """
+    tables = [t[0] for t in cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+    if verbose:
+        print(f"数据库中的表: {', '.join(tables)}")
+    tables_by_lower = {t.lower(): t for t in tables}
+    schemas = []
+    
+    def columns_of(table):
+        return [col[1] for col in cursor.execute(f'PRAGMA table_info("{table}");')]
+    
+    def add(schema):
+        schema['has_rowid'] = table_has_rowid(cursor, schema['table'])
+        schemas.append(schema)
+    
+    # 微信数据库通常有Message表，PC版为MSG表
+    for name in ('message',) if is_qq else ('message', 'msg'):
+        if name not in tables_by_lower:
+            continue
+        table = tables_by_lower[name]
+        column_names = columns_of(table)
+        content_col = next((col for col in WECHAT_CONTENT_COLUMNS if col in column_names), None)
+        
+        # 典型的微信消息表结构
+        if 'CreateTime' in column_names and content_col:
+            if verbose:
+                print(f"检测到微信消息表: {table}")
+            add({
+                'table': table,
+                'time': 'CreateTime',
+                'content': content_col,
+                'type': 'Type' if 'Type' in column_names else None,
+                'is_sender': 'IsSender' if 'IsSender' in column_names else None,
+                'talker': next((col for col in WECHAT_TALKER_COLUMNS if col in column_names), None),
+                'sender': None,  # 群聊发送者保存在BytesExtra中
+                'msg_id': next((col for col in WECHAT_MSG_ID_COLUMNS if col in column_names), None),
+                'text_type': WECHAT_TEXT_TYPE,  # 只处理文本消息
+            })
+    
+    # QQ数据库表结构不同，需要适配
+    if 'msg' in tables_by_lower and is_qq:
+        table = tables_by_lower['msg']
+        column_names = columns_of(table)
+        
+        # 尝试识别QQ消息表结构（可能需要根据实际数据库调整）
+        time_col = next((col for col in column_names if 'time' in col.lower()), None)
+        content_col = next((col for col in column_names if 'content' in col.lower() or 'msg' in col.lower()), None)
+        
+        if time_col and content_col:
+            if verbose:
+                print("检测到QQ消息表")
+            add({
+                'table': table,
+                'time': time_col,
+                'content': content_col,
+                'type': None,
+                'is_sender': None,  # QQ数据可能无法确定
+                'talker': None,
+                'sender': None,
+                'msg_id': None,
+                'text_type': None,
+            })
+    
+    # QQ NT的消息内容是protobuf编码的二进制数据，只能统计数量和时间
+    for name in QQ_NT_TABLES:
+        if name not in tables_by_lower:
+            continue
+        table = tables_by_lower[name]
+        column_names = columns_of(table)
+        if QQ_NT_COLUMNS['time'] in column_names and QQ_NT_COLUMNS['content'] in column_names:
+            if verbose:
+                print(f"检测到QQ NT消息表: {table}")
+            schema = {'table': table, 'is_sender': None, 'text_type': None}
+            for key, col in QQ_NT_COLUMNS.items():
+                schema[key] = col if col in column_names else None
+            add(schema)
+    
+    return schemas
+
+def detect_message_schema(cursor: sqlite3.Cursor, is_qq: bool = False,
+                          verbose: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    检测消息表结构，有多个消息表时返回第一个
+    
+    Returns:
+        Dict: 见detect_message_schemas；未识别时返回None
+    """
+    schemas = detect_message_schemas(cursor, is_qq, verbose)
+    return schemas[0] if schemas else None
+
+def table_has_rowid(cursor: sqlite3.Cursor, table: str) -> bool:
+    """检查表是否有rowid（WITHOUT ROWID表没有）"""
+    try:
+        cursor.execute(f'SELECT rowid FROM "{table}" LIMIT 1').fetchall()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def message_query(schema: Dict[str, Any], select: str,
+                   rowid_range: Optional[Tuple[int, int]] = None,
+                   talker: Any = None, text_only: bool = True) -> Tuple[str, List[Any]]:
+    """
+    构造读取消息的SQL，筛选条件与select中的列无关
+    
+    rowid_range为(after, upto)时只选择after < rowid <= upto的消息，talker不为None时只选择该会话的消息；
+    text_only为False时不筛选文本类型和空内容，用于按类型统计全部消息
+    """
+    conditions = []
+    params = []
+    if text_only:
+        content = schema['content']
+        conditions += [f'"{content}" IS NOT NULL', f'"{content}" != \'\'']
+        if schema['text_type'] is not None and schema['type']:
+            conditions.append(f'"{schema["type"]}" = ?')
+            params.append(schema['text_type'])
+    if rowid_range is not None:
+        conditions.append('rowid > ? AND rowid <= ?')
+        params.extend(rowid_range)
+    if talker is not None:
+        conditions.append(f'"{schema["talker"]}" = ?')
+        params.append(talker)
+    return f'SELECT {select} FROM "{schema["table"]}" WHERE {" AND ".join(conditions) or "1"}', params
+
+def column_expr(schema: Dict[str, Any], name: str) -> str:
+    """返回消息字段对应的SQL表达式，表中没有该字段时为NULL"""
+    if name == 'timestamp':
+        return sql_epoch_seconds(schema['time'])
+    if name == 'rowid':
+        return 'rowid'
+    column = schema.get(name)
+    return f'"{column}"' if column else 'NULL'
+
+def talker_names(conn: sqlite3.Connection, schema: Dict[str, Any]) -> Dict[Any, str]:
+    """新版微信的TalkerId是Name2ID表的rowid，返回其到用户名的映射；会话列本身就是用户名时返回空字典"""
+    if schema['talker'] != 'TalkerId':
+        return {}
+    try:
+        return dict(conn.execute('SELECT rowid, UsrName FROM Name2ID'))
+    except sqlite3.Error:
+        return {}
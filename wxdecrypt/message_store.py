@@ -0,0 +1,353 @@
+"""
+消息读取接口
+MessageStore在message_schema识别出的表结构之上提供统一的读取方法，调用方不需要关心微信、QQ和QQ NT的表名与列名。
+按时间遍历消息时使用键集分页：每页按(时间, rowid)排序，下一页从上一页最后一条消息之后继续，
+不使用OFFSET，翻到多深都只读取一页的数据。按时间范围、会话和发送者筛选时所需的索引在第一次使用时建立。
+消息以MessageRecord返回，只有固定的几个属性（__slots__），比字典占用更少的内存
+"""
+import sqlite3
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable
+
+from wxdecrypt.message_schema import detect_message_schemas, message_query, column_expr, talker_names
+from wxdecrypt.utils.time_utils import BUCKET_SECONDS, MILLISECOND_THRESHOLD, utc_offset_seconds
+
+# 键集分页默认的每页消息数
+MESSAGE_PAGE_SIZE = 1000
+
+# 可以按需建立索引的字段，索引为(字段, 时间)；time为单独的时间索引
+INDEXED_FIELDS = ('time', 'talker', 'sender')
+
+# SQLite默认最多999个参数，按ID批量查询时每批的数量
+ID_BATCH_SIZE = 900
+
+class MessageRecord:
+    """一条消息，time为秒级时间戳，talker为会话的用户名或QQ号，没有的字段为None"""
+
+    __slots__ = ('rowid', 'time', 'talker', 'sender', 'type', 'is_sender', 'content')
+
+    def __init__(self, rowid: int, time: Optional[int], talker: Any, sender: Any, type: Optional[int],
+                 is_sender: Optional[int], content: Any):
+        self.rowid = rowid
+        self.time = time
+        self.talker = talker
+        self.sender = sender
+        self.type = type
+        self.is_sender = is_sender
+        self.content = content
+
+    def __repr__(self) -> str:
+        return (f"MessageRecord(rowid={self.rowid}, time={self.time}, talker={self.talker!r}, "
+                f"type={self.type}, content={self.content!r:.40})")
+
+# MessageRecord各属性对应的表结构字段，按构造参数的顺序排列
+_RECORD_FIELDS = ('talker', 'sender', 'type', 'is_sender', 'content')
+
+class MessageStore:
+    """一个消息表的读取接口，可以作为上下文管理器使用，退出时关闭数据库连接"""
+
+    def __init__(self, db_path: str, is_qq: bool = False, schema: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            is_qq: 是否为QQ数据库
+            schema: 消息表结构，为None时检测数据库中的第一个消息表；没有消息表时schema为None
+        """
+        self.db_path = db_path
+        self.is_qq = is_qq
+        self._conn = None
+        self._names = None
+        self._ids = None
+        self._time_scale = None
+        self._indexes = {}
+        if schema is None:
+            schemas = detect_message_schemas(self.connection.cursor(), is_qq, verbose=False)
+            schema = schemas[0] if schemas else None
+        self.schema = schema
+
+    @classmethod
+    def open_all(cls, db_path: str, is_qq: bool = False) -> List['MessageStore']:
+        """数据库中每个消息表的MessageStore，如QQ NT的私聊和群聊"""
+        conn = sqlite3.connect(db_path)
+        try:
+            schemas = detect_message_schemas(conn.cursor(), is_qq, verbose=False)
+        finally:
+            conn.close()
+        return [cls(db_path, is_qq, schema) for schema in schemas]
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> 'MessageStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _column(self, field: str) -> str:
+        column = self.schema.get(field)
+        if not column:
+            raise ValueError(f"消息表 {self.schema['table']} 中没有{field}字段")
+        return f'"{column}"'
+
+    @property
+    def time_scale(self) -> int:
+        """时间列的单位：秒为1，毫秒为1000，按最新一条消息判断"""
+        if self._time_scale is None:
+            latest = self.connection.execute(
+                f'SELECT MAX({self._column("time")}) FROM "{self.schema["table"]}"').fetchone()[0]
+            self._time_scale = 1000 if isinstance(latest, (int, float)) and latest > MILLISECOND_THRESHOLD else 1
+        return self._time_scale
+
+    def talker_names(self) -> Dict[Any, str]:
+        """会话列的值到用户名的映射，见message_schema.talker_names"""
+        if self._names is None:
+            self._names = talker_names(self.connection, self.schema)
+        return self._names
+
+    def _talker_value(self, talker: Any) -> Any:
+        """把用户名换算为会话列中的值，新版微信的会话列为Name2ID的rowid"""
+        if self._ids is None:
+            self._ids = {name: value for value, name in self.talker_names().items()}
+        return self._ids.get(talker, talker)
+
+    def _index_name(self, field: str) -> str:
+        if field == 'time':
+            return f'wxdecrypt_{self.schema["table"]}_{self.schema["time"]}'
+        return f'wxdecrypt_{self.schema["table"]}_{self.schema[field]}_time'
+
+    def _has_index(self, columns: List[str]) -> bool:
+        """是否已有以这些列开头的索引（包括客户端自己建立的索引）"""
+        conn = self.connection
+        for index in conn.execute(f'PRAGMA index_list("{self.schema["table"]}")').fetchall():
+            indexed = [row[2] for row in conn.execute(f'PRAGMA index_info("{index[1]}")')]
+            if indexed[:len(columns)] == columns:
+                return True
+        return False
+
+    def ensure_index(self, field: str) -> bool:
+        """
+        按需建立(字段, 时间)索引，按会话或发送者筛选并按时间排序时不需要扫描和排序全表
+
+        已有以这些列开头的索引时不会写入数据库，数据库文件保持不变（消息列缓存按文件大小和修改时间校验）
+
+        Args:
+            field: 见INDEXED_FIELDS
+
+        Returns:
+            bool: 索引是否可用，表中没有该字段或数据库只读时为False
+        """
+        if field in self._indexes:
+            return self._indexes[field]
+        if not self.schema.get(field):
+            self._indexes[field] = False
+            return False
+        columns = [self.schema['time']] if field == 'time' else [self.schema[field], self.schema['time']]
+        try:
+            available = self._has_index(columns)
+            if not available:
+                print(f"正在为{field}字段建立索引...")
+                column_list = ', '.join(f'"{col}"' for col in columns)
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{self._index_name(field)}" '
+                                        f'ON "{self.schema["table"]}"({column_list})')
+                self.connection.commit()
+                available = True
+        except sqlite3.Error as e:
+            print(f"建立索引失败: {e}")
+            available = False
+        self._indexes[field] = available
+        return available
+
+    def _filters(self, start: Optional[int], end: Optional[int], talker: Any, sender: Any,
+                 types: Optional[Iterable[int]], text_only: bool) -> Tuple[List[str], List[Any]]:
+        """筛选条件，时间按时间列的原始单位比较，可以使用时间索引"""
+        conditions, params = [], []
+        if text_only:
+            content = self._column('content')
+            conditions += [f'{content} IS NOT NULL', f'{content} != \'\'']
+            if self.schema['text_type'] is not None and self.schema.get('type'):
+                conditions.append(f'{self._column("type")} = ?')
+                params.append(self.schema['text_type'])
+        if start is not None:
+            conditions.append(f'{self._column("time")} >= ?')
+            params.append(start * self.time_scale)
+        if end is not None:
+            # 毫秒时间戳包含结束这一秒内的全部消息
+            conditions.append(f'{self._column("time")} <= ?')
+            params.append(end * self.time_scale + self.time_scale - 1)
+        if talker is not None:
+            self.ensure_index('talker')
+            conditions.append(f'{self._column("talker")} = ?')
+            params.append(self._talker_value(talker))
+        if sender is not None:
+            self.ensure_index('sender')
+            conditions.append(f'{self._column("sender")} = ?')
+            params.append(sender)
+        if types is not None:
+            types = list(types)
+            conditions.append(f'{self._column("type")} IN ({", ".join("?" * len(types))})')
+            params.extend(types)
+        return conditions, params
+
+    def _select_records(self) -> str:
+        return ', '.join(['rowid', f'"{self.schema["time"]}"'] + [
+            f'"{self.schema[field]}"' if self.schema.get(field) else 'NULL' for field in _RECORD_FIELDS])
+
+    def _to_record(self, row: Tuple[Any, ...]) -> MessageRecord:
+        rowid, time, talker, *rest = row
+        if isinstance(time, (int, float)):
+            time = int(time) // self.time_scale
+        if talker is not None:
+            talker = self.talker_names().get(talker, talker)
+        return MessageRecord(rowid, time, talker, *rest)
+
+    def page(self, limit: int = MESSAGE_PAGE_SIZE, after: Optional[Tuple[Any, int]] = None,
+             descending: bool = False, start: Optional[int] = None, end: Optional[int] = None,
+             talker: Any = None, sender: Any = None, types: Optional[Iterable[int]] = None,
+             text_only: bool = False) -> Tuple[List[MessageRecord], Optional[Tuple[Any, int]]]:
+        """
+        按(时间, rowid)排序读取一页消息
+
+        Args:
+            limit: 每页的消息数
+            after: 上一页返回的next_key，为None时从头开始
+            descending: 是否按时间从新到旧排列
+            start: 最早时间（秒级时间戳，含）
+            end: 最晚时间（秒级时间戳，含）
+            talker: 只读取该会话（用户名、群ID或QQ号）
+            sender: 只读取该发送者的消息
+            types: 只读取这些类型的消息
+            text_only: 是否只读取有内容的文本消息（与分析时的范围相同）
+
+        Returns:
+            (消息列表, next_key)：next_key传给下一次调用的after，没有更多消息时为None
+        """
+        if talker is None and sender is None:
+            self.ensure_index('time')
+        conditions, params = self._filters(start, end, talker, sender, types, text_only)
+        time_col = self._column('time')
+        if after is not None:
+            conditions.append(f'({time_col}, rowid) {"<" if descending else ">"} (?, ?)')
+            params.extend(after)
+        order = 'DESC' if descending else 'ASC'
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        rows = self.connection.execute(
+            f'SELECT {self._select_records()} FROM "{self.schema["table"]}"{where} '
+            f'ORDER BY {time_col} {order}, rowid {order} LIMIT ?', params + [limit]).fetchall()
+        next_key = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return [self._to_record(row) for row in rows], next_key
+
+    def iter_messages(self, page_size: int = MESSAGE_PAGE_SIZE, after: Optional[Tuple[Any, int]] = None,
+                      descending: bool = False, **filters) -> Iterator[MessageRecord]:
+        """按页遍历符合条件的全部消息，参数见page"""
+        while True:
+            records, after = self.page(page_size, after, descending, **filters)
+            yield from records
+            if after is None:
+                break
+
+    def get(self, rowids: List[int]) -> List[Optional[MessageRecord]]:
+        """按rowid读取消息，返回的顺序与rowids相同，不存在的为None"""
+        records = {}
+        for i in range(0, len(rowids), ID_BATCH_SIZE):
+            chunk = rowids[i:i + ID_BATCH_SIZE]
+            for row in self.connection.execute(
+                    f'SELECT {self._select_records()} FROM "{self.schema["table"]}" '
+                    f'WHERE rowid IN ({", ".join("?" * len(chunk))})', chunk):
+                records[row[0]] = self._to_record(row)
+        return [records.get(rowid) for rowid in rowids]
+
+    def find_by_msg_ids(self, msg_ids: List[Any]) -> Dict[Any, MessageRecord]:
+        """按服务器消息ID（微信MsgSvrID、QQ NT的40001列）查找消息，表中没有消息ID时返回空字典"""
+        if not self.schema.get('msg_id'):
+            return {}
+        found = {}
+        select = f'{self._column("msg_id")}, {self._select_records()}'
+        for i in range(0, len(msg_ids), ID_BATCH_SIZE):
+            chunk = msg_ids[i:i + ID_BATCH_SIZE]
+            for msg_id, *row in self.connection.execute(
+                    f'SELECT {select} FROM "{self.schema["table"]}" '
+                    f'WHERE {self._column("msg_id")} IN ({", ".join("?" * len(chunk))})', chunk):
+                found[msg_id] = self._to_record(row)
+        return found
+
+    def max_rowid(self) -> int:
+        """消息表的最大rowid，空表为0"""
+        return self.connection.execute(f'SELECT MAX(rowid) FROM "{self.schema["table"]}"').fetchone()[0] or 0
+
+    def count(self, rowid_range: Optional[Tuple[int, int]] = None, text_only: bool = True) -> int:
+        """
+        有内容的文本消息数，rowid_range为(after, upto)时只统计after < rowid <= upto的消息；
+        text_only为False时统计全部类型的消息
+        """
+        query, params = message_query(self.schema, 'COUNT(*)', rowid_range, text_only=text_only)
+        return self.connection.execute(query, params).fetchone()[0]
+
+    def iter_rows(self, columns: Tuple[str, ...], chunk_size: int,
+                  rowid_range: Optional[Tuple[int, int]] = None,
+                  order_by_rowid: bool = False, text_only: bool = True) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        按批读取有内容的文本消息的原始列值，用于分析和建立索引等需要读取大量消息的场合
+
+        Args:
+            columns: 字段名，见message_schema.column_expr；timestamp为秒级时间戳，talker为会话列的原始值
+            chunk_size: 每批的行数
+            rowid_range: (after, upto)，只读取after < rowid <= upto的消息；为None时读取全部
+            order_by_rowid: 是否按rowid升序返回
+            text_only: 为False时读取全部类型的消息
+
+        Yields:
+            List[Tuple]: 一批消息，每行的值与columns对应
+        """
+        query, params = message_query(self.schema, ', '.join(column_expr(self.schema, c) for c in columns),
+                                      rowid_range, text_only=text_only)
+        if order_by_rowid:
+            query += ' ORDER BY rowid'
+        cursor = self.connection.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+    def bucket_counts(self, rowid_range: Optional[Tuple[int, int]] = None) -> List[Tuple[Any, ...]]:
+        """
+        按时间桶、类型和发送方分组计数全部类型的消息，返回(时间桶, 类型, 是否发送, 消息数)，
+        时间桶为UTC时间戳除以BUCKET_SECONDS
+        """
+        select = (f"{column_expr(self.schema, 'timestamp')} / {BUCKET_SECONDS} AS bucket, "
+                  f"{column_expr(self.schema, 'type')} AS msg_type, "
+                  f"{column_expr(self.schema, 'is_sender')} AS is_sender, COUNT(*)")
+        query, params = message_query(self.schema, select, rowid_range, text_only=False)
+        return self.connection.execute(query + ' GROUP BY bucket, msg_type, is_sender', params).fetchall()
+
+    def iter_chat_stats(self, chunk_size: int, tz=None) -> Iterator[Tuple[Any, int, int, int, int, int]]:
+        """
+        按会话分组统计有内容的文本消息，逐行返回
+
+        活跃天数按时区当前的UTC偏移划分日期，夏令时切换前后的消息可能差一天
+
+        Yields:
+            (会话列的原始值, 消息数, 活跃天数, 最早时间戳, 最晚时间戳, 发送的消息数)
+        """
+        self.ensure_index('talker')
+        timestamp = column_expr(self.schema, 'timestamp')
+        is_sender = column_expr(self.schema, 'is_sender')
+        select = (f'{self._column("talker")}, COUNT(*), COUNT(DISTINCT ({timestamp} + ?) / 86400), '
+                  f'MIN({timestamp}), MAX({timestamp}), SUM({is_sender} = 1)')
+        query, params = message_query(self.schema, select)
+        cursor = self.connection.execute(f'{query} GROUP BY {self._column("talker")}',
+                                         [utc_offset_seconds(tz)] + params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for talker, count, active_days, first, last, sent in rows:
+                yield talker, count, active_days, first, last, sent or 0
@@ -31,6 +31,9 @@ except ImportError:
 
 from wxdecrypt.utils.memory_utils import get_wechat_key
 from wxdecrypt.wechat_path import get_wechat_db_path, get_qq_db_path
+from wxdecrypt.db_decrypt import schedule_largest_first, DecryptProgress
+from wxdecrypt.key_cache import KeyCache, get_db_key
+from wxdecrypt.key_broker import KeyBroker
 
 class RealWeChatDBDecrypt:
     """真实的微信数据库解密类，使用PyWxDump功能"""
@@ -43,6 +46,11 @@ class RealWeChatDBDecrypt:
         self.decrypt_qq = False  # 是否解密QQ数据库
         self.search_drives = None  # 要搜索的驱动器
         self.full_scan = False  # 是否进行全盘搜索
+        self.stop_at_first_account = False  # 全盘搜索时找到第一个完整账号即停止
+        self.backend = None  # 数据库发现后端，None表示使用当前系统
+        self.use_key_cache = True  # 是否使用按wxid保存的密钥缓存
+        self.account_keys = {}  # wxid -> 密钥
+        self.key_broker = None  # 共享的密钥服务，None时使用解密器自己的密钥服务
         
     def auto_find_and_decrypt(self, output_dir: str = "./output") -> List[Dict[str, Any]]:
         """
@@ -63,11 +71,11 @@ class RealWeChatDBDecrypt:
         # 查找数据库路径
         if self.decrypt_qq:
             print(f"使用{'全盘' if self.full_scan else ''}搜索方式查找QQ数据库...")
-            self.db_paths = get_qq_db_path(self.search_drives)
+            self.db_paths = get_qq_db_path(self.search_drives, self.stop_at_first_account, self.backend)
             print(f"找到 {len(self.db_paths)} 个QQ数据库")
         else:
             print(f"使用{'全盘' if self.full_scan else ''}搜索方式查找微信数据库...")
-            self.db_paths = get_wechat_db_path(self.search_drives)
+            self.db_paths = get_wechat_db_path(self.search_drives, self.stop_at_first_account, self.backend)
             print(f"找到 {len(self.db_paths)} 个微信数据库")
             
         if not self.db_paths:
@@ -79,20 +87,8 @@ class RealWeChatDBDecrypt:
         
         # 获取密钥
         if not self.decrypt_qq:  # QQ数据库通常不加密
-            if HAS_PYWXDUMP:
-                try:
-                    # 使用PyWxDump获取真实密钥
-                    self.key = wx_get_key()
-                    if not self.key:
-                        print("未能获取微信数据库密钥，尝试备用方法...")
-                        self.key = get_wechat_key()
-                except Exception as e:
-                    print(f"使用PyWxDump获取密钥失败: {e}")
-                    print("尝试使用备用方法...")
-                    self.key = get_wechat_key()
-            else:
-                # 使用备用方法获取密钥
-                self.key = get_wechat_key()
+            self.account_keys = self.get_key_broker().resolve(self.db_paths, self.acquire_key)
+            self.key = next(iter(self.account_keys.values()), None)
                 
             if not self.key:
                 print("未能获取微信数据库密钥")
@@ -103,8 +99,9 @@ class RealWeChatDBDecrypt:
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
-        # 解密所有数据库
-        for db_info in self.db_paths:
+        # 解密所有数据库，大文件优先
+        progress = DecryptProgress(self.db_paths)
+        for db_info in schedule_largest_first(self.db_paths):
             db_path = db_info['path']
             db_name = db_info['db_name']
             
@@ -123,7 +120,10 @@ class RealWeChatDBDecrypt:
             
             # 解密数据库
             output_path = os.path.join(user_output_dir, db_name)
+            self.select_key(db_info)
             success = self.decrypt_db(db_path, output_path)
+            progress.advance(db_info)
+            print(f"进度: {progress.describe()}")
             
             results.append({
                 'original': db_info,
@@ -133,6 +133,40 @@ class RealWeChatDBDecrypt:
             
         return results
     
+    def get_key_broker(self) -> KeyBroker:
+        """返回使用的密钥服务，未设置共享服务时按use_key_cache创建"""
+        if self.key_broker is None:
+            self.key_broker = KeyBroker(KeyCache() if self.use_key_cache else None)
+        return self.key_broker
+    
+    def select_key(self, db_info: Dict[str, Any]) -> None:
+        """切换到数据库所属微信账号的密钥"""
+        if not self.decrypt_qq and self.account_keys:
+            self.key = get_db_key(self.account_keys, db_info) or self.key
+    
+    def acquire_key(self):
+        """
+        从运行中的微信进程获取数据库密钥，优先使用PyWxDump，失败时使用备用方法
+        
+        Returns:
+            密钥，获取失败时返回None
+        """
+        if HAS_PYWXDUMP:
+            try:
+                # 使用PyWxDump获取真实密钥
+                key = wx_get_key()
+                if not key:
+                    print("未能获取微信数据库密钥，尝试备用方法...")
+                    key = get_wechat_key()
+            except Exception as e:
+                print(f"使用PyWxDump获取密钥失败: {e}")
+                print("尝试使用备用方法...")
+                key = get_wechat_key()
+        else:
+            # 使用备用方法获取密钥
+            key = get_wechat_key()
+        return key
+    
     def _handle_test_mode(self, output_dir: str) -> List[Dict[str, Any]]:
         """处理测试模式"""
         results = []
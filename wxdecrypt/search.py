@@ -0,0 +1,431 @@
+"""
+消息全文搜索
+为每个解密后的消息数据库建立SQLite FTS5索引，保存在分析目录的.cache/<数据库文件名>/search_index.db中。
+FTS5的内置分词器不能切分中文，消息在写入索引前先切分好：默认把连续的中日韩文字切成相邻两字的组合（bigram），
+搜索时把关键词按同样的方式切分后作为短语查询，结果与子串匹配一致；也可以使用jieba分词，索引更小但只能按词匹配。
+索引只保存分词结果和用于筛选的时间、会话，不保存消息原文，命中的消息按rowid回到原数据库读取。
+索引按rowid水位线增量更新，已索引的消息发生变化时重建。
+账号目录中有客户端自带的全文索引（微信FTSMSG*.db、QQ NT *_msg_fts.db）时，默认同时搜索这些索引（见client_fts），
+本工具只为客户端索引没有覆盖的消息（未建立客户端索引的分片、客户端还没有索引的新消息）建立索引，可以用--backend选择
+
+用法:
+    wxdecrypt search "关键词" [--from 2023-01-01] [--to 2023-12-31] [--chat wxid_xxx] [-o ./output]
+"""
+import os
+import re
+import json
+import sqlite3
+import argparse
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+from wxdecrypt.client_fts import ClientFtsSearch, is_client_fts_database
+from wxdecrypt.db_decrypt import find_message_databases
+from wxdecrypt.message_store import MessageStore
+from wxdecrypt.utils.time_utils import parse_local_time
+
+SEARCH_INDEX_FILE = 'search_index.db'
+
+# 客户端全文索引覆盖范围的缓存
+COVERAGE_FILE = 'client_fts_coverage.json'
+
+# 索引格式变化时递增，旧索引会被重建
+SEARCH_INDEX_VERSION = 1
+
+# 建立索引时每批读取和写入的消息数
+INDEX_BATCH_SIZE = 20000
+
+# 默认返回的结果数
+DEFAULT_LIMIT = 50
+
+# bigram：按相邻两字切分中日韩文字；jieba：使用jieba的搜索引擎模式分词
+TOKENIZERS = ('bigram', 'jieba')
+DEFAULT_TOKENIZER = 'bigram'
+
+# index：使用本工具建立的索引；client：只使用客户端自带的全文索引；
+# auto：同时使用客户端索引和本工具的索引，本工具只索引客户端索引没有覆盖的消息
+SEARCH_BACKENDS = ('auto', 'index', 'client')
+DEFAULT_BACKEND = 'auto'
+
+# 中日韩文字（含扩展A区、兼容汉字、假名和谚文）连续出现的部分按bigram切分，其余按单词切分
+_CJK_RUN = re.compile('[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+_WORD = re.compile(r'\w+')
+
+def index_path(db_path: str) -> str:
+    """搜索索引的路径，与分析状态和消息缓存在同一目录（见data_analysis.database_cache_dir）"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'analysis', '.cache',
+                        os.path.basename(db_path), SEARCH_INDEX_FILE)
+
+def _bigrams(run: str) -> List[str]:
+    """相邻两字的组合，最后一个字单独作为一项，使单字可以用前缀查询匹配到任意位置"""
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+def tokenize_bigram(text: str) -> List[str]:
+    """按bigram切分中日韩文字，其他文字按单词切分"""
+    tokens = []
+    position = 0
+    for match in _CJK_RUN.finditer(text):
+        tokens.extend(_WORD.findall(text[position:match.start()]))
+        tokens.extend(_bigrams(match.group()))
+        position = match.end()
+    tokens.extend(_WORD.findall(text[position:]))
+    return tokens
+
+def tokenize_jieba(text: str) -> List[str]:
+    """使用jieba的搜索引擎模式分词，只保留包含文字或数字的词"""
+    import jieba
+    return [word for word in jieba.cut_for_search(text) if _WORD.search(word)]
+
+def tokenize(text: str, tokenizer: str = DEFAULT_TOKENIZER) -> str:
+    """切分消息内容，返回以空格分隔的词，由FTS5的unicode61分词器按空格建立索引"""
+    words = tokenize_jieba(text) if tokenizer == 'jieba' else tokenize_bigram(text)
+    return ' '.join(words)
+
+def _quote(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+def build_match_query(keyword: str, tokenizer: str = DEFAULT_TOKENIZER) -> Optional[str]:
+    """
+    把关键词转换为FTS5查询
+
+    bigram索引中，关键词的每个连续片段转换为短语查询，只有一个中文字的片段使用前缀查询；
+    jieba索引中，关键词分词后要求每个词都出现。以空格分隔的多个关键词之间为AND关系
+
+    Returns:
+        str: FTS5 MATCH表达式，关键词中没有可搜索的文字时返回None
+    """
+    terms = []
+    for part in keyword.split():
+        if tokenizer == 'jieba':
+            terms.extend(_quote(word) for word in tokenize_jieba(part))
+            continue
+        for match in _CJK_RUN.finditer(part):
+            run = match.group()
+            if len(run) == 1:
+                terms.append(_quote(run) + '*')
+            else:
+                terms.append(_quote(' '.join(run[i:i + 2] for i in range(len(run) - 1))))
+        terms.extend(_quote(word) for word in _WORD.findall(_CJK_RUN.sub(' ', part)))
+    return ' AND '.join(terms) if terms else None
+
+class SearchIndex:
+    """单个消息数据库的全文索引"""
+
+    def __init__(self, db_path: str, is_qq: bool = False, tokenizer: str = DEFAULT_TOKENIZER,
+                 path: Optional[str] = None, after: int = 0):
+        """
+        Args:
+            db_path: 消息数据库路径
+            is_qq: 是否为QQ数据库
+            tokenizer: 分词方式，见TOKENIZERS；与已有索引不同时重建索引
+            path: 索引路径，默认见index_path
+            after: 只需要索引rowid大于该值的消息（之前的消息已被客户端全文索引覆盖）；
+                已有索引的起点更早时继续使用，起点更晚时重建
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.is_qq = is_qq
+        self.tokenizer = tokenizer
+        self.path = path or index_path(db_path)
+        self.after = after
+        self.schema = None
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS rows (rowid INTEGER PRIMARY KEY, time INTEGER, talker TEXT);
+            CREATE INDEX IF NOT EXISTS rows_time ON rows(time);
+            CREATE INDEX IF NOT EXISTS rows_talker_time ON rows(talker, time);
+            CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(tokens, content='', columnsize=0);
+        """)
+        return conn
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection) -> Dict[str, Any]:
+        return {key: json.loads(value) for key, value in conn.execute('SELECT key, value FROM meta')}
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values) -> None:
+        conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()])
+
+    @staticmethod
+    def _clear(conn: sqlite3.Connection) -> None:
+        conn.execute('DELETE FROM meta')
+        conn.execute('DELETE FROM rows')
+        conn.execute("INSERT INTO fts(fts) VALUES ('delete-all')")
+
+    def update(self) -> int:
+        """
+        把水位线之后的新消息加入索引
+
+        Returns:
+            int: 新加入的消息数；数据库中没有可识别的消息表时返回-1
+        """
+        try:
+            source = MessageStore(self.db_path, self.is_qq)
+        except sqlite3.Error:
+            return -1
+        self.schema = source.schema
+        if not self.schema or not self.schema.get('has_rowid'):
+            source.close()
+            return -1
+        conn = self._connect()
+        try:
+            meta = self._meta(conn)
+            # 在读取消息前记录数据库文件的大小和修改时间，更新期间的写入会在下次被发现
+            try:
+                signature = _file_signature(self.db_path)
+            except OSError:
+                signature = None
+            upto = source.max_rowid()
+            last_rowid = meta.get('last_rowid', 0)
+            # 索引包含after < rowid <= last_rowid的消息
+            index_after = meta.get('after', 0)
+
+            # 格式、分词方式或表结构不同，起点晚于需要的起点，以及已索引的消息发生变化时重建
+            valid = (meta.get('version') == SEARCH_INDEX_VERSION and meta.get('tokenizer') == self.tokenizer
+                     and meta.get('db_path') == self.db_path and meta.get('schema') == self.schema
+                     and index_after <= self.after and last_rowid <= upto)
+            # 统计已索引范围内的消息数需要扫描消息表，只在数据库文件自上次更新后发生变化时检查
+            if valid and last_rowid > index_after and (signature is None or meta.get('signature') != signature):
+                valid = source.count((index_after, last_rowid)) == meta.get('count')
+                if not valid:
+                    print("已索引的消息发生了变化，重建搜索索引")
+            if not valid:
+                self._clear(conn)
+                last_rowid, count = min(self.after, upto), 0
+                self._set_meta(conn, version=SEARCH_INDEX_VERSION, tokenizer=self.tokenizer,
+                               db_path=self.db_path, schema=self.schema, after=last_rowid,
+                               last_rowid=last_rowid, count=0)
+                conn.commit()
+            else:
+                count = meta.get('count', 0)
+            if last_rowid >= upto:
+                self._set_meta(conn, signature=signature)
+                conn.commit()
+                return 0
+
+            names = source.talker_names()
+            added = 0
+            for batch in source.iter_rows(('rowid', 'timestamp', 'talker', 'content'), INDEX_BATCH_SIZE,
+                                          (last_rowid, upto), order_by_rowid=True):
+                rows = [(rowid, timestamp, None if talker is None else str(names.get(talker, talker)))
+                        for rowid, timestamp, talker, _ in batch]
+                tokens = [(rowid, tokenize(content, self.tokenizer) if isinstance(content, str) else '')
+                          for rowid, _, _, content in batch]
+                conn.executemany('INSERT INTO rows (rowid, time, talker) VALUES (?, ?, ?)', rows)
+                conn.executemany('INSERT INTO fts (rowid, tokens) VALUES (?, ?)', tokens)
+                added += len(batch)
+                # 每批与水位线一起提交，中断后从已提交的位置继续
+                self._set_meta(conn, last_rowid=batch[-1][0], count=count + added)
+                conn.commit()
+                if added % (INDEX_BATCH_SIZE * 10) == 0:
+                    print(f"已索引 {count + added} 条消息...")
+            self._set_meta(conn, last_rowid=upto, count=count + added, signature=signature)
+            conn.commit()
+            return added
+        finally:
+            conn.close()
+            source.close()
+
+    def search(self, keyword: str, start: Optional[int] = None, end: Optional[int] = None,
+               chat: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        """
+        搜索消息，按时间从新到旧返回
+
+        Args:
+            keyword: 关键词，多个关键词以空格分隔
+            start: 最早时间（秒级时间戳，含）
+            end: 最晚时间（秒级时间戳，含）
+            chat: 只搜索该会话
+            limit: 最多返回的结果数
+
+        Returns:
+            List[Dict]: 每项包含db_path、rowid、time、talker和content
+        """
+        match = build_match_query(keyword, self.tokenizer)
+        if match is None or not os.path.exists(self.path):
+            return []
+        conditions, params = ['fts MATCH ?'], [match]
+        if start is not None:
+            conditions.append('rows.time >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('rows.time <= ?')
+            params.append(end)
+        if chat is not None:
+            conditions.append('rows.talker = ?')
+            params.append(chat)
+        conn = sqlite3.connect(self.path)
+        try:
+            meta = self._meta(conn)
+            if not meta.get('schema'):
+                return []
+            hits = conn.execute(
+                f'SELECT rows.rowid, rows.time, rows.talker FROM fts JOIN rows ON rows.rowid = fts.rowid '
+                f'WHERE {" AND ".join(conditions)} ORDER BY rows.time DESC, rows.rowid DESC LIMIT ?',
+                params + [limit]).fetchall()
+        finally:
+            conn.close()
+        if not hits:
+            return []
+        return [dict(db_path=self.db_path, rowid=rowid, time=timestamp, talker=talker, content=content)
+                for (rowid, timestamp, talker), content in zip(hits, self._contents(meta['schema'], hits))]
+
+    def _contents(self, schema: Dict[str, Any], hits: List[Tuple[Any, ...]]) -> List[Optional[str]]:
+        """按rowid从原数据库读取命中消息的内容"""
+        with MessageStore(self.db_path, self.is_qq, schema) as source:
+            records = source.get([hit[0] for hit in hits])
+        return [record.content if record is not None else None for record in records]
+
+def search_databases(databases: Iterable[Dict[str, Any]], keyword: str, start: Optional[int] = None,
+                     end: Optional[int] = None, chat: Optional[str] = None, limit: int = DEFAULT_LIMIT,
+                     tokenizer: str = DEFAULT_TOKENIZER, update: bool = True,
+                     backend: str = DEFAULT_BACKEND) -> List[Dict[str, Any]]:
+    """
+    在多个数据库中搜索，合并后按时间从新到旧返回
+
+    Args:
+        databases: 数据库列表，每项包含path和is_qq（见db_decrypt.find_message_databases）
+        keyword、start、end、chat、limit: 见SearchIndex.search
+        tokenizer: 分词方式
+        update: 搜索前是否先把新消息加入索引
+        backend: 见SEARCH_BACKENDS
+
+    Returns:
+        List[Dict]: SearchIndex.search的结果，另外包含account
+    """
+    accounts = {}
+    for db in databases:
+        accounts.setdefault(os.path.dirname(os.path.abspath(db['path'])), []).append(db)
+
+    results, seen = [], set()
+
+    def add(hits, account):
+        # 同一条消息可能同时被客户端索引和本工具的索引搜到
+        for hit in hits:
+            key = (os.path.abspath(hit['db_path']), hit['rowid'])
+            if key not in seen:
+                seen.add(key)
+                hit['account'] = account
+                results.append(hit)
+
+    for account_dbs in accounts.values():
+        account = account_dbs[0].get('account')
+        fts_paths = [db['path'] for db in account_dbs if is_client_fts_database(db['path'])]
+        client = ClientFtsSearch(fts_paths, account_dbs) if fts_paths and backend != 'index' else None
+        if client is not None:
+            add(client.search(keyword, start, end, chat, limit), account)
+            if backend == 'client':
+                continue
+        for db in account_dbs:
+            if is_client_fts_database(db['path']):
+                continue
+            # auto模式中客户端索引已覆盖的消息不再建立索引，覆盖范围无法确认时索引全部消息
+            after = _client_coverage(client, db) if client is not None else 0
+            index = SearchIndex(db['path'], db.get('is_qq', False), tokenizer, after=after)
+            if update:
+                try:
+                    added = index.update()
+                except sqlite3.Error as e:
+                    print(f"更新搜索索引失败 {db['path']}: {e}")
+                    continue
+                if added < 0:
+                    continue
+                if added:
+                    print(f"已将 {added} 条新消息加入索引: {db['path']}")
+            add(index.search(keyword, start, end, chat, limit), account)
+    results.sort(key=lambda hit: (hit['time'] or 0, hit['rowid'] or 0), reverse=True)
+    return results[:limit]
+
+def _file_signature(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _client_coverage(client: ClientFtsSearch, db: Dict[str, Any]) -> int:
+    """
+    消息数据库被客户端全文索引覆盖的rowid范围，见ClientFtsSearch.covered_upto
+
+    计算需要扫描消息表，结果按消息数据库和全文索引数据库的大小、修改时间缓存在索引目录中
+    """
+    path = os.path.join(os.path.dirname(index_path(db['path'])), COVERAGE_FILE)
+    try:
+        signature = {p: _file_signature(p) for p in [db['path']] + client.fts_paths}
+    except OSError:
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('signature') == signature:
+            return cached['covered_upto']
+    except (OSError, ValueError, KeyError):
+        pass
+    covered = client.covered_upto(db['path'], db.get('is_qq', False))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'signature': signature, 'covered_upto': covered}, f)
+    except OSError:
+        pass
+    return covered
+
+def parse_search_args(argv: List[str]) -> argparse.Namespace:
+    """解析search子命令的参数"""
+    parser = argparse.ArgumentParser(prog='wxdecrypt search', description='在解密后的消息数据库中全文搜索')
+    parser.add_argument('keyword', help='关键词，多个关键词以空格分隔时需要同时出现')
+    parser.add_argument('--from', dest='start', help='最早时间，如2023-01-01或"2023-01-01 08:00"')
+    parser.add_argument('--to', dest='end', help='最晚时间，只有日期时包含当天')
+    parser.add_argument('--chat', help='只搜索该会话（微信ID、群ID或QQ号）')
+    parser.add_argument('-o', '--output', default='./output', help='解密输出目录 (默认: ./output)')
+    parser.add_argument('--db', action='append', help='只搜索指定的数据库文件，可多次指定')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f'最多显示的结果数 (默认: {DEFAULT_LIMIT})')
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=DEFAULT_TOKENIZER,
+                        help='索引的分词方式，bigram按子串匹配，jieba按词匹配且索引更小 (默认: bigram)')
+    parser.add_argument('--no-update', action='store_true', help='不更新索引，只搜索已索引的消息')
+    parser.add_argument('--backend', choices=SEARCH_BACKENDS, default=DEFAULT_BACKEND,
+                        help='搜索方式，auto同时使用客户端全文索引（FTSMSG*.db等），只为其未覆盖的消息建立索引 (默认: auto)')
+    parser.add_argument('--timezone', help='解析和显示时间使用的时区 (默认: 系统时区)')
+    return parser.parse_args(argv)
+
+def run_search_cli(argv: List[str]) -> int:
+    """运行search子命令，返回退出状态"""
+    args = parse_search_args(argv)
+    if args.timezone:
+        from wxdecrypt.utils.time_utils import set_default_timezone
+        set_default_timezone(args.timezone)
+    try:
+        start = parse_local_time(args.start) if args.start else None
+        end = parse_local_time(args.end, end_of_day=True) if args.end else None
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+    if build_match_query(args.keyword, args.tokenizer) is None:
+        print("错误: 关键词中没有可搜索的文字")
+        return 2
+
+    if args.db:
+        databases = [{'path': path, 'is_qq': 'qq' in path.lower() or 'msg3.0' in path.lower()}
+                     for path in args.db if os.path.exists(path)]
+    else:
+        databases = find_message_databases(args.output)
+    if not databases:
+        print("未找到可搜索的数据库")
+        return 1
+
+    import time
+    began = time.perf_counter()
+    results = search_databases(databases, args.keyword, start, end, args.chat, args.limit, args.tokenizer,
+                               not args.no_update, args.backend)
+    elapsed = time.perf_counter() - began
+    if not results:
+        print(f"没有找到包含 \"{args.keyword}\" 的消息（{elapsed:.2f} 秒）")
+        return 0
+
+    from wxdecrypt.utils.time_utils import format_times
+    times = format_times([hit['time'] or 0 for hit in results])
+    for hit, formatted in zip(results, times):
+        content = (hit['content'] or '').replace('\n', ' ')
+        print(f"[{formatted}] {hit['talker'] or ''}: {content}")
+    print(f"\n共 {len(results)} 条结果（{elapsed:.2f} 秒）")
+    return 0
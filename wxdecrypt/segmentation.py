@@ -0,0 +1,233 @@
+"""
+并行分词模块
+按消息批次把jieba分词分配到多个工作进程，每个进程启动时预先加载jieba词典，
+返回过滤停用词后的分词结果，由主进程合并。同时在途的批次数量有上限，内存占用与消息总数无关。
+聊天记录中大量消息是重复的（如"哈哈哈"、"好的"），主进程按内容哈希缓存每条消息的分词结果，
+批次内重复的消息只分词一次，已缓存的消息不再发送给工作进程
+"""
+import os
+import json
+import hashlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, List, Optional, Tuple
+
+import jieba
+
+# 每个分词批次包含的消息数
+SEGMENT_BATCH_SIZE = 5000
+
+# 消息数少于该值时在当前进程中分词，启动工作进程并加载词典的开销比分词本身还大
+PARALLEL_MIN_MESSAGES = 20000
+
+# 每个工作进程同时排队的批次数
+BATCHES_PER_WORKER = 2
+
+# 分词缓存最多保存的消息数，超过时淘汰最久未使用的
+TOKEN_CACHE_MAX_ENTRIES = 200000
+
+# 超过该长度的消息很少重复，不放入缓存
+MAX_CACHED_TEXT_LENGTH = 200
+
+# 设置后分词缓存会保存到该文件，下次运行时继续使用
+TOKEN_CACHE_ENV = 'WXDECRYPT_TOKEN_CACHE'
+
+# 缓存格式或分词规则（如停用词）变化时递增，旧缓存会被丢弃
+TOKEN_CACHE_VERSION = 1
+
+# 词频统计时过滤的停用词
+STOPWORDS = frozenset(['的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都',
+                       '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会',
+                       '着', '没有', '看', '好', '自己', '这', '这个', '那', '那个',
+                       '。', ',', '?', '!', '、', ':', '"', '"', "'", "'", '(', ')',
+                       '[', ']', '{', '}', '[', ']', '<', '>', ':', ';', '"', '...',
+                       '\n', '\t', '\r', ' ', '+', '-', '*', '/', '='])
+
+def init_segmenter() -> None:
+    """加载jieba词典，作为工作进程的初始化函数"""
+    jieba.setLogLevel(20)  # 设置jieba的日志级别为INFO，减少输出
+    jieba.initialize()
+
+def filter_words(words: Iterable[str]) -> List[str]:
+    """过滤单字和停用词"""
+    return [word for word in words if len(word) > 1 and word not in STOPWORDS]
+
+def segment_texts(texts: List[str]) -> List[List[str]]:
+    """逐条分词，返回每条消息过滤停用词后的词语，供主进程按消息缓存"""
+    return [filter_words(jieba.cut(text, cut_all=False)) for text in texts]
+
+class TokenCache:
+    """按消息内容哈希缓存分词结果的LRU缓存"""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES, path: Optional[str] = None):
+        """
+        初始化分词缓存
+
+        Args:
+            max_entries: 最多缓存的消息数
+            path: 持久化文件路径，为None时只在当前进程内缓存
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()  # 内容哈希 -> 词语元组
+        self.lookups = 0  # 累计处理的消息数
+        self.segmented = 0  # 其中实际分词的消息数
+        self.dirty = False  # 是否有尚未保存的新条目
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        """消息内容的哈希，缓存中不保存消息原文"""
+        return hashlib.blake2b(text.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[Tuple[str, ...]]:
+        tokens = self.entries.get(key)
+        if tokens is not None:
+            self.entries.move_to_end(key)
+        return tokens
+
+    def put(self, key: bytes, tokens: Iterable[str]) -> None:
+        self.entries[key] = tuple(tokens)
+        self.entries.move_to_end(key)
+        self.dirty = True
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """不需要分词的消息比例，包括批次内的重复消息"""
+        return 1 - self.segmented / self.lookups if self.lookups else 0.0
+
+    def report(self) -> str:
+        return (f"累计命中率 {self.hit_rate:.1%}（{self.lookups} 条消息中 {self.segmented} 条需要分词，"
+                f"已缓存 {len(self.entries)} 条）")
+
+    def load(self) -> None:
+        """读取持久化的缓存，版本或jieba版本不同时忽略"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != TOKEN_CACHE_VERSION or data.get('jieba') != jieba.__version__:
+            return
+        try:
+            for key, tokens in data['entries'][-self.max_entries:]:
+                self.entries[bytes.fromhex(key)] = tuple(tokens)
+        except (KeyError, TypeError, ValueError):
+            self.entries.clear()
+
+    def save(self) -> None:
+        """按最近使用的顺序写入持久化文件，没有新条目时不写入"""
+        if not self.path or not self.dirty:
+            return
+        data = {
+            'version': TOKEN_CACHE_VERSION,
+            'jieba': jieba.__version__,
+            'entries': [[key.hex(), list(tokens)] for key, tokens in self.entries.items()],
+        }
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 汇总分析的多个工作进程可能同时保存，临时文件按进程区分
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"保存分词缓存失败: {e}")
+
+_token_cache = None
+
+def get_token_cache() -> TokenCache:
+    """返回进程内共享的分词缓存，设置了环境变量WXDECRYPT_TOKEN_CACHE时会持久化到该文件"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(path=os.environ.get(TOKEN_CACHE_ENV) or None)
+    return _token_cache
+
+def _add_tokens(total: Counter, tokens: Iterable[str], repeat: int) -> None:
+    for word in tokens:
+        total[word] += repeat
+
+def _split_batch(texts: List[str], cache: TokenCache, total: Counter):
+    """
+    合并批次中重复的消息，命中缓存的消息直接计入total
+
+    Returns:
+        需要分词的消息列表，以及每条消息的(缓存键, 出现次数)
+    """
+    misses, pending = [], []
+    for text, repeat in Counter(texts).items():
+        key = cache.key(text) if len(text) <= MAX_CACHED_TEXT_LENGTH else None
+        tokens = cache.get(key) if key is not None else None
+        if tokens is not None:
+            _add_tokens(total, tokens, repeat)
+        else:
+            misses.append(text)
+            pending.append((key, repeat))
+    cache.lookups += len(texts)
+    cache.segmented += len(misses)
+    return misses, pending
+
+def _merge_segmented(total: Counter, cache: TokenCache, pending, token_lists: List[List[str]]) -> None:
+    """把分词结果写入缓存并计入total"""
+    for (key, repeat), tokens in zip(pending, token_lists):
+        if key is not None:
+            cache.put(key, tokens)
+        _add_tokens(total, tokens, repeat)
+
+def default_workers() -> int:
+    """默认的工作进程数：CPU核心数"""
+    return os.cpu_count() or 1
+
+def parallel_word_counts(batches: Iterable[List[str]], workers: Optional[int] = None,
+                         cache: Optional[TokenCache] = None, verbose: bool = True) -> Counter:
+    """
+    对多批消息分词并合并词频
+
+    Args:
+        batches: 消息文本的批次，按需生成即可，不需要一次性全部读入
+        workers: 工作进程数，为None时使用CPU核心数，不大于1时在当前进程中分词
+        cache: 分词缓存，为None时使用get_token_cache()
+        verbose: 是否输出缓存命中率，连续统计多组消息时由调用方统一输出
+    
+    新的分词结果只加入内存中的缓存，由调用方在整个分析结束后调用cache.save()持久化一次
+
+    Returns:
+        Counter: 合并后的词频
+    """
+    workers = default_workers() if workers is None else workers
+    cache = get_token_cache() if cache is None else cache
+    lookups, segmented = cache.lookups, cache.segmented
+    total = Counter()
+    if workers <= 1:
+        init_segmenter()
+        for texts in batches:
+            misses, pending = _split_batch(texts, cache, total)
+            _merge_segmented(total, cache, pending, segment_texts(misses))
+    else:
+        max_pending = workers * BATCHES_PER_WORKER
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_segmenter) as executor:
+            futures = {}
+            for texts in batches:
+                if len(futures) >= max_pending:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _merge_segmented(total, cache, futures.pop(future), future.result())
+                misses, pending = _split_batch(texts, cache, total)
+                if misses:
+                    futures[executor.submit(segment_texts, misses)] = pending
+            for future in wait(futures).done:
+                _merge_segmented(total, cache, futures[future], future.result())
+
+    if verbose and cache.lookups > lookups:
+        batch_rate = 1 - (cache.segmented - segmented) / (cache.lookups - lookups)
+        print(f"分词缓存本次命中率 {batch_rate:.1%}，{cache.report()}")
+    return total
@@ -0,0 +1,142 @@
+"""
+微信数据库页面级解密工具
+微信PC版数据库使用SQLCipher 3格式：第一页前16字节为salt，每页末尾48字节为IV和HMAC-SHA1，
+页面内容使用AES-256-CBC加密。本模块按页处理，可以直接解密任意可读的文件对象（如压缩包成员），
+无需先把加密文件写到磁盘
+"""
+import hmac
+import hashlib
+import struct
+import functools
+from typing import Optional, Tuple, Union, BinaryIO
+
+# 尝试导入AES实现（pycryptodome）
+try:
+    from Crypto.Cipher import AES
+    HAS_AES = True
+except ImportError:
+    HAS_AES = False
+
+KEY_SIZE = 32
+SALT_SIZE = 16
+IV_SIZE = 16
+HMAC_SIZE = 20  # HMAC-SHA1
+RESERVE_SIZE = 48  # IV + HMAC，按AES块大小对齐
+DEFAULT_PAGE_SIZE = 4096
+KDF_ITERATIONS = 64000
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+def normalize_key(key: Union[bytes, str, None]) -> Optional[bytes]:
+    """将十六进制字符串形式的密钥统一转换为bytes"""
+    if key is None or isinstance(key, bytes):
+        return key
+    try:
+        return bytes.fromhex(key)
+    except ValueError:
+        return None
+
+@functools.lru_cache(maxsize=64)
+def derive_keys(key: bytes, salt: bytes) -> Tuple[bytes, bytes]:
+    """
+    由原始密钥和数据库salt派生页面加密密钥和HMAC密钥
+    
+    PBKDF2需要64000次迭代，结果按(密钥, salt)缓存，同一数据库的重复校验只需计算一次HMAC
+
+    Args:
+        key: 从微信进程获取的32字节原始密钥
+        salt: 数据库文件的前16字节
+
+    Returns:
+        (加密密钥, HMAC密钥)
+    """
+    enc_key = hashlib.pbkdf2_hmac('sha1', key, salt, KDF_ITERATIONS, dklen=KEY_SIZE)
+    mac_salt = bytes(b ^ 0x3a for b in salt)
+    mac_key = hashlib.pbkdf2_hmac('sha1', enc_key, mac_salt, 2, dklen=KEY_SIZE)
+    return enc_key, mac_key
+
+def check_page_hmac(mac_key: bytes, page: bytes, page_no: int) -> bool:
+    """
+    校验单个页面的HMAC
+
+    Args:
+        mac_key: derive_keys返回的HMAC密钥
+        page: 完整的页面数据（第一页包含salt）
+        page_no: 页号，从1开始
+    """
+    start = SALT_SIZE if page_no == 1 else 0
+    data_end = len(page) - RESERVE_SIZE + IV_SIZE
+    mac = hmac.new(mac_key, page[start:data_end], hashlib.sha1)
+    mac.update(struct.pack('<I', page_no))
+    return hmac.compare_digest(mac.digest(), page[data_end:data_end + HMAC_SIZE])
+
+def verify_key(key: Union[bytes, str], first_page: bytes) -> bool:
+    """使用数据库第一页的HMAC校验密钥是否正确"""
+    key = normalize_key(key)
+    if not key or len(first_page) < DEFAULT_PAGE_SIZE:
+        return False
+    _, mac_key = derive_keys(key, first_page[:SALT_SIZE])
+    return check_page_hmac(mac_key, first_page[:DEFAULT_PAGE_SIZE], 1)
+
+def decrypt_page(enc_key: bytes, page: bytes, page_no: int) -> bytes:
+    """解密单个页面，返回可直接写入SQLite文件的明文页面"""
+    start = SALT_SIZE if page_no == 1 else 0
+    iv = page[-RESERVE_SIZE:-RESERVE_SIZE + IV_SIZE]
+    plain = AES.new(enc_key, AES.MODE_CBC, iv).decrypt(page[start:-RESERVE_SIZE])
+    header = SQLITE_HEADER if page_no == 1 else b""
+    return header + plain + page[-RESERVE_SIZE:]
+
+def decrypt_stream(key: Union[bytes, str], src: BinaryIO, dst: BinaryIO,
+                   page_size: int = DEFAULT_PAGE_SIZE) -> int:
+    """
+    逐页解密微信数据库
+
+    Args:
+        key: 原始密钥（bytes或十六进制字符串）
+        src: 加密数据库的可读文件对象，只需支持顺序读取
+        dst: 明文数据库的可写文件对象
+        page_size: 页面大小
+
+    Returns:
+        解密的页数
+
+    Raises:
+        RuntimeError: 未安装pycryptodome
+        ValueError: 密钥错误或数据库格式不正确
+    """
+    if not HAS_AES:
+        raise RuntimeError("需要安装pycryptodome才能解密数据库")
+
+    key = normalize_key(key)
+    if not key:
+        raise ValueError("无效的数据库密钥")
+
+    first_page = _read_exact(src, page_size)
+    if len(first_page) < page_size:
+        raise ValueError("数据库文件不完整")
+
+    enc_key, mac_key = derive_keys(key, first_page[:SALT_SIZE])
+    if not check_page_hmac(mac_key, first_page, 1):
+        raise ValueError("密钥错误或数据库未加密")
+
+    dst.write(decrypt_page(enc_key, first_page, 1))
+    page_no = 1
+    while True:
+        page = _read_exact(src, page_size)
+        if len(page) < page_size:
+            break
+        page_no += 1
+        dst.write(decrypt_page(enc_key, page, page_no))
+
+    return page_no
+
+def _read_exact(src: BinaryIO, size: int) -> bytes:
+    """读取恰好size字节，压缩流的read可能一次返回较少的数据"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = src.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
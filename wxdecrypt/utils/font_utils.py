@@ -0,0 +1,155 @@
+"""
+中文字体查找工具
+查找结果按字体目录的指纹缓存到 ~/.wxdecrypt/font_cache.json，字体目录没有变化时直接使用缓存；
+只有在绘制图表时才会查找字体。可以通过环境变量WXDECRYPT_CJK_FONT指定字体文件
+"""
+import os
+import sys
+import json
+import hashlib
+from typing import List, Optional
+
+FONT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.wxdecrypt', 'font_cache.json')
+FONT_ENV = 'WXDECRYPT_CJK_FONT'
+
+# 字体名称中包含这些关键词（小写）的视为中文字体，按优先顺序排列
+CJK_FONT_KEYWORDS = (
+    'simhei', 'microsoft yahei', 'simsun', 'nsimsun', 'kaiti', 'fangsong',
+    'stheiti', 'pingfang', 'heiti', 'songti', 'hei',
+)
+
+_resolved = False
+_font_path = None
+_applied = False
+
+def font_directories() -> List[str]:
+    """返回系统和用户的字体目录"""
+    if sys.platform == 'win32':
+        windir = os.environ.get('WINDIR', r'C:\Windows')
+        dirs = [os.path.join(windir, 'Fonts')]
+        local = os.environ.get('LOCALAPPDATA')
+        if local:
+            dirs.append(os.path.join(local, 'Microsoft', 'Windows', 'Fonts'))
+    elif sys.platform == 'darwin':
+        dirs = ['/Library/Fonts', '/System/Library/Fonts', '/Network/Library/Fonts',
+                os.path.expanduser('~/Library/Fonts')]
+    else:
+        dirs = ['/usr/share/fonts', '/usr/local/share/fonts', '/usr/X11R6/lib/X11/fonts',
+                os.path.expanduser('~/.fonts'), os.path.expanduser('~/.local/share/fonts')]
+    return [d for d in dirs if os.path.isdir(d)]
+
+def font_fingerprint(dirs: Optional[List[str]] = None) -> str:
+    """
+    计算字体目录的指纹
+
+    安装或删除字体会改变所在目录的修改时间，因此只需遍历目录本身，不需要读取字体文件
+    """
+    digest = hashlib.sha1()
+    for top in sorted(dirs if dirs is not None else font_directories()):
+        for root, subdirs, _ in os.walk(top):
+            subdirs.sort()
+            try:
+                mtime = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+            digest.update(f"{root}\0{mtime}\n".encode('utf-8', errors='surrogateescape'))
+    return digest.hexdigest()
+
+def _font_rank(name: str) -> Optional[int]:
+    """返回字体名称匹配的关键词序号，不是中文字体时返回None"""
+    lower = name.lower()
+    for rank, keyword in enumerate(CJK_FONT_KEYWORDS):
+        if keyword in lower:
+            return rank
+    return None
+
+def find_cjk_font() -> Optional[str]:
+    """
+    在matplotlib的字体列表中查找中文字体
+
+    matplotlib已经为每个字体记录了名称，无需像逐个构造FontProperties那样反复解析字体文件
+    """
+    import matplotlib.font_manager as fm
+
+    best = None
+    for entry in fm.fontManager.ttflist:
+        rank = _font_rank(entry.name)
+        if rank is not None and (best is None or rank < best[0]):
+            best = (rank, entry.fname)
+    return best[1] if best else None
+
+def _load_cache(cache_file: str) -> dict:
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache_file: str, data: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"保存字体缓存失败: {e}")
+
+def resolve_cjk_font(cache_file: str = FONT_CACHE_FILE, refresh: bool = False) -> Optional[str]:
+    """
+    返回中文字体文件路径，结果在进程内和缓存文件中缓存
+
+    Args:
+        cache_file: 缓存文件路径
+        refresh: 忽略缓存重新查找
+
+    Returns:
+        字体文件路径，找不到时返回None
+    """
+    global _resolved, _font_path
+    if _resolved and not refresh:
+        return _font_path
+
+    override = os.environ.get(FONT_ENV)
+    if override:
+        if os.path.isfile(override):
+            _resolved, _font_path = True, override
+            return override
+        print(f"警告: {FONT_ENV} 指定的字体文件不存在: {override}")
+
+    fingerprint = font_fingerprint()
+    cache = {} if refresh else _load_cache(cache_file)
+    cached_path = cache.get('font_path')
+    if cache.get('fingerprint') == fingerprint and (cached_path is None or os.path.isfile(cached_path)):
+        font_path = cached_path
+    else:
+        font_path = find_cjk_font()
+        _save_cache(cache_file, {'fingerprint': fingerprint, 'font_path': font_path})
+
+    _resolved, _font_path = True, font_path
+    return font_path
+
+def apply_cjk_font() -> Optional[str]:
+    """设置matplotlib使用中文字体，在绘制图表前调用，重复调用不会重复查找"""
+    global _applied
+    font_path = resolve_cjk_font()
+    if _applied:
+        return font_path
+    _applied = True
+
+    if not font_path:
+        print("警告: 未找到中文字体，图表中的中文可能无法正确显示")
+        return None
+
+    import matplotlib
+    import matplotlib.font_manager as fm
+
+    # 通过环境变量指定的字体可能不在matplotlib的字体列表中
+    try:
+        fm.fontManager.addfont(font_path)
+    except (OSError, RuntimeError, ValueError):
+        pass
+    font_name = fm.FontProperties(fname=font_path).get_name()
+    matplotlib.rcParams['font.sans-serif'] = [font_name] + [
+        name for name in matplotlib.rcParams['font.sans-serif'] if name != font_name
+    ]
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return font_path
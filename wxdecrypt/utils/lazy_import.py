@@ -0,0 +1,34 @@
+"""
+按需加载的可选模块
+数据分析（pandas、matplotlib、jieba等）和PyWxDump导入很慢，这里只检查模块是否存在，
+真正用到时才导入，使--version、-l等不需要这些模块的命令可以快速启动
+"""
+import importlib.util
+
+# 数据分析功能依赖的模块
+ANALYSIS_MODULES = ('pandas', 'numpy', 'matplotlib', 'jieba', 'wordcloud')
+
+def has_modules(*names: str) -> bool:
+    """检查模块是否已安装，不会导入模块本身"""
+    for name in names:
+        try:
+            if importlib.util.find_spec(name) is None:
+                return False
+        except (ImportError, ValueError):
+            return False
+    return True
+
+def generate_analysis_report(db_path: str, output_dir: str, is_qq: bool = False):
+    """加载数据分析模块并生成分析报告，参数与data_analysis.generate_analysis_report相同"""
+    from wxdecrypt.data_analysis import generate_analysis_report as _generate_analysis_report
+    return _generate_analysis_report(db_path, output_dir, is_qq)
+
+def generate_aggregate_report(databases, output_dir: str, workers=None):
+    """加载汇总分析模块并生成汇总报告，参数与aggregate_analysis.generate_aggregate_report相同"""
+    from wxdecrypt.aggregate_analysis import generate_aggregate_report as _generate_aggregate_report
+    return _generate_aggregate_report(databases, output_dir, workers)
+
+def create_real_decryptor():
+    """加载真实解密模块（会导入PyWxDump）并创建解密器"""
+    from wxdecrypt.real_decrypt import RealWeChatDBDecrypt
+    return RealWeChatDBDecrypt()
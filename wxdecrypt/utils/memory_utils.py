@@ -4,51 +4,103 @@
 import os
 import time
 import re
-import subprocess
 import ctypes
 from ctypes import wintypes
 import platform
-from typing import List, Optional, Tuple, Dict, Any, Union
+from typing import List, Optional, Tuple, Dict, Any, Union, Callable, Iterable
+
+# 尝试导入psutil，未安装时在Windows上使用Toolhelp快照API
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
 
 # Windows API 常量和函数定义
 PROCESS_QUERY_INFORMATION = 0x0400
 PROCESS_VM_READ = 0x0010
 PROCESS_ALL_ACCESS = 0x1F0FFF
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
 
-# 定义Windows API函数
-kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
-
-OpenProcess = kernel32.OpenProcess
-OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
-OpenProcess.restype = wintypes.HANDLE
+# 进程快照的缓存时间（秒），同一次密钥获取中的多次查找共用一个快照
+PROCESS_SNAPSHOT_TTL = 2.0
 
-ReadProcessMemory = kernel32.ReadProcessMemory
-ReadProcessMemory.argtypes = [wintypes.HANDLE, wintypes.LPCVOID, wintypes.LPVOID, ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t)]
-ReadProcessMemory.restype = wintypes.BOOL
+# 未找到目标进程时，名称中包含这些关键词的进程会作为可能的微信进程提示给用户
+SIMILAR_PROCESS_KEYWORDS = ('wechat', 'wx', 'weixin')
 
-CloseHandle = kernel32.CloseHandle
-CloseHandle.argtypes = [wintypes.HANDLE]
-CloseHandle.restype = wintypes.BOOL
-
-# 获取模块信息所需API
+# 定义Windows API函数（仅在Windows上可用，其他系统上保持为None以便导入本模块）
+kernel32 = None
+OpenProcess = ReadProcessMemory = CloseHandle = None
 GetModuleInformation = None
-try:
-    from ctypes import byref, sizeof, Structure
+CreateToolhelp32Snapshot = Process32FirstW = Process32NextW = None
+QueryFullProcessImageNameW = None
 
-    class MODULEINFO(Structure):
+if platform.system() == 'Windows':
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    
+    OpenProcess = kernel32.OpenProcess
+    OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    OpenProcess.restype = wintypes.HANDLE
+    
+    ReadProcessMemory = kernel32.ReadProcessMemory
+    ReadProcessMemory.argtypes = [wintypes.HANDLE, wintypes.LPCVOID, wintypes.LPVOID, ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t)]
+    ReadProcessMemory.restype = wintypes.BOOL
+    
+    CloseHandle = kernel32.CloseHandle
+    CloseHandle.argtypes = [wintypes.HANDLE]
+    CloseHandle.restype = wintypes.BOOL
+    
+    # 进程枚举所需API（Toolhelp快照）
+    class PROCESSENTRY32W(ctypes.Structure):
         _fields_ = [
-            ("lpBaseOfDll", ctypes.c_void_p),
-            ("SizeOfImage", wintypes.DWORD),
-            ("EntryPoint", ctypes.c_void_p),
+            ("dwSize", wintypes.DWORD),
+            ("cntUsage", wintypes.DWORD),
+            ("th32ProcessID", wintypes.DWORD),
+            ("th32DefaultHeapID", ctypes.c_void_p),
+            ("th32ModuleID", wintypes.DWORD),
+            ("cntThreads", wintypes.DWORD),
+            ("th32ParentProcessID", wintypes.DWORD),
+            ("pcPriClassBase", ctypes.c_long),
+            ("dwFlags", wintypes.DWORD),
+            ("szExeFile", ctypes.c_wchar * 260),
         ]
-
-    # 尝试加载psapi.dll以获取模块信息
-    psapi = ctypes.WinDLL('psapi', use_last_error=True)
-    GetModuleInformation = psapi.GetModuleInformation
-    GetModuleInformation.argtypes = [wintypes.HANDLE, wintypes.HMODULE, ctypes.POINTER(MODULEINFO), wintypes.DWORD]
-    GetModuleInformation.restype = wintypes.BOOL
-except Exception as e:
-    print(f"加载psapi.dll失败，无法获取模块信息: {e}")
+    
+    CreateToolhelp32Snapshot = kernel32.CreateToolhelp32Snapshot
+    CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+    CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    
+    Process32FirstW = kernel32.Process32FirstW
+    Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+    Process32FirstW.restype = wintypes.BOOL
+    
+    Process32NextW = kernel32.Process32NextW
+    Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+    Process32NextW.restype = wintypes.BOOL
+    
+    QueryFullProcessImageNameW = kernel32.QueryFullProcessImageNameW
+    QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR, ctypes.POINTER(wintypes.DWORD)]
+    QueryFullProcessImageNameW.restype = wintypes.BOOL
+    
+    # 获取模块信息所需API
+    try:
+        from ctypes import byref, sizeof, Structure
+    
+        class MODULEINFO(Structure):
+            _fields_ = [
+                ("lpBaseOfDll", ctypes.c_void_p),
+                ("SizeOfImage", wintypes.DWORD),
+                ("EntryPoint", ctypes.c_void_p),
+            ]
+    
+        # 尝试加载psapi.dll以获取模块信息
+        psapi = ctypes.WinDLL('psapi', use_last_error=True)
+        GetModuleInformation = psapi.GetModuleInformation
+        GetModuleInformation.argtypes = [wintypes.HANDLE, wintypes.HMODULE, ctypes.POINTER(MODULEINFO), wintypes.DWORD]
+        GetModuleInformation.restype = wintypes.BOOL
+    except Exception as e:
+        print(f"加载psapi.dll失败，无法获取模块信息: {e}")
 
 class ProcessInfo:
     """进程信息类，存储进程的基本信息"""
@@ -63,6 +115,10 @@ class ProcessInfo:
         """打开进程获取句柄"""
         if self.handle:
             return True
+        
+        if OpenProcess is None:
+            print("当前系统不支持读取进程内存")
+            return False
             
         self.handle = OpenProcess(PROCESS_QUERY_INFORMATION | PROCESS_VM_READ, False, self.pid)
         if not self.handle or self.handle == 0:
@@ -102,64 +158,151 @@ class ProcessInfo:
         
         return buffer.raw
 
-def find_process_by_name(process_name: str) -> List[ProcessInfo]:
-    """根据进程名查找进程
+# 进程列举函数，返回(pid, 进程名, 可执行文件路径)列表，可通过set_process_lister替换
+ProcessLister = Callable[[], List[Tuple[int, str, str]]]
+
+_process_lister: Optional[ProcessLister] = None
+_snapshot_cache: Optional[Tuple[float, List[Tuple[int, str, str]]]] = None
+
+def _list_processes_psutil() -> List[Tuple[int, str, str]]:
+    """使用psutil列出所有进程"""
+    processes = []
+    for proc in psutil.process_iter(['pid', 'name', 'exe']):
+        info = proc.info
+        processes.append((info['pid'], info.get('name') or '', info.get('exe') or ''))
+    return processes
+
+def _query_process_path(pid: int) -> str:
+    """查询进程的可执行文件路径，权限不足时返回空字符串"""
+    handle = OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return ""
+    try:
+        size = wintypes.DWORD(1024)
+        buffer = ctypes.create_unicode_buffer(size.value)
+        if QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+            return buffer.value
+        return ""
+    finally:
+        CloseHandle(handle)
+
+def _list_processes_toolhelp() -> List[Tuple[int, str, str]]:
+    """使用Toolhelp快照API列出所有进程，只需一次系统调用即可获得完整的进程列表"""
+    snapshot = CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if not snapshot or snapshot == INVALID_HANDLE_VALUE:
+        raise OSError(ctypes.get_last_error(), "创建进程快照失败")
+    
+    processes = []
+    try:
+        entry = PROCESSENTRY32W()
+        entry.dwSize = ctypes.sizeof(PROCESSENTRY32W)
+        ok = Process32FirstW(snapshot, ctypes.byref(entry))
+        while ok:
+            processes.append((entry.th32ProcessID, entry.szExeFile, ""))
+            ok = Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        CloseHandle(snapshot)
+    return processes
+
+def _default_process_lister() -> Optional[ProcessLister]:
+    """选择当前系统可用的进程列举方式"""
+    if HAS_PSUTIL:
+        return _list_processes_psutil
+    if CreateToolhelp32Snapshot is not None:
+        return _list_processes_toolhelp
+    return None
+
+def set_process_lister(lister: Optional[ProcessLister]) -> None:
+    """
+    替换进程列举函数，并清空快照缓存
+    
+    便于在非Windows系统上用模拟的进程列表测试或基准测试进程查找逻辑，传入None恢复默认实现。
+    """
+    global _process_lister, _snapshot_cache
+    _process_lister = lister
+    _snapshot_cache = None
+
+def take_process_snapshot(max_age: float = PROCESS_SNAPSHOT_TTL) -> List[Tuple[int, str, str]]:
+    """
+    获取当前的进程列表
     
     Args:
-        process_name: 进程名称，例如 'WeChat.exe'
+        max_age: 可接受的缓存快照的最大时长（秒），为0时总是重新列举
     
     Returns:
-        进程信息列表
+        (pid, 进程名, 可执行文件路径)列表，当前系统不支持进程列举时返回空列表
     """
-    processes = []
+    global _snapshot_cache
+    now = time.monotonic()
+    if _snapshot_cache is not None and now - _snapshot_cache[0] <= max_age:
+        return _snapshot_cache[1]
+    
+    lister = _process_lister or _default_process_lister()
+    if lister is None:
+        print("当前系统不支持枚举进程")
+        return []
     
-    # 使用WMIC获取进程信息
     try:
-        print(f"正在搜索进程: {process_name}")
-        output = subprocess.check_output(['wmic', 'process', 'where', f'name="{process_name}"', 'get', 'processid,executablepath', '/format:csv']).decode('utf-8', errors='ignore')
-        lines = output.strip().split('\n')
-        
-        if len(lines) <= 1:  # 只有标题行，没有数据
-            print(f"未找到进程: {process_name}")
-            
-            # 尝试查找所有进程，看看是否有类似名称的进程
-            try:
-                all_processes = subprocess.check_output(['wmic', 'process', 'get', 'name', '/format:csv']).decode('utf-8', errors='ignore')
-                all_lines = all_processes.strip().split('\n')
-                
-                similar_processes = []
-                for line in all_lines[1:]:  # 跳过标题行
-                    if 'wechat' in line.lower() or 'wx' in line.lower() or 'weixin' in line.lower():
-                        similar_processes.append(line.strip())
-                
-                if similar_processes:
-                    print(f"找到以下可能是微信的进程：")
-                    for p in similar_processes:
-                        print(f"- {p}")
-            except Exception as e:
-                print(f"尝试查找类似进程时出错: {e}")
-                
-            return processes
-            
-        print(f"找到 {len(lines)-1} 个 {process_name} 进程")
-        for line in lines[1:]:  # 跳过标题行
-            parts = line.strip().split(',')
-            if len(parts) >= 3:
-                try:
-                    _, path, pid_str = parts
-                    pid = int(pid_str)
-                    print(f"找到进程 PID: {pid}, 路径: {path}")
-                    processes.append(ProcessInfo(pid, process_name, path))
-                except (ValueError, IndexError) as e:
-                    print(f"解析进程信息失败: {e}, 行内容: {line}")
-                    pass
-    except subprocess.CalledProcessError as e:
-        print(f"执行wmic命令失败: {e}")
+        processes = lister()
     except Exception as e:
-        print(f"查找进程时出错: {e}")
+        print(f"枚举进程时出错: {e}")
+        return []
     
+    _snapshot_cache = (now, processes)
     return processes
 
+def find_processes_by_names(process_names: Iterable[str],
+                            max_age: float = PROCESS_SNAPSHOT_TTL) -> Dict[str, List[ProcessInfo]]:
+    """根据多个进程名在同一个进程快照中查找进程
+    
+    Args:
+        process_names: 进程名称列表，例如 ['WeChat.exe', 'WXWork.exe']，不区分大小写
+        max_age: 可接受的缓存快照的最大时长（秒）
+    
+    Returns:
+        进程名 -> 进程信息列表，保持process_names的顺序，未找到的进程名对应空列表
+    """
+    process_names = list(process_names)
+    targets = {name.lower(): name for name in process_names}
+    found = {name: [] for name in process_names}
+    
+    print(f"正在搜索进程: {', '.join(process_names)}")
+    snapshot = take_process_snapshot(max_age)
+    for pid, name, path in snapshot:
+        target = targets.get(name.lower())
+        if target is None:
+            continue
+        if not path and QueryFullProcessImageNameW is not None:
+            path = _query_process_path(pid)
+        print(f"找到进程 PID: {pid}, 路径: {path}")
+        found[target].append(ProcessInfo(pid, target, path))
+    
+    if snapshot and not any(found.values()):
+        print(f"未找到进程: {', '.join(process_names)}")
+        
+        # 在同一个快照中查找名称相似的进程
+        similar_processes = sorted({
+            name for _, name, _ in snapshot
+            if any(keyword in name.lower() for keyword in SIMILAR_PROCESS_KEYWORDS)
+        })
+        if similar_processes:
+            print("找到以下可能是微信的进程：")
+            for name in similar_processes:
+                print(f"- {name}")
+    
+    return found
+
+def find_process_by_name(process_name: str) -> List[ProcessInfo]:
+    """根据进程名查找进程
+    
+    Args:
+        process_name: 进程名称，例如 'WeChat.exe'
+    
+    Returns:
+        进程信息列表
+    """
+    return find_processes_by_names([process_name])[process_name]
+
 def find_wechat_key_in_memory(process: ProcessInfo) -> Optional[bytes]:
     """
     从微信进程内存中查找数据库密钥
@@ -200,8 +343,11 @@ def get_wechat_key() -> Optional[bytes]:
     # 先检查常规的微信进程名
     wechat_process_names = ['WeChat.exe', 'WeChatApp.exe', 'WXWork.exe']
     
+    # 只列举一次进程，所有进程名都在同一个快照中匹配
+    found_processes = find_processes_by_names(wechat_process_names)
+    
     for process_name in wechat_process_names:
-        processes = find_process_by_name(process_name)
+        processes = found_processes[process_name]
         
         if processes:
             print(f"找到 {len(processes)} 个 {process_name} 进程")
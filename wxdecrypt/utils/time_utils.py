@@ -0,0 +1,112 @@
+"""
+消息时间处理工具
+时间戳以int64数组整体换算，不逐条构造datetime；秒和毫秒时间戳自动识别（QQ NT使用毫秒），
+时区可以通过set_default_timezone或环境变量WXDECRYPT_TIMEZONE（如Asia/Shanghai）设置，
+默认使用系统时区。可读的时间字符串只在导出时通过format_times生成。
+numpy和pandas在用到时才导入，只需要SQL表达式或解析时间的模块（如搜索）不会加载它们
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+TIMEZONE_ENV = 'WXDECRYPT_TIMEZONE'
+
+# 大于该值的时间戳视为毫秒（按秒计已是5000年之后）
+MILLISECOND_THRESHOLD = 10 ** 11
+
+# 聚合统计的时间桶长度（秒）。15分钟是所有时区偏移（如+05:45）的公约数，
+# 按桶换算到任意时区的小时和日期都不会出错
+BUCKET_SECONDS = 900
+
+DEFAULT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_default_timezone = None
+
+def set_default_timezone(tz: Optional[str]) -> None:
+    """设置默认时区，为None时恢复为环境变量或系统时区"""
+    global _default_timezone
+    _default_timezone = tz
+
+def resolve_timezone(tz=None):
+    """
+    确定换算使用的时区
+
+    优先级：参数 > set_default_timezone > 环境变量WXDECRYPT_TIMEZONE > 系统时区
+    """
+    tz = tz or _default_timezone or os.environ.get(TIMEZONE_ENV)
+    if tz:
+        return tz
+    # dateutil随pandas一起安装，tzlocal会处理系统时区的夏令时
+    from dateutil.tz import tzlocal
+    return tzlocal()
+
+def utc_offset_seconds(tz=None) -> int:
+    """时区当前相对UTC的偏移（秒），用于在SQLite中直接按本地日期分组"""
+    import pandas as pd
+    return int(pd.Timestamp.now(tz=resolve_timezone(tz)).utcoffset().total_seconds())
+
+def sql_epoch_seconds(column: str) -> str:
+    """返回把列换算为整数秒的SQL表达式，毫秒时间戳在SQLite中直接换算"""
+    value = f'CAST("{column}" AS INTEGER)'
+    return f'(CASE WHEN {value} > {MILLISECOND_THRESHOLD} THEN {value} / 1000 ELSE {value} END)'
+
+def normalize_epoch(values) -> 'np.ndarray':
+    """把时间戳数组换算为int64秒，逐个元素识别毫秒"""
+    import numpy as np
+    values = np.asarray(values, dtype=np.int64)
+    return np.where(values > MILLISECOND_THRESHOLD, values // 1000, values)
+
+def to_datetime_index(epochs, tz=None) -> 'pd.DatetimeIndex':
+    """把秒级时间戳数组整体换算为指定时区的DatetimeIndex"""
+    import pandas as pd
+    index = pd.DatetimeIndex(pd.to_datetime(normalize_epoch(epochs), unit='s', utc=True))
+    return index.tz_convert(resolve_timezone(tz))
+
+def format_times(epochs, fmt: str = DEFAULT_TIME_FORMAT, tz=None) -> Union[str, 'np.ndarray']:
+    """
+    把时间戳格式化为字符串，只应在导出时调用
+
+    Args:
+        epochs: 单个时间戳或时间戳数组（秒或毫秒）
+        fmt: strftime格式
+        tz: 时区，默认使用resolve_timezone的结果
+
+    Returns:
+        传入单个时间戳时返回字符串，否则返回字符串数组
+    """
+    import numpy as np
+    scalar = np.ndim(epochs) == 0
+    formatted = to_datetime_index(np.atleast_1d(epochs), tz).strftime(fmt)
+    return formatted[0] if scalar else np.asarray(formatted)
+
+def parse_local_time(text: str, end_of_day: bool = False, tz=None) -> int:
+    """
+    把本地时间字符串解析为秒级时间戳
+
+    Args:
+        text: YYYY-MM-DD、YYYY-MM-DD HH:MM或YYYY-MM-DD HH:MM:SS
+        end_of_day: 只有日期时是否取当天的最后一秒，用于时间范围的结束时间
+        tz: 时区，默认使用resolve_timezone的结果
+
+    Raises:
+        ValueError: 无法识别的格式
+    """
+    from dateutil.tz import gettz
+    tz = resolve_timezone(tz)
+    tzinfo = gettz(tz) if isinstance(tz, str) else tz
+    if tzinfo is None:
+        raise ValueError(f"未知的时区: {tz}")
+    text = text.strip()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            value = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d' and end_of_day:
+            value += timedelta(days=1, seconds=-1)
+        return int(value.replace(tzinfo=tzinfo).timestamp())
+    raise ValueError(f"无法识别的时间: {text}")
@@ -0,0 +1,215 @@
+"""
+监视模式，数据库文件发生变化时自动重新解密
+优先使用watchdog（Linux上基于inotify，Windows上基于ReadDirectoryChangesW）获取文件变更通知，
+未安装watchdog时退回到定时轮询
+"""
+import os
+import time
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+# 尝试导入watchdog
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+
+from wxdecrypt.db_decrypt import get_output_path
+
+# 重新解密失败（如数据库被微信锁定、输出文件被其他程序打开）后重试的等待时间（秒），每次失败加倍
+RETRY_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """返回文件的(大小, 修改时间)，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+if HAS_WATCHDOG:
+    class _ChangeHandler(FileSystemEventHandler):
+        """将watchdog事件转发给DatabaseWatcher"""
+
+        def __init__(self, watcher: 'DatabaseWatcher'):
+            super().__init__()
+            self.watcher = watcher
+
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            self.watcher.notify(event.src_path)
+            dest_path = getattr(event, 'dest_path', None)
+            if dest_path:
+                self.watcher.notify(dest_path)
+
+class DatabaseWatcher:
+    """监视数据库文件，变化后经过防抖延迟再重新解密"""
+
+    def __init__(self, output_dir: str, debounce: float = 2.0, poll_interval: float = 5.0,
+                 use_polling: bool = False):
+        """
+        初始化监视器
+
+        Args:
+            output_dir: 解密后数据库的输出目录
+            debounce: 防抖时间（秒），文件在这段时间内没有新的写入才会重新解密
+            poll_interval: 轮询模式下的检查间隔（秒）
+            use_polling: 强制使用轮询模式
+        """
+        self.output_dir = output_dir
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or not HAS_WATCHDOG
+
+        self.jobs = {}  # 规范化路径 -> (解密器, 数据库信息)
+        self.signatures = {}  # 规范化路径 -> 上次解密时的文件签名
+        self.last_seen = {}  # 规范化路径 -> 轮询时最后看到的文件签名
+        self.pending = {}  # 规范化路径 -> 可以重新解密的时间（最后一次变更事件加上防抖时间，或重试时间）
+        self.failures = {}  # 规范化路径 -> 连续失败次数
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.decrypt_count = 0
+
+    def add(self, decryptor, db_infos: List[Dict[str, Any]]) -> None:
+        """添加需要监视的数据库，decryptor需要已经设置好密钥"""
+        for db_info in db_infos:
+            key = os.path.normcase(os.path.abspath(db_info['path']))
+            self.jobs[key] = (decryptor, db_info)
+            self.signatures[key] = self.last_seen[key] = _file_signature(db_info['path'])
+
+    def notify(self, path: str) -> None:
+        """记录一次文件变更，非监视中的文件会被忽略"""
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in self.jobs:
+            return
+        with self.lock:
+            self.pending[key] = max(time.monotonic() + self.debounce, self.pending.get(key, 0))
+
+    def poll(self) -> None:
+        """轮询模式：与上次轮询相比签名发生变化的文件视为一次变更"""
+        for key in self.jobs:
+            signature = _file_signature(key)
+            if signature != self.last_seen.get(key):
+                self.last_seen[key] = signature
+                self.notify(key)
+
+    def flush(self, force: bool = False) -> int:
+        """
+        重新解密防抖时间已过的文件
+
+        Args:
+            force: 忽略防抖时间，立即处理所有待处理的文件
+
+        Returns:
+            本次重新解密的文件数
+        """
+        now = time.monotonic()
+        with self.lock:
+            due = [key for key, ready in self.pending.items() if force or now >= ready]
+            for key in due:
+                del self.pending[key]
+
+        count = 0
+        for key in due:
+            # 单个文件失败不能中断监视，稍后重试
+            try:
+                if self._redecrypt(key):
+                    count += 1
+                self.failures.pop(key, None)
+            except Exception as e:
+                self._retry(key, e)
+        return count
+
+    def _retry(self, key: str, error: Exception) -> None:
+        """重新解密失败后按退避时间重新加入队列，期间有新的变更事件时以较晚的时间为准"""
+        failures = self.failures[key] = self.failures.get(key, 0) + 1
+        delay = min(RETRY_DELAY * 2 ** (failures - 1), RETRY_MAX_DELAY)
+        print(f"重新解密失败: {self.jobs[key][1]['path']}: {error}，{delay:.0f} 秒后重试")
+        with self.lock:
+            self.pending[key] = max(time.monotonic() + delay, self.pending.get(key, 0))
+
+    def _redecrypt(self, key: str) -> bool:
+        """
+        重新解密单个文件，先写入临时文件再替换，保证输出文件始终完整
+
+        Returns:
+            bool: 是否重新解密，文件签名没有变化时为False
+
+        Raises:
+            Exception: 选择密钥、解密或替换输出文件失败，临时文件已删除
+        """
+        decryptor, db_info = self.jobs[key]
+
+        # 事件可能是误报（如仅访问时间变化），签名未变时跳过
+        signature = _file_signature(db_info['path'])
+        if signature is None or signature == self.signatures.get(key):
+            return False
+
+        output_path = get_output_path(db_info, self.output_dir, decryptor.decrypt_qq)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        temp_path = output_path + '.tmp'
+
+        print(f"\n检测到数据库变化，重新解密: {db_info['path']}")
+        start = time.time()
+        try:
+            decryptor.select_key(db_info)
+            if not decryptor.decrypt_db(db_info['path'], temp_path):
+                raise RuntimeError("解密失败，数据库可能正被占用")
+            # 输出文件被其他程序打开时Windows上会失败
+            os.replace(temp_path, output_path)
+        finally:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        self.signatures[key] = signature
+        self.decrypt_count += 1
+        print(f"已更新: {output_path} (耗时 {time.time() - start:.2f} 秒)")
+        return True
+
+    def run(self) -> None:
+        """开始监视，直到调用stop()或按下Ctrl+C"""
+        if not self.jobs:
+            print("没有需要监视的数据库")
+            return
+
+        observer = None
+        if not self.use_polling:
+            observer = Observer()
+            handler = _ChangeHandler(self)
+            for directory in sorted({os.path.dirname(key) for key in self.jobs}):
+                observer.schedule(handler, directory, recursive=False)
+            observer.start()
+            print(f"正在监视 {len(self.jobs)} 个数据库的变化（文件系统通知），按Ctrl+C停止...")
+        else:
+            if not HAS_WATCHDOG:
+                print("未安装watchdog，使用轮询模式（pip install watchdog 可获得实时通知）")
+            print(f"正在监视 {len(self.jobs)} 个数据库的变化（每 {self.poll_interval} 秒轮询），按Ctrl+C停止...")
+
+        # 防抖队列需要频繁检查；轮询模式下每隔poll_interval才比较一次文件签名
+        tick = max(0.1, min(0.5, self.debounce, self.poll_interval))
+        next_poll = 0.0
+        try:
+            while not self.stop_event.wait(tick):
+                if observer is None and time.monotonic() >= next_poll:
+                    self.poll()
+                    next_poll = time.monotonic() + self.poll_interval
+                self.flush()
+        except KeyboardInterrupt:
+            print("\n停止监视")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self.flush(force=True)
+
+        print(f"监视结束，共重新解密 {self.decrypt_count} 次")
+
+    def stop(self) -> None:
+        """停止监视"""
+        self.stop_event.set()
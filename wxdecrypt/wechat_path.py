@@ -4,18 +4,59 @@
 """
 import os
 import re
-import winreg
 import time
-from typing import List, Dict, Optional, Tuple, Union
+import heapq
+import itertools
+from typing import List, Dict, Optional, Tuple, Union, Iterator, Callable
 import platform
-import string
 
-def get_wechat_db_path(search_drives: Optional[List[str]] = None) -> List[Dict[str, str]]:
+from wxdecrypt.discovery_backend import (
+    DiscoveryBackend, get_default_backend, HKEY_CURRENT_USER, HKEY_LOCAL_MACHINE
+)
+
+# 全盘搜索时的路径关键词权重，分值越高的目录越先被探索
+WECHAT_PATH_KEYWORDS = {
+    'WeChat Files': 8,
+    'MicroMsg': 6,
+    'WeChat': 4,
+    'Tencent': 2,
+    'Documents': 1,
+    'Users': 1,
+}
+
+QQ_PATH_KEYWORDS = {
+    'Tencent Files': 8,
+    'QQ': 4,
+    'Tencent': 2,
+    'Documents': 1,
+    'Users': 1,
+}
+
+# 微信文件目录下不属于用户的文件夹
+WECHAT_NON_USER_FOLDERS = {'All Users', 'Applet'}
+
+# 微信主要的聊天记录数据库
+WECHAT_MAIN_DB = 'EnMicroMsg.db'
+
+# SQLite的最小页面大小，小于一页的文件不可能是有效数据库
+MIN_DB_SIZE = 512
+
+# 排除目录列表，这些目录会跳过搜索以提高效率
+GLOBAL_SEARCH_EXCLUDE_DIRS = {
+    'Windows', 'Program Files', 'Program Files (x86)',
+    '$Recycle.Bin', 'System Volume Information',
+}
+
+def get_wechat_db_path(search_drives: Optional[List[str]] = None,
+                       stop_at_first_account: bool = False,
+                       backend: Optional[DiscoveryBackend] = None) -> List[Dict[str, str]]:
     """
     自动识别微信数据库路径
     
     Args:
         search_drives: 指定要搜索的驱动器列表，如['C:', 'D:']。默认为None（自动检测所有驱动器）
+        stop_at_first_account: 全盘搜索时找到第一个完整账号后立即停止
+        backend: 系统访问后端，默认为当前系统的后端（仅Windows可用）
     
     Returns:
         List[Dict[str, str]]: 包含微信数据库路径信息的列表，每个项目为一个用户的数据
@@ -27,56 +68,59 @@ def get_wechat_db_path(search_drives: Optional[List[str]] = None) -> List[Dict[s
     """
     found_dbs = []
     
-    # 检查操作系统类型
-    system = platform.system()
-    if system != 'Windows':
-        print(f"当前只支持Windows系统，您的系统是{system}")
+    # 检查是否有可用的系统访问后端
+    backend = backend or get_default_backend()
+    if backend is None:
+        _print_no_backend()
         return found_dbs
     
     # 1. 首先尝试快速查找方法（基于已知路径）
-    found_dbs = find_wechat_db_by_known_paths()
+    found_dbs = find_wechat_db_by_known_paths(backend)
     
     # 2. 如果没有找到，尝试系统级全局搜索
     if not found_dbs:
         print("未在默认位置找到微信数据库，将进行系统搜索（可能需要较长时间）...")
-        found_dbs = find_wechat_db_by_global_search(search_drives)
+        found_dbs = find_wechat_db_by_global_search(search_drives, stop_at_first_account, backend)
     
     return found_dbs
 
-def find_wechat_db_by_known_paths() -> List[Dict[str, str]]:
+def find_wechat_db_by_known_paths(backend: Optional[DiscoveryBackend] = None) -> List[Dict[str, str]]:
     """基于已知路径模式快速查找微信数据库"""
     found_dbs = []
     
+    backend = backend or get_default_backend()
+    if backend is None:
+        return found_dbs
+    
     # 尝试多个可能的路径
     possible_paths = []
     
     # 1. 从注册表获取路径
-    registry_path = get_wechat_path_from_registry()
+    registry_path = get_wechat_path_from_registry(backend)
     if registry_path:
         possible_paths.append(registry_path)
     
-    # 2. 默认路径
-    user_profile = os.environ.get('USERPROFILE', '')
-    default_paths = [
-        os.path.join(user_profile, 'Documents', 'WeChat Files'),
-        os.path.join(user_profile, 'Documents', 'Tencent Files'),
-        os.path.join(user_profile, 'Documents', 'My Documents', 'WeChat Files'),
-        os.path.join(user_profile, 'WeChat Files'),
-        os.path.join("C:\\", "Program Files (x86)", "Tencent", "WeChat", "WeChat Files"),
-        os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'WeChat'),
-        os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'MicroMsg')
-    ]
+    # 2. 默认路径（每个用户配置文件各一组）
+    for user_profile in backend.user_profiles():
+        possible_paths.extend([
+            os.path.join(user_profile, 'Documents', 'WeChat Files'),
+            os.path.join(user_profile, 'Documents', 'Tencent Files'),
+            os.path.join(user_profile, 'Documents', 'My Documents', 'WeChat Files'),
+            os.path.join(user_profile, 'WeChat Files'),
+            os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'WeChat'),
+            os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'MicroMsg')
+        ])
     
-    possible_paths.extend(default_paths)
+    possible_paths.append(backend.to_local_path(r"C:\Program Files (x86)\Tencent\WeChat\WeChat Files"))
     
-    # 去重并筛选存在的路径
-    unique_paths = []
-    for path in possible_paths:
-        if path and os.path.exists(path) and path not in unique_paths:
-            unique_paths.append(path)
+    # 合并为互不重叠的最小根目录集合（同一目录可能同时来自注册表和默认路径）
+    unique_paths = plan_search_roots(possible_paths)
     
     if not unique_paths:
         return found_dbs
+    
+    # 已访问的目录和文件，保证每个文件只被访问一次
+    visited = set()
         
     # 从所有可能的路径中查找数据库
     for wechat_files_path in unique_paths:
@@ -86,217 +130,382 @@ def find_wechat_db_by_known_paths() -> List[Dict[str, str]]:
         try:
             wechat_user_folders = [
                 folder for folder in os.listdir(wechat_files_path)
-                if os.path.isdir(os.path.join(wechat_files_path, folder)) and folder != 'All Users' and folder != 'Applet'
+                if os.path.isdir(os.path.join(wechat_files_path, folder)) and is_wechat_user_folder(folder)
             ]
         except Exception as e:
             print(f"无法读取目录 {wechat_files_path}: {e}")
             continue
         
         # 查找每个用户的数据库
+        # Msg、MsgDB、Db、MicroMsg等数据库目录都位于用户目录之下，遍历一次用户目录即可全部覆盖
         for user_folder in wechat_user_folders:
             user_path = os.path.join(wechat_files_path, user_folder)
             
-            # 可能的数据库目录
-            possible_db_dirs = [
-                os.path.join(user_path, 'Msg'),
-                os.path.join(user_path, 'MsgDB'),
-                os.path.join(user_path, 'Db'),
-                os.path.join(user_path, 'MicroMsg'),  # 特别关注的路径，包含EnMicroMsg.db
-                user_path
-            ]
-            
-            for db_dir in possible_db_dirs:
-                if not os.path.exists(db_dir):
+            for root, entry in _iter_unique_files(user_path, visited, is_wechat_db_file):
+                file = entry.name
+                file_info = entry_file_info(entry)
+                if file_info is None:
                     continue
                 
-                # 查找数据库文件
-                for root, dirs, files in os.walk(db_dir):
-                    for file in files:
-                        # 特别关注 EnMicroMsg.db，这是微信主要的聊天记录数据库
-                        if file == 'EnMicroMsg.db' or file.endswith('.db'):
-                            db_path = os.path.join(root, file)
-                            
-                            # 如果是EnMicroMsg.db，标记为主要数据库
-                            is_main_db = (file == 'EnMicroMsg.db')
-                            
-                            found_dbs.append({
-                                'username': user_folder,
-                                'wxid': _extract_wxid_from_path(user_folder),
-                                'path': db_path,
-                                'db_name': file,
-                                'is_main_db': is_main_db
-                            })
+                # 如果是EnMicroMsg.db，标记为主要数据库
+                is_main_db = (file == WECHAT_MAIN_DB)
+                
+                found_dbs.append({
+                    'username': user_folder,
+                    'wxid': _extract_wxid_from_path(user_folder),
+                    'path': entry.path,
+                    'db_name': file,
+                    'is_main_db': is_main_db,
+                    **file_info
+                })
     
     return found_dbs
 
-def find_wechat_db_by_global_search(search_drives: Optional[List[str]] = None) -> List[Dict[str, str]]:
+def is_wechat_user_folder(folder: str) -> bool:
+    """判断微信文件目录下的文件夹是否为用户文件夹"""
+    return folder not in WECHAT_NON_USER_FOLDERS
+
+def is_wechat_db_file(file: str) -> bool:
+    """判断用户文件夹中的文件是否为微信数据库，特别关注EnMicroMsg.db"""
+    return file == WECHAT_MAIN_DB or file.endswith('.db')
+
+def is_qq_db_file(file: str) -> bool:
+    """判断文件是否为QQ消息数据库，通常是Msg*.db，特别是Msg3.0.db"""
+    return file.startswith('Msg') and file.endswith('.db')
+
+def entry_file_info(entry: os.DirEntry) -> Optional[Dict[str, int]]:
+    """
+    从scandir条目读取文件大小、修改时间和inode
+    
+    Windows上大小和修改时间在目录遍历时已经返回，不需要额外的系统调用；
+    空文件或不足一页的文件返回None，调用方可以直接丢弃。
+    
+    Args:
+        entry: os.scandir返回的条目
+    
+    Returns:
+        包含size、mtime、inode的字典，文件无法访问或过小时返回None
+    """
+    try:
+        st = entry.stat()
+        inode = entry.inode()
+    except OSError:
+        return None
+    if st.st_size < MIN_DB_SIZE:
+        return None
+    return {'size': st.st_size, 'mtime': st.st_mtime, 'inode': inode}
+
+def plan_search_roots(paths: List[str]) -> List[str]:
+    """
+    将候选根目录规划为互不重叠的最小集合
+    
+    不存在的路径会被过滤；指向同一位置的路径（符号链接、目录联接、大小写不同）
+    按真实路径合并；位于其他候选目录之下的路径会被丢弃，因为遍历上层目录时已经覆盖。
+    
+    Args:
+        paths: 候选根目录列表，顺序即优先顺序
+    
+    Returns:
+        List[str]: 去重后的真实路径列表，保持原有顺序
+    """
+    real_paths = []
+    for path in paths:
+        if not path or not os.path.isdir(path):
+            continue
+        real_path = os.path.realpath(path)
+        if all(_path_key(real_path) != _path_key(p) for p in real_paths):
+            real_paths.append(real_path)
+    
+    planned = []
+    for path in real_paths:
+        covered = any(
+            other != path and _is_subpath(path, other)
+            for other in real_paths
+        )
+        if not covered:
+            planned.append(path)
+    
+    return planned
+
+def _path_key(path: str) -> str:
+    """用于比较的规范化路径（Windows上不区分大小写）"""
+    return os.path.normcase(os.path.normpath(path))
+
+def _is_subpath(path: str, parent: str) -> bool:
+    """判断path是否位于parent目录之下"""
+    path_key, parent_key = _path_key(path), _path_key(parent)
+    try:
+        return os.path.commonpath([path_key, parent_key]) == parent_key
+    except ValueError:
+        # 不同驱动器上的路径没有公共前缀
+        return False
+
+def _file_identity(kind: str, path: str) -> Tuple:
+    """
+    文件或目录的去重标识：(设备号, inode)
+    
+    inode只在同一卷内唯一，需要带上设备号。DirEntry.stat()在Windows上不填充这两个值，
+    这里使用os.stat；仍然为0时（部分文件系统）退回真实路径
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    if st is not None and st.st_dev and st.st_ino:
+        return (kind, st.st_dev, st.st_ino)
+    return (kind, _path_key(os.path.realpath(path)))
+
+def _iter_unique_files(top: str, visited: set,
+                       name_filter: Optional[Callable[[str], bool]] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    遍历目录树并按(设备号, inode)去重
+    
+    通过符号链接或目录联接再次到达的目录、以及已经访问过的文件都会被跳过，
+    同一次查找中共享visited集合即可保证每个文件只产出一次。
+    
+    Args:
+        top: 起始目录
+        visited: 已访问的目录和文件标识集合，会被原地更新
+        name_filter: 按文件名筛选，只有通过的文件才需要读取去重标识
+    
+    Yields:
+        (所在目录, os.DirEntry)
+    """
+    stack = [top]
+    while stack:
+        root = stack.pop()
+        dir_key = _file_identity('dir', root)
+        if dir_key in visited:
+            continue
+        visited.add(dir_key)
+        
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                    continue
+            except OSError:
+                continue
+            # 先按文件名筛选，用户目录中大量的图片、视频等文件不需要额外的系统调用
+            if name_filter is not None and not name_filter(entry.name):
+                continue
+            
+            file_key = _file_identity('file', entry.path)
+            if file_key in visited:
+                continue
+            visited.add(file_key)
+            yield root, entry
+        
+        # 逆序入栈，保持与os.walk相同的自顶向下遍历顺序
+        stack.extend(reversed(subdirs))
+
+# PC版微信账号目录（wxid_xxx）下Msg目录中的主数据库和消息分片
+PC_MAIN_DB = 'MicroMsg.db'
+PC_MSG_SHARD = re.compile(r'^MSG\d+\.db$', re.IGNORECASE)
+
+def _pc_account_files(msg_dir: str) -> List[Tuple[str, os.DirEntry]]:
+    """
+    检查PC版微信账号的Msg目录是否完整，完整时返回其中（含Multi等子目录）的全部数据库
+    
+    完整的账号需要有Msg/MicroMsg.db和至少一个消息分片（Msg/Multi/MSG0.db等）
+    
+    Returns:
+        List[Tuple[str, os.DirEntry]]: (所在目录, os.DirEntry)，账号不完整时为空列表
+    """
+    files = list(_iter_unique_files(msg_dir, set(), lambda name: name.endswith('.db')))
+    has_main_db = any(root == msg_dir and entry.name == PC_MAIN_DB for root, entry in files)
+    has_shard = any(PC_MSG_SHARD.match(entry.name) for _, entry in files)
+    return files if has_main_db and has_shard else []
+
+def find_wechat_db_by_global_search(search_drives: Optional[List[str]] = None,
+                                    stop_at_first_account: bool = False,
+                                    backend: Optional[DiscoveryBackend] = None) -> List[Dict[str, str]]:
     """
     通过全局搜索查找微信数据库文件
     
+    使用优先队列按路径评分进行最佳优先遍历，包含'WeChat Files'、'MicroMsg'、
+    'Tencent'等关键词的目录会先于其他目录被探索。
+    
     Args:
         search_drives: 要搜索的驱动器列表，如果为None则搜索所有可用驱动器
+        stop_at_first_account: 找到第一个完整账号后立即停止：Android版为EnMicroMsg.db及其同目录数据库，
+            PC版为Msg目录中的MicroMsg.db及消息分片，停止前会读取完该账号的Msg目录
+        backend: 系统访问后端，用于确定默认的搜索起点
     
     Returns:
         List[Dict[str, str]]: 找到的数据库信息列表
     """
     found_dbs = []
+    found_paths = set()
     
     # 如果未指定驱动器，获取所有可用驱动器
     if not search_drives:
-        search_drives = get_available_drives()
+        search_drives = get_available_drives(backend)
         print(f"将在这些驱动器中搜索: {', '.join(search_drives)}")
     
     # 在每个驱动器中搜索
     target_files = ['EnMicroMsg.db']  # 重点查找的文件
     
-    # 排除目录列表，这些目录会跳过搜索以提高效率
-    exclude_dirs = [
-        'Windows', 'Program Files', 'Program Files (x86)',
-        '$Recycle.Bin', 'System Volume Information',
-    ]
+    def add(root, entry, is_main_db, path_priority, related):
+        file_info = entry_file_info(entry)
+        if file_info is None or entry.path in found_paths:
+            return
+        found_paths.add(entry.path)
+        found_dbs.append({
+            'username': os.path.basename(os.path.dirname(root)) if 'MicroMsg' in root else 'unknown',
+            'wxid': _extract_wxid_from_path(root),
+            'path': entry.path,
+            'db_name': entry.name,
+            'is_main_db': is_main_db,
+            'priority': path_priority,  # 路径优先级
+            **file_info
+        })
+        if related:
+            print(f"找到相关数据库: {entry.path}")
+        else:
+            print(f"找到可能的微信数据库: {entry.path}")
     
     # 搜索每个驱动器
     for drive in search_drives:
         print(f"\n开始搜索驱动器 {drive}，寻找微信数据库...")
         
-        for root, dirs, files in os.walk(drive):
-            # 排除系统目录和临时文件夹
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
+        for root, dirs, files, path_priority in _best_first_walk(drive, WECHAT_PATH_KEYWORDS,
+                                                                 GLOBAL_SEARCH_EXCLUDE_DIRS):
+            # 如果找到EnMicroMsg.db，同目录下的其他数据库文件一并视为该账号的数据库
+            has_main_db = any(entry.name in target_files for entry in files)
+            if has_main_db:
+                matched = sorted((e for e in files if e.name.endswith('.db')),
+                                 key=lambda e: e.name not in target_files)
+            else:
+                matched = [e for e in files if e.name.endswith('.db') and 'wx' in root.lower()]
             
-            # 如果路径中包含某些关键词，优先处理，这可以加速找到数据库的速度
-            path_priority = 0
-            if 'Tencent' in root or 'WeChat' in root or 'MicroMsg' in root:
-                path_priority = 1
-                
-            # 检查文件
-            for file in files:
-                if file in target_files or (file.endswith('.db') and 'wx' in root.lower()):
-                    # 找到可能的微信数据库
-                    db_path = os.path.join(root, file)
-                    
-                    # 尝试提取用户信息
-                    username = os.path.basename(os.path.dirname(root)) if 'MicroMsg' in root else 'unknown'
-                    wxid = _extract_wxid_from_path(root)
-                    
-                    # 优先级：EnMicroMsg.db > 其他.db文件
-                    is_main_db = (file == 'EnMicroMsg.db')
-                    
-                    found_dbs.append({
-                        'username': username,
-                        'wxid': wxid,
-                        'path': db_path,
-                        'db_name': file,
-                        'is_main_db': is_main_db,
-                        'priority': path_priority  # 路径优先级
-                    })
-                    
-                    # 打印找到的文件
-                    print(f"找到可能的微信数据库: {db_path}")
-                    
-                    # 如果找到EnMicroMsg.db，尝试提取更多相关文件
-                    if is_main_db:
-                        parent_dir = os.path.dirname(db_path)
-                        # 查找同目录下的其他数据库文件
-                        for other_file in os.listdir(parent_dir):
-                            if other_file != file and other_file.endswith('.db'):
-                                other_path = os.path.join(parent_dir, other_file)
-                                found_dbs.append({
-                                    'username': username,
-                                    'wxid': wxid,
-                                    'path': other_path,
-                                    'db_name': other_file,
-                                    'is_main_db': False,
-                                    'priority': path_priority
-                                })
-                                print(f"找到相关数据库: {other_path}")
+            # PC版账号：Msg目录中有MicroMsg.db时读取完整个Msg目录（含Multi中的消息分片），完整即停止
+            if (stop_at_first_account and os.path.basename(root).lower() == 'msg'
+                    and any(entry.name == PC_MAIN_DB for entry in files)):
+                account_files = _pc_account_files(root)
+                if account_files:
+                    for db_root, entry in account_files:
+                        add(db_root, entry, entry.name == PC_MAIN_DB, path_priority, entry.name != PC_MAIN_DB)
+                    print("已找到完整的微信账号数据库，停止搜索")
+                    return found_dbs
+            
+            if not matched:
+                continue
+            
+            # 优先级：EnMicroMsg.db > 其他.db文件
+            for entry in matched:
+                is_main_db = entry.name in target_files
+                add(root, entry, is_main_db, path_priority, has_main_db and not is_main_db)
+            
+            if has_main_db and stop_at_first_account:
+                print("已找到完整的微信账号数据库，停止搜索")
+                return found_dbs
     
     # 按优先级排序结果
     found_dbs.sort(key=lambda x: (-x.get('priority', 0), -x.get('is_main_db', False)))
     
     return found_dbs
 
-def get_qq_db_path(search_drives: Optional[List[str]] = None) -> List[Dict[str, str]]:
+def get_qq_db_path(search_drives: Optional[List[str]] = None,
+                   stop_at_first_account: bool = False,
+                   backend: Optional[DiscoveryBackend] = None) -> List[Dict[str, str]]:
     """
     自动识别QQ数据库路径
     
     Args:
         search_drives: 指定要搜索的驱动器列表，如['C:', 'D:']。默认为None（自动检测所有驱动器）
+        stop_at_first_account: 全盘搜索时找到第一个完整账号后立即停止
+        backend: 系统访问后端，默认为当前系统的后端（仅Windows可用）
     
     Returns:
         List[Dict[str, str]]: 包含QQ数据库路径信息的列表
     """
     found_dbs = []
     
-    # 检查操作系统类型
-    system = platform.system()
-    if system != 'Windows':
-        print(f"当前只支持Windows系统，您的系统是{system}")
+    # 检查是否有可用的系统访问后端
+    backend = backend or get_default_backend()
+    if backend is None:
+        _print_no_backend()
         return found_dbs
     
     # 1. 首先尝试快速查找方法
-    found_dbs = find_qq_db_by_known_paths()
+    found_dbs = find_qq_db_by_known_paths(backend)
     
     # 2. 如果没有找到，尝试系统级全局搜索
     if not found_dbs:
         print("未在默认位置找到QQ数据库，将进行系统搜索（可能需要较长时间）...")
-        found_dbs = find_qq_db_by_global_search(search_drives)
+        found_dbs = find_qq_db_by_global_search(search_drives, stop_at_first_account, backend)
     
     return found_dbs
 
-def find_qq_db_by_known_paths() -> List[Dict[str, str]]:
+def find_qq_db_by_known_paths(backend: Optional[DiscoveryBackend] = None) -> List[Dict[str, str]]:
     """基于已知路径模式快速查找QQ数据库"""
     found_dbs = []
     
-    # QQ可能的数据文件夹路径
-    user_profile = os.environ.get('USERPROFILE', '')
-    qq_paths = [
-        os.path.join(user_profile, 'Documents', 'Tencent Files'),
-        os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'QQ'),
-        os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'QQMiniDL'),
-        os.path.join(user_profile, 'Documents', 'My Documents', 'Tencent Files')
-    ]
+    backend = backend or get_default_backend()
+    if backend is None:
+        return found_dbs
+    
+    # QQ可能的数据文件夹路径（每个用户配置文件各一组）
+    qq_paths = []
+    for user_profile in backend.user_profiles():
+        qq_paths.extend([
+            os.path.join(user_profile, 'Documents', 'Tencent Files'),
+            os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'QQ'),
+            os.path.join(user_profile, 'AppData', 'Roaming', 'Tencent', 'QQMiniDL'),
+            os.path.join(user_profile, 'Documents', 'My Documents', 'Tencent Files')
+        ])
     
     # 尝试从注册表获取QQ路径
-    try:
-        key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Tencent\QQ")
-        install_path = winreg.QueryValueEx(key, "Path")[0]
-        if install_path and os.path.exists(install_path):
-            qq_paths.append(install_path)
-        winreg.CloseKey(key)
-    except Exception:
-        pass
+    install_path = backend.registry_value(HKEY_CURRENT_USER, r"Software\Tencent\QQ", "Path")
+    if install_path:
+        qq_paths.append(backend.to_local_path(install_path))
+    
+    # 已访问的目录和文件，保证每个文件只被访问一次
+    visited = set()
     
     # 查找所有可能的QQ数据库文件
-    for qq_path in qq_paths:
-        if not os.path.exists(qq_path):
-            continue
-            
+    for qq_path in plan_search_roots(qq_paths):
         print(f"检查QQ路径: {qq_path}")
         
         # 递归查找所有Msg*.db文件
-        for root, dirs, files in os.walk(qq_path):
-            for file in files:
-                # QQ消息数据库通常是Msg*.db，特别是Msg3.0.db
-                if file.startswith('Msg') and file.endswith('.db'):
-                    db_path = os.path.join(root, file)
-                    
-                    # 尝试从路径提取QQ号
-                    qqid = _extract_qqid_from_path(root)
-                    
-                    found_dbs.append({
-                        'qqid': qqid,
-                        'path': db_path,
-                        'db_name': file
-                    })
+        for root, entry in _iter_unique_files(qq_path, visited, is_qq_db_file):
+            file = entry.name
+            file_info = entry_file_info(entry)
+            if file_info is None:
+                continue
+            
+            # 尝试从路径提取QQ号
+            qqid = _extract_qqid_from_path(root)
+            
+            found_dbs.append({
+                'qqid': qqid,
+                'path': entry.path,
+                'db_name': file,
+                **file_info
+            })
     
     return found_dbs
 
-def find_qq_db_by_global_search(search_drives: Optional[List[str]] = None) -> List[Dict[str, str]]:
+def find_qq_db_by_global_search(search_drives: Optional[List[str]] = None,
+                                stop_at_first_account: bool = False,
+                                backend: Optional[DiscoveryBackend] = None) -> List[Dict[str, str]]:
     """
     通过全局搜索查找QQ数据库文件
     
+    与微信的全局搜索相同，使用最佳优先遍历优先探索包含'Tencent Files'、'QQ'等关键词的目录。
+    
     Args:
         search_drives: 要搜索的驱动器列表，如果为None则搜索所有可用驱动器
+        stop_at_first_account: 找到第一个包含Msg3.0.db的账号目录后立即停止
+        backend: 系统访问后端，用于确定默认的搜索起点
     
     Returns:
         List[Dict[str, str]]: 找到的数据库信息列表
@@ -305,36 +514,31 @@ def find_qq_db_by_global_search(search_drives: Optional[List[str]] = None) -> Li
     
     # 如果未指定驱动器，获取所有可用驱动器
     if not search_drives:
-        search_drives = get_available_drives()
+        search_drives = get_available_drives(backend)
         print(f"将在这些驱动器中搜索: {', '.join(search_drives)}")
     
     # 在每个驱动器中搜索
     target_files = ['Msg3.0.db']  # 重点查找的文件
     
-    # 排除目录列表，这些目录会跳过搜索以提高效率
-    exclude_dirs = [
-        'Windows', 'Program Files', 'Program Files (x86)',
-        '$Recycle.Bin', 'System Volume Information',
-    ]
-    
     # 搜索每个驱动器
     for drive in search_drives:
         print(f"\n开始搜索驱动器 {drive}，寻找QQ数据库...")
         
-        for root, dirs, files in os.walk(drive):
-            # 排除系统目录和临时文件夹
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
+        for root, dirs, files, path_priority in _best_first_walk(drive, QQ_PATH_KEYWORDS,
+                                                                 GLOBAL_SEARCH_EXCLUDE_DIRS):
+            has_main_db = False
             
-            # 如果路径中包含某些关键词，优先处理
-            path_priority = 0
-            if 'Tencent' in root or 'QQ' in root:
-                path_priority = 1
-                
             # 检查文件
-            for file in files:
-                if file in target_files or (file.startswith('Msg') and file.endswith('.db')):
+            for entry in files:
+                file = entry.name
+                if file in target_files or is_qq_db_file(file):
+                    file_info = entry_file_info(entry)
+                    if file_info is None:
+                        continue
+                    
                     # 找到可能的QQ数据库
-                    db_path = os.path.join(root, file)
+                    db_path = entry.path
+                    has_main_db = has_main_db or file in target_files
                     
                     # 尝试提取QQ号
                     qqid = _extract_qqid_from_path(root)
@@ -343,79 +547,145 @@ def find_qq_db_by_global_search(search_drives: Optional[List[str]] = None) -> Li
                         'qqid': qqid,
                         'path': db_path,
                         'db_name': file,
-                        'priority': path_priority  # 路径优先级
+                        'priority': path_priority,  # 路径优先级
+                        **file_info
                     })
                     
                     # 打印找到的文件
                     print(f"找到可能的QQ数据库: {db_path}")
+            
+            if has_main_db and stop_at_first_account:
+                print("已找到完整的QQ账号数据库，停止搜索")
+                return found_dbs
     
     # 按优先级排序结果
     found_dbs.sort(key=lambda x: -x.get('priority', 0))
     
     return found_dbs
 
-def get_wechat_path_from_registry() -> Optional[str]:
+def _score_path(path: str, keywords: Dict[str, int]) -> int:
+    """根据路径中包含的关键词计算探索优先级"""
+    return sum(weight for keyword, weight in keywords.items() if keyword in path)
+
+def _best_first_walk(top: str, keywords: Dict[str, int],
+                     exclude_dirs) -> Iterator[Tuple[str, List[str], List[os.DirEntry], int]]:
+    """
+    按路径评分进行最佳优先的目录遍历
+    
+    与os.walk不同，待探索目录保存在优先队列中，评分高的目录先出队；
+    评分相同时深度优先，保证队列规模与os.walk相当。
+    
+    Args:
+        top: 起始目录
+        keywords: 路径关键词及其权重
+        exclude_dirs: 需要跳过的目录名
+    
+    Yields:
+        (root, dirs, files, priority)，dirs为目录名，files为文件的os.DirEntry，
+        priority为该目录的评分
+    """
+    # 盘符形式的'C:'在Windows上表示当前目录，需要补全为根目录
+    if top.endswith(':'):
+        top = top + os.sep
+    
+    counter = itertools.count()
+    frontier = [(-_score_path(top, keywords), 0, next(counter), top)]
+    
+    while frontier:
+        neg_score, neg_depth, _, root = heapq.heappop(frontier)
+        
+        dirs, files = [], []
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in exclude_dirs:
+                                dirs.append(entry.name)
+                        else:
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        
+        yield root, dirs, files, -neg_score
+        
+        for d in dirs:
+            child = os.path.join(root, d)
+            heapq.heappush(frontier, (-_score_path(child, keywords), neg_depth - 1, next(counter), child))
+
+def get_wechat_path_from_registry(backend: Optional[DiscoveryBackend] = None) -> Optional[str]:
     """
     从注册表获取微信文件路径
     
+    Args:
+        backend: 系统访问后端，默认为当前系统的后端
+    
     Returns:
         Optional[str]: 微信文件路径，如果未找到则返回None
     """
+    backend = backend or get_default_backend()
+    if backend is None:
+        return None
+    
+    # 尝试多个可能的注册表路径
+    possible_keys = [
+        (HKEY_CURRENT_USER, r"Software\Tencent\WeChat"),
+        (HKEY_CURRENT_USER, r"Software\Tencent\WeChatApp"),
+        (HKEY_CURRENT_USER, r"Software\Tencent\WXWork"),
+        (HKEY_LOCAL_MACHINE, r"Software\Tencent\WeChat"),
+        (HKEY_LOCAL_MACHINE, r"Software\WOW6432Node\Tencent\WeChat")
+    ]
+    
     try:
-        # 尝试多个可能的注册表路径
-        possible_keys = [
-            (winreg.HKEY_CURRENT_USER, r"Software\Tencent\WeChat"),
-            (winreg.HKEY_CURRENT_USER, r"Software\Tencent\WeChatApp"),
-            (winreg.HKEY_CURRENT_USER, r"Software\Tencent\WXWork"),
-            (winreg.HKEY_LOCAL_MACHINE, r"Software\Tencent\WeChat"),
-            (winreg.HKEY_LOCAL_MACHINE, r"Software\WOW6432Node\Tencent\WeChat")
-        ]
-        
         for hkey, key_path in possible_keys:
-            try:
-                key = winreg.OpenKey(hkey, key_path)
-                try:
-                    # 尝试不同的值名
-                    for value_name in ["FileSavePath", "InstallPath"]:
-                        try:
-                            install_path = winreg.QueryValueEx(key, value_name)[0]
-                            if install_path == "MyDocument:":
-                                # 默认位置，使用系统文档目录
-                                user_profile = os.environ.get('USERPROFILE', '')
-                                return os.path.join(user_profile, 'Documents', 'WeChat Files')
-                            else:
-                                # 自定义位置
-                                if "WeChat Files" not in install_path:
-                                    install_path = os.path.join(install_path, 'WeChat Files')
-                                return install_path
-                        except:
-                            continue
-                finally:
-                    winreg.CloseKey(key)
-            except:
-                continue
+            # 尝试不同的值名
+            for value_name in ["FileSavePath", "InstallPath"]:
+                install_path = backend.registry_value(hkey, key_path, value_name)
+                if not install_path:
+                    continue
+                
+                if install_path == "MyDocument:":
+                    # 默认位置，使用系统文档目录
+                    profiles = backend.user_profiles()
+                    if not profiles:
+                        continue
+                    return os.path.join(profiles[0], 'Documents', 'WeChat Files')
+                
+                # 自定义位置
+                install_path = backend.to_local_path(install_path)
+                if not install_path:
+                    continue
+                if "WeChat Files" not in install_path:
+                    install_path = os.path.join(install_path, 'WeChat Files')
+                return install_path
                 
     except Exception as e:
         print(f"读取注册表时出错: {e}")
     
     return None
 
-def get_available_drives() -> List[str]:
+def get_available_drives(backend: Optional[DiscoveryBackend] = None) -> List[str]:
     """
     获取系统中所有可用的驱动器
     
+    Args:
+        backend: 系统访问后端，默认为当前系统的后端
+    
     Returns:
         List[str]: 驱动器列表，如['C:', 'D:']
     """
-    if platform.system() == 'Windows':
-        drives = []
-        for letter in string.ascii_uppercase:
-            drive = f"{letter}:"
-            if os.path.exists(drive):
-                drives.append(drive)
-        return drives
-    else:
-        return ['/']  # 在非Windows系统上，返回根目录
+    backend = backend or get_default_backend()
+    if backend is not None:
+        return backend.available_drives()
+    return ['/']  # 没有可用后端时，返回根目录
+
+def _print_no_backend() -> None:
+    """提示当前系统无法直接查找数据库"""
+    system = platform.system()
+    print(f"当前只支持Windows系统，您的系统是{system}")
+    print("如需分析挂载的Windows镜像，请使用 --image-root 指定镜像的系统盘目录")
 
 def _extract_wxid_from_path(path: str) -> str:
     """从路径中提取微信ID